@@ -0,0 +1,243 @@
+'''
+
+Concurrent, cached queries to DAS.
+
+All DAS queries of datatools go through a DASClient, which wraps
+das_client.get_data with:
+
+    * an on-disk cache of the successful (status 'ok') responses, with a
+      time to live
+    * retries with exponential backoff
+    * a bounded pool of threads for many queries at once.  The number of
+      concurrent requests is halved when a request fails, and grows back
+      by one on each success.
+    * an optional limit on the rate of requests
+
+The host is https://cmsweb.cern.ch unless set with the $fsadashost
+environment variable (e.g. to a local stub server for testing), and the
+cache directory is ~/.fsa_das_cache unless set with $fsadascache.
+
+'''
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from Queue import Queue, Empty
+
+from FinalStateAnalysis.Utilities.das_client import get_data
+
+log = logging.getLogger("dasquery")
+
+DEFAULT_HOST = 'https://cmsweb.cern.ch'
+# Time to live of the cached responses, in seconds
+DEFAULT_TTL = 24 * 3600
+# How often the waiting for the workers is interrupted, so KeyboardInterrupt
+# is delivered, in seconds
+_JOIN_INTERVAL = 0.5
+
+
+def default_host():
+    return os.environ.get('fsadashost', DEFAULT_HOST)
+
+
+def default_cache_dir():
+    return os.environ.get('fsadascache',
+                          os.path.expanduser('~/.fsa_das_cache'))
+
+
+class DASQueryError(Exception):
+    ''' Raised when queries still fail after all the retries '''
+    def __init__(self, failures):
+        self.failures = failures
+        super(DASQueryError, self).__init__(
+            "%i DAS queries failed, first: %s => %s" % (
+                len(failures), failures[0][0], failures[0][1]))
+
+
+class ResponseCache(object):
+    ''' Stores the parsed DAS responses in a directory, one file each '''
+    def __init__(self, cache_dir, ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def path(self, host, query):
+        key = hashlib.md5('%s\n%s' % (host, query)).hexdigest()
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, host, query):
+        ''' Get the cached response, or None if missing or expired '''
+        path = self.path(host, query)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as cached:
+                stored = json.load(cached)
+        except (IOError, ValueError):
+            return None
+        if time.time() - stored['time'] > self.ttl:
+            return None
+        return stored['response']
+
+    def put(self, host, query, response):
+        path = self.path(host, query)
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(path + '.tmp', 'w') as cached:
+                json.dump({'time': time.time(), 'query': query,
+                           'response': response}, cached)
+            os.rename(path + '.tmp', path)
+        except (IOError, OSError), e:
+            log.warning("Can't cache DAS response in %s: %s", path, e)
+
+
+class AdaptiveLimit(object):
+    ''' Bounds the number of concurrent requests, and their rate
+
+    The limit is halved on each failure and increased by one on each
+    success, between 1 and [max_concurrent].
+    '''
+    def __init__(self, max_concurrent, max_rate=None):
+        self.max_concurrent = max_concurrent
+        self.limit = max_concurrent
+        self.active = 0
+        self.min_interval = 1. / max_rate if max_rate else 0
+        self.last_start = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+            wait = self.last_start + self.min_interval - time.time()
+            self.last_start = max(time.time(), self.last_start +
+                                  self.min_interval)
+        if wait > 0:
+            time.sleep(wait)
+
+    def release(self, success):
+        with self.condition:
+            self.active -= 1
+            if success:
+                self.limit = min(self.limit + 1, self.max_concurrent)
+            else:
+                self.limit = max(self.limit // 2, 1)
+            self.condition.notify_all()
+
+
+class DASClient(object):
+    ''' Run (cached) queries on a DAS server '''
+    def __init__(self, host=None, cache_dir=None, ttl=DEFAULT_TTL,
+                 max_concurrent=8, max_rate=None, retries=3, backoff=1.):
+        self.host = host or default_host()
+        self.cache = None
+        if ttl > 0:
+            self.cache = ResponseCache(cache_dir or default_cache_dir(), ttl)
+        self.limit = AdaptiveLimit(max_concurrent, max_rate)
+        self.max_concurrent = max_concurrent
+        self.retries = retries
+        self.backoff = backoff
+
+    def fetch(self, query):
+        ''' Get the parsed response of a query from the server '''
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * 2 ** (attempt - 1)
+                log.info("Retrying %s in %0.1fs (%s)", query, delay,
+                         last_error)
+                time.sleep(delay)
+            self.limit.acquire()
+            success = False
+            try:
+                data = get_data(self.host, query, 0, 0, False)
+                if not data:
+                    raise IOError("Empty response")
+                response = json.loads(data)
+                status = response.get('status') \
+                    if isinstance(response, dict) else None
+                if status != 'ok':
+                    raise IOError("DAS status %s: %s" % (
+                        status, response.get('reason', '')
+                        if isinstance(response, dict) else response))
+                success = True
+                return response
+            except Exception, e:
+                last_error = e
+            finally:
+                self.limit.release(success)
+        raise DASQueryError([(query, last_error)])
+
+    def query(self, query):
+        ''' Get the parsed (JSON) response of a query
+
+        Only responses with status 'ok' are returned (and cached), the others
+        are retried and raise a DASQueryError.
+        '''
+        if self.cache is not None:
+            response = self.cache.get(self.host, query)
+            if response is not None:
+                log.debug("Using cached response for %s", query)
+                return response
+        log.debug("Querying DAS: %s", query)
+        response = self.fetch(query)
+        if self.cache is not None:
+            self.cache.put(self.host, query, response)
+        return response
+
+    def query_many(self, queries):
+        ''' Run many queries concurrently.
+
+        Returns the responses in the order of [queries].  Identical
+        queries are only sent once.  Raises a DASQueryError listing all
+        the queries which failed (the others are cached).
+        '''
+        unique = list(set(queries))
+        responses = {}
+        failures = []
+        todo = Queue()
+        for query in unique:
+            todo.put(query)
+
+        def worker():
+            # All the queries are queued first, stop once they are done
+            while True:
+                try:
+                    query = todo.get_nowait()
+                except Empty:
+                    return
+                try:
+                    responses[query] = self.query(query)
+                except DASQueryError, e:
+                    failures.extend(e.failures)
+                except Exception, e:
+                    failures.append((query, e))
+
+        threads = []
+        for i in range(min(self.max_concurrent, len(unique))):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            # A join without timeout can't be interrupted
+            while thread.is_alive():
+                thread.join(_JOIN_INTERVAL)
+        if failures:
+            raise DASQueryError(failures)
+        return [responses[x] for x in queries]
+
+
+_default_client = None
+
+
+def default_client():
+    ''' The DASClient used if none is given '''
+    global _default_client
+    if _default_client is None:
+        _default_client = DASClient()
+    return _default_client
@@ -23,8 +23,11 @@ import re
 try:
       from yellowhiggs import xs, br, xsbr
       br(130.,'WW')
+      yellowhiggs_missing = False
 except:
       #print "warning: yellowhiggs error"
+      # The cross sections are -99, don't cache them (see datacatalog)
+      yellowhiggs_missing = True
       #define / override functions to avoid crashes
       def br(*args, **kwargs):
             return -99
@@ -18,8 +18,11 @@ from datacommon import square, cube, quad, picobarns, br_w_leptons, br_z_leptons
 try:
       from yellowhiggs import xs, br, xsbr
       br(130.,'WW')
+      yellowhiggs_missing = False
 except:
       #print "warning: yellowhiggs error"
+      # The cross sections are -99, don't cache them (see datacatalog)
+      yellowhiggs_missing = True
       #define / override functions to avoid crashes
       def br(*args, **kwargs):
             return -99
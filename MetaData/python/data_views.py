@@ -4,14 +4,27 @@ Tool for creating "views" of file containing histograms.
 
 Applies MC normalization factors, styles, etc.
 
+If a HistogramCache is given, the views are wrapped in a CachedView, so
+repeated requests for the same histogram are served from memory (see
+PlotTools/python/HistCache.py).
+
+The files are opened lazily on first use, and at most a fixed number are
+kept open at the same time (see PlotTools/python/FilePool.py).
+
+The histograms can also be read from a snapshot made with
+snapshot_histograms.py instead of the ROOT files (see
+PlotTools/python/HistSnapshot.py).
+
 '''
 
 import copy
 from data_styles import data_styles
+from FinalStateAnalysis.PlotTools.HistCache import CachedView, HistogramCache
+from FinalStateAnalysis.PlotTools.FilePool import LazyFile
+from FinalStateAnalysis.PlotTools.HistSnapshot import Snapshot, SnapshotFile
 import fnmatch
 import logging
 import os
-import rootpy.io as io
 from rootpy.plotting import views
 
 log = logging.getLogger("data_views")
@@ -53,7 +66,8 @@ def get_best_style(sample):
     else:
         return None
 
-def data_views(files, lumifiles, forceLumi=-1):
+def data_views(files, lumifiles, forceLumi=-1, cache=None, file_pool=None,
+               snapshot=None):
     ''' Builds views of files.
 
     [files] gives an iterator of .root files with histograms to build.
@@ -63,14 +77,42 @@ def data_views(files, lumifiles, forceLumi=-1):
 
     The lumi to normalize to is taken as the sum of the data file int. lumis.
 
+    [cache] is the HistogramCache used by the views.  If True, a new one
+    is created (of DEFAULT_MAX_BYTES, 512 MB).  If None or False (the
+    default), the views are not cached.
+
+    [file_pool] is the FilePool which manages the open files.  If None,
+    the default pool is used.  Call its release() method when done with
+    the histograms, so it can close the files again.
+
+    If [snapshot] (the path of a snapshot directory) is given, the
+    histograms of each sample are read from it instead of from [files].
+    The samples are still identified by the names of [files].
+
     '''
 
     files = list(files)
 
     log.info("Creating views from %i files", len(files))
 
-    # Map sample_name => root file
-    histo_files = dict((extract_sample(x), io.open(x)) for x in files)
+    if cache is True:
+        cache = HistogramCache()
+
+    # Map sample_name => file name
+    file_names = dict((extract_sample(x), x) for x in files)
+
+    if snapshot is not None:
+        snapshot = Snapshot(snapshot)
+        log.info("Reading histograms from snapshot %s", snapshot.path)
+        # Map sample_name => sample in the snapshot
+        histo_files = dict((x, SnapshotFile(snapshot, x))
+                           for x in file_names)
+        # The cached objects depend on the snapshot instead
+        file_names = dict((x, snapshot.data_file) for x in file_names)
+    else:
+        # Map sample_name => root file (opened on first use)
+        histo_files = dict((extract_sample(x), LazyFile(x, file_pool))
+                           for x in files)
 
     # Map sample_name => lumi file
     lumi_files = dict((extract_sample(x), read_lumi(x)) for x in lumifiles)
@@ -136,6 +178,11 @@ def data_views(files, lumifiles, forceLumi=-1):
                 views.StyleView(unweighted_view, **style_dict_no_name), nicename
             )
 
+        if cache:
+            view = CachedView(view, cache, sample, [file_names[sample]])
+            unweighted_view = CachedView(
+                unweighted_view, cache, sample, [file_names[sample]])
+
         output[sample] = {
             'intlumi': intlumi,
             'file' : raw_file,
@@ -0,0 +1,200 @@
+'''
+
+Precompiled, lazily loaded catalog of the dataset definitions.
+
+Importing the dataset definition modules (data7TeV, data8TeV, ...) is
+slow: they are long, and compute the Higgs cross sections with
+yellowhiggs.  The merged datadefs/data_name_map dicts are instead
+compiled once into a JSON catalog, which is rebuilt when any of the
+source modules or yellowhiggs changes, and only loaded on the first lookup.
+If yellowhiggs can't be imported, the modules use -99 cross sections, and
+the catalog is not written.
+
+The catalog is written in ~/.fsa_datacatalog, or in the directory given
+by the $fsadatacatalog environment variable.  Its name includes a hash of
+the location of the source modules, so several checkouts can share the
+directory.
+
+'''
+
+from collections import MutableMapping
+import hashlib
+import imp
+import json
+import logging
+import os
+
+log = logging.getLogger("datacatalog")
+
+_this_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def source_files(modules):
+    ''' The files which define the catalog for [modules] '''
+    return [os.path.join(_this_dir, x + '.py')
+            for x in ['datacommon'] + list(modules)]
+
+
+def yellowhiggs_stamp():
+    ''' [location, size, mtime] of yellowhiggs, found without importing it
+
+    None if it is not installed.
+    '''
+    try:
+        module_file, path, description = imp.find_module('yellowhiggs')
+    except ImportError:
+        return None
+    if module_file is not None:
+        module_file.close()
+    if os.path.isdir(path):
+        path = os.path.join(path, '__init__.py')
+    if not os.path.exists(path):
+        return [path, None, None]
+    stat = os.stat(path)
+    return [path, stat.st_size, int(stat.st_mtime)]
+
+
+def source_stamps(modules):
+    ''' (size, mtime) of each source file, and the yellowhiggs stamp '''
+    output = {}
+    for filename in source_files(modules):
+        if os.path.exists(filename):
+            stat = os.stat(filename)
+            output[os.path.basename(filename)] = [
+                stat.st_size, int(stat.st_mtime)]
+    output['yellowhiggs'] = yellowhiggs_stamp()
+    return output
+
+
+def catalog_path(modules):
+    ''' Where the catalog for [modules] lives '''
+    catalog_dir = os.environ.get(
+        'fsadatacatalog', os.path.expanduser('~/.fsa_datacatalog'))
+    source_hash = hashlib.md5(_this_dir).hexdigest()[:12]
+    return os.path.join(catalog_dir, 'datacatalog_%s_%s.json' % (
+        '_'.join(modules), source_hash))
+
+
+def _to_str(obj):
+    ''' Convert the unicode in a decoded JSON object back to str '''
+    if isinstance(obj, unicode):
+        return str(obj)
+    if isinstance(obj, list):
+        return [_to_str(x) for x in obj]
+    if isinstance(obj, dict):
+        return dict((_to_str(key), _to_str(value))
+                    for key, value in obj.iteritems())
+    return obj
+
+
+def compile_catalog(modules):
+    ''' Import the definition [modules], and merge their dicts.
+
+    Later modules take precedence over earlier ones.  Returns (datadefs,
+    data_name_map, complete), where complete is False if a module could not
+    import yellowhiggs, and used placeholder cross sections.
+    '''
+    datadefs = {}
+    data_name_map = {}
+    complete = True
+    for name in modules:
+        module = __import__(name, globals(), locals(), [], -1)
+        datadefs.update(module.datadefs)
+        data_name_map.update(module.data_name_map)
+        if getattr(module, 'yellowhiggs_missing', False):
+            complete = False
+    return datadefs, data_name_map, complete
+
+
+def load_catalog(modules):
+    ''' Get the (datadefs, data_name_map) of [modules]
+
+    The compiled catalog is used if it is up to date, otherwise it is
+    rebuilt from the modules.
+    '''
+    path = catalog_path(modules)
+    stamps = source_stamps(modules)
+    if os.path.exists(path):
+        try:
+            with open(path) as catalog_file:
+                stored = json.load(catalog_file)
+            if stored['sources'] == stamps:
+                return (_to_str(stored['datadefs']),
+                        _to_str(stored['data_name_map']))
+            log.info("Dataset catalog %s is out of date", path)
+        except (ValueError, KeyError), e:
+            log.warning("Can't read dataset catalog %s: %s", path, e)
+    datadefs, data_name_map, complete = compile_catalog(modules)
+    if not complete:
+        log.warning("yellowhiggs is not available, the cross sections are"
+                    " placeholders: not writing dataset catalog %s", path)
+        return datadefs, data_name_map
+    try:
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path + '.tmp', 'w') as catalog_file:
+            json.dump({'sources': stamps, 'datadefs': datadefs,
+                       'data_name_map': data_name_map}, catalog_file)
+        os.rename(path + '.tmp', path)
+        log.info("Wrote dataset catalog %s", path)
+    except (IOError, OSError, TypeError, ValueError), e:
+        # Still usable, it will just be rebuilt next time
+        log.warning("Can't write dataset catalog %s: %s", path, e)
+    return datadefs, data_name_map
+
+
+class _Catalog(object):
+    ''' Loads the catalog of some modules on first use '''
+    def __init__(self, modules):
+        self.modules = modules
+        self._loaded = None
+
+    def get(self):
+        if self._loaded is None:
+            self._loaded = load_catalog(self.modules)
+        return self._loaded
+
+
+class LazyDict(MutableMapping):
+    ''' A dict which is filled from a catalog on first use
+
+    [which] is the index of the dict in the (datadefs, data_name_map)
+    tuple of the catalog.
+    '''
+    def __init__(self, catalog, which):
+        self._catalog = catalog
+        self._which = which
+
+    @property
+    def _dict(self):
+        return self._catalog.get()[self._which]
+
+    def __getitem__(self, key):
+        return self._dict[key]
+
+    def __setitem__(self, key, value):
+        self._dict[key] = value
+
+    def __delitem__(self, key):
+        del self._dict[key]
+
+    def __iter__(self):
+        return iter(self._dict)
+
+    def __len__(self):
+        return len(self._dict)
+
+    def __contains__(self, key):
+        return key in self._dict
+
+    def copy(self):
+        return dict(self._dict)
+
+    def __repr__(self):
+        return repr(self._dict)
+
+
+def lazy_catalog(modules):
+    ''' Get lazily loaded (datadefs, data_name_map) for [modules] '''
+    catalog = _Catalog(list(modules))
+    return LazyDict(catalog, 0), LazyDict(catalog, 1)
@@ -6,10 +6,10 @@ Author: Evan K. Friis, UW Madison
 
 '''
 
-import fnmatch
 import math
 from RecoLuminosity.LumiDB import argparse
 from FinalStateAnalysis.Utilities.prettytable import PrettyTable
+from dataquery import DatasetCatalog
 import sys
 
 # Conversions to pico barns
@@ -47,6 +47,17 @@ def query_cli(datadefs, argv=None):
         '--dataset', required=False, type=str,
         help='DBS dataset name (ex: '
         '/DYJetsToLL_M-50_TuneZ2Star_8TeV-madgraph-tarball/*')
+    filter_group = parser.add_argument_group(
+        title='filter', description="Filters applied to the query (ANDed),"
+        " or used alone")
+    filter_group.add_argument(
+        '--analysis', required=False, type=str,
+        help='Analysis tag (ex: HTT)')
+    filter_group.add_argument(
+        '--pu', required=False, type=str, help='PU scenario (ex: S10)')
+    filter_group.add_argument(
+        '--run', required=False, type=int,
+        help='Run in the [firstRun, lastRun] range of the dataset')
     output_group = parser.add_argument_group(
         title='output', description="Output parameters")
     output_group.add_argument(
@@ -61,8 +72,10 @@ def query_cli(datadefs, argv=None):
 
     args = parser.parse_args(argv[1:])
 
-    if not args.name and not args.dataset:
-        print "Must specify either --name or --dataset.  Did you forget to quote a '*'?"
+    filters = dict(analysis=args.analysis, pu=args.pu, run=args.run)
+    if not args.name and not args.dataset and \
+            all(x is None for x in filters.values()):
+        print "Must specify --name, --dataset, --analysis, --pu or --run.  Did you forget to quote a '*'?"
         sys.exit(1)
 
     table = PrettyTable(args.columns)
@@ -70,20 +83,23 @@ def query_cli(datadefs, argv=None):
     for col in args.columns:
         table.set_field_align(col, 'l')
 
-    for key in sorted(datadefs.keys()):
+    catalog = DatasetCatalog(datadefs)
+    matched = set()
+    if args.name:
+        matched.update(catalog.query(name=args.name, **filters))
+    if args.dataset:
+        matched.update(catalog.query(dataset=args.dataset, **filters))
+    if not args.name and not args.dataset:
+        matched.update(catalog.query(**filters))
+
+    for key in catalog.sorted(matched):
         value = datadefs[key]
-        matched = False
-        if args.name and fnmatch.fnmatch(key, args.name):
-            matched = True
-        if args.dataset and fnmatch.fnmatch(value['datasetpath'], args.dataset):
-            matched = True
-        if matched:
-            row = []
-            for column in args.columns:
-                if column == 'name':
-                    row.append(key)
-                else:
-                    row.append(value.get(column, '-'))
-            table.add_row(row)
+        row = []
+        for column in args.columns:
+            if column == 'name':
+                row.append(key)
+            else:
+                row.append(value.get(column, '-'))
+        table.add_row(row)
 
     table.printt(sortby=args.sort, border=(args.noborder))
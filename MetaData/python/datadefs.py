@@ -6,32 +6,28 @@ Picks either data7TeV or data8TeV according to the release.
 
 For 8TeV data, if using a 53X release, 53X data samples are preferred.
 
+The definitions are only loaded on the first lookup in datadefs or
+data_name_map, from a precompiled catalog.
+
 Author: Evan K. Friis, Tapas Sarangi, UW Madison
 
 '''
 
-import copy
 from FinalStateAnalysis.Utilities.version import \
         cmssw_major_version, cmssw_minor_version
+from datacatalog import lazy_catalog
 
+# The definitions are compiled into a catalog, and loaded on first use
+# (see datacatalog.py)
 data_name_map = None
 datadefs = None
 
 if cmssw_major_version() == 4:
-    import data7TeV
-    data_name_map = data7TeV.data_name_map
-    datadefs = data7TeV.datadefs
+    datadefs, data_name_map = lazy_catalog(['data7TeV'])
 elif cmssw_major_version() == 5 and cmssw_minor_version() == 2 :
-    import data8TeV
-    data_name_map = data8TeV.data_name_map
-    datadefs = data8TeV.datadefs
+    datadefs, data_name_map = lazy_catalog(['data8TeV'])
 elif cmssw_major_version() == 5 and cmssw_minor_version() >= 3 :
-    import data8TeV
-    import data8TeVNew
-    data_name_map = copy.copy(data8TeV.data_name_map)
-    datadefs = copy.copy(data8TeV.datadefs)
     # Always prefer the 53X version
-    data_name_map.update(data8TeVNew.data_name_map)
-    datadefs.update(data8TeVNew.datadefs)
+    datadefs, data_name_map = lazy_catalog(['data8TeV', 'data8TeVNew'])
 else:
     raise ValueError("I can't figure out which release to use!")
@@ -0,0 +1,164 @@
+'''
+
+Indexed queries of the dataset definitions.
+
+A DatasetCatalog is built from a datadefs dict, and indexes the samples
+by analysis tag, PU scenario, primary dataset and run range, so queries
+don't need to scan all the definitions.  The criteria of a query are
+ANDed, the patterns in a list are ORed.
+
+>>> catalog = DatasetCatalog({
+...     'Zjets_M50': {'analyses': ['HTT', 'VH'], 'pu': 'S10',
+...                   'datasetpath': '/DYJetsToLL_M-50/Summer12/AODSIM'},
+...     'WZ': {'analyses': ['VH'], 'pu': 'S7',
+...            'datasetpath': '/WZJetsTo3LNu/Summer12/AODSIM'},
+...     'data_DoubleMu_A': {'analyses': ['VH'], 'firstRun': 190450,
+...                         'lastRun': 193686,
+...                         'datasetpath': '/DoubleMu/Run2012A/AOD'},
+...     'data_DoubleMu_B': {'analyses': ['VH'], 'firstRun': 193752,
+...                         'lastRun': 196531,
+...                         'datasetpath': '/DoubleMu/Run2012B/AOD'},
+... })
+>>> catalog.query(analysis='VH', pu='S10')
+['Zjets_M50']
+>>> catalog.query(name='data_*', run=195000)
+['data_DoubleMu_B']
+>>> catalog.query(dataset=['/DoubleMu/*', '/WZ*'], sort='firstRun')
+['WZ', 'data_DoubleMu_A', 'data_DoubleMu_B']
+>>> catalog.query(primds='DoubleMu', run=193700)
+[]
+
+'''
+
+import bisect
+from collections import defaultdict
+import fnmatch
+
+
+def primary_dataset(datasetpath):
+    ''' The primary dataset of a DBS path
+
+    >>> primary_dataset('/DoubleMu/Run2012A-13Jul2012-v1/AOD')
+    'DoubleMu'
+    '''
+    return datasetpath.strip('/').split('/')[0]
+
+
+def is_pattern(pattern):
+    return any(x in pattern for x in '*?[')
+
+
+class DatasetCatalog(object):
+    ''' In-memory, indexed catalog of a datadefs dict '''
+    def __init__(self, datadefs):
+        self.datadefs = datadefs
+        self.names = sorted(datadefs.keys())
+        self.by_analysis = defaultdict(set)
+        self.by_pu = defaultdict(set)
+        self.by_primds = defaultdict(set)
+        intervals = []
+        for name, info in datadefs.iteritems():
+            for analysis in info.get('analyses', []):
+                self.by_analysis[analysis].add(name)
+            if 'pu' in info:
+                self.by_pu[info['pu']].add(name)
+            if 'datasetpath' in info:
+                self.by_primds[primary_dataset(info['datasetpath'])].add(name)
+            if 'firstRun' in info and 'lastRun' in info:
+                intervals.append((info['firstRun'], info['lastRun'], name))
+        # Interval index of the run ranges, sorted by first run.
+        intervals.sort()
+        self.intervals = intervals
+        self.interval_starts = [x[0] for x in intervals]
+        # Largest last run of the intervals up to each one
+        self.interval_max_ends = []
+        max_end = None
+        for first, last, name in intervals:
+            max_end = last if max_end is None else max(max_end, last)
+            self.interval_max_ends.append(max_end)
+
+    def for_run(self, run):
+        ''' Samples whose [firstRun, lastRun] contains [run] '''
+        output = set()
+        i = bisect.bisect_right(self.interval_starts, run)
+        # Go back while an earlier interval can still contain the run
+        while i > 0 and self.interval_max_ends[i - 1] >= run:
+            i -= 1
+            first, last, name = self.intervals[i]
+            if last >= run:
+                output.add(name)
+        return output
+
+    def match_names(self, patterns):
+        ''' Samples matching any of the name patterns '''
+        output = set()
+        for pattern in patterns:
+            if not is_pattern(pattern):
+                if pattern in self.datadefs:
+                    output.add(pattern)
+            else:
+                output.update(fnmatch.filter(self.names, pattern))
+        return output
+
+    def match_datasets(self, patterns):
+        ''' Samples with a datasetpath matching any of the patterns '''
+        output = set()
+        for pattern in patterns:
+            primds = primary_dataset(pattern)
+            if not is_pattern(primds):
+                candidates = self.by_primds.get(primds, ())
+            else:
+                candidates = self.names
+            output.update(
+                x for x in candidates if 'datasetpath' in self.datadefs[x]
+                and fnmatch.fnmatch(self.datadefs[x]['datasetpath'], pattern))
+        return output
+
+    def query(self, name=None, dataset=None, analysis=None, pu=None,
+              primds=None, run=None, sort='name', reverse=False):
+        ''' Get the sample names matching all the given criteria
+
+        [name] and [dataset] are shell style patterns, or lists of them.
+        The output is sorted by name, or by the value of the [sort] key of
+        the definitions.
+        '''
+        selections = []
+        if analysis is not None:
+            selections.append(self.by_analysis.get(analysis, set()))
+        if pu is not None:
+            selections.append(self.by_pu.get(pu, set()))
+        if primds is not None:
+            selections.append(self.by_primds.get(primds, set()))
+        if run is not None:
+            selections.append(self.for_run(run))
+        if name is not None:
+            if isinstance(name, basestring):
+                name = [name]
+            selections.append(self.match_names(name))
+        if dataset is not None:
+            if isinstance(dataset, basestring):
+                dataset = [dataset]
+            selections.append(self.match_datasets(dataset))
+        if selections:
+            # Start from the smallest
+            selections.sort(key=len)
+            output = set(selections[0])
+            for selection in selections[1:]:
+                output &= selection
+        else:
+            output = set(self.names)
+        return self.sorted(output, sort, reverse)
+
+    def sorted(self, names, sort='name', reverse=False):
+        ''' Sort sample names by name or by a key of the definitions '''
+        if sort == 'name':
+            return sorted(names, reverse=reverse)
+        # Samples without the key go first
+        return sorted(
+            names, reverse=reverse,
+            key=lambda x: (sort in self.datadefs[x],
+                           self.datadefs[x].get(sort), x))
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
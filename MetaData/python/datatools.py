@@ -8,24 +8,32 @@ Author: Evan K. Friis, UW Madison
 '''
 
 from datadefs import datadefs
-from FinalStateAnalysis.Utilities.das_client import get_data
+from dataquery import DatasetCatalog
+from dasquery import default_client
 from FinalStateAnalysis.Utilities.lumitools import json_summary
 import logging
-import json
 
 log = logging.getLogger("datatools")
 
+_catalog = None
+
+def catalog():
+    ''' Get the (indexed) DatasetCatalog of datadefs '''
+    global _catalog
+    if _catalog is None:
+        _catalog = DatasetCatalog(datadefs)
+    return _catalog
+
 def find_data_for_run(run, primds):
     '''
     Get the appropriate dataset alias for a given run.
     This depends on the valid run ranges specified for each dataset.
     '''
-    matching_datasets = []
-    for dataset, dataset_info in datadefs.iteritems():
-        if primds in dataset_info['datasetpath']:
-            if run == 1 or (run >= dataset_info['firstRun'] and
-                            run <= dataset_info['lastRun']):
-                matching_datasets.append(dataset)
+    # Run 1 is MC, which matches any range
+    candidates = catalog().query(run=run if run != 1 else None)
+    matching_datasets = [
+        dataset for dataset in candidates
+        if primds in datadefs[dataset].get('datasetpath', '')]
 
     if len(matching_datasets) != 1:
         raise ValueError("0 or multiple matching datasets found! %s"
@@ -38,20 +46,15 @@ def map_data_to_dataset(data):
     '''
     return datadefs[data]['datasetpath']
 
-def query_das(dataset):
+def query_das(dataset, client=None):
     ''' Get information about the dataset from DAS
 
     Returns a dictionary with nfiles, nevents, and size (GB).
 
     '''
-    result = get_data(
-        'https://cmsweb.cern.ch',
-        'file dataset=%s | count(file), sum(file.nevents), sum(file.size)' % dataset,
-        0, #idx
-        0, #limit
-        False
-    )
-    result = json.loads(result)
+    client = client or default_client()
+    result = client.query(
+        'file dataset=%s | count(file), sum(file.nevents), sum(file.size)' % dataset)
     output = {
         'nfiles' : result['data'][0]['result']['value'],
         'nevents' : result['data'][1]['result']['value'],
@@ -60,82 +63,80 @@ def query_das(dataset):
 
     return output
 
-def query_pattuple(dataset):
+def query_pattuple(dataset, client=None):
     ''' Get information about a pat tuple dataset from DAS
 
     Returns a dictionary with nfiles, nevents, nlumis
 
     '''
+    client = client or default_client()
     output = {}
-    pat_result = get_data(
-        'https://cmsweb.cern.ch',
+    # Both queries are sent at the same time
+    pat_result, parent_result = client.query_many([
         'file dataset=%s  instance=cms_dbs_ph_analysis_01 | count(file), sum(file.nevents)' % dataset,
-        0, #idx
-        0, #limit
-        False
-    )
-    pat_result = json.loads(pat_result)
+        'parent dataset=%s  instance=cms_dbs_ph_analysis_01' % dataset,
+    ])
     output['nfiles'] = pat_result['data'][0]['result']['value']
     output['nevents'] = pat_result['data'][1]['result']['value']
-
-    parent_result = get_data(
-        'https://cmsweb.cern.ch',
-        'parent dataset=%s  instance=cms_dbs_ph_analysis_01' % dataset,
-        0, #idx
-        0, #limit
-        False
-    )
-    parent_result = json.loads(parent_result)
     output['parent'] = parent_result['data'][0]['parent'][0]['name']
 
     return output
 
-def query_files(dataset):
+def query_files(dataset, client=None):
     ''' Get the list of files from a dataset '''
     log.info("Getting files from dataset %s:", dataset)
+    client = client or default_client()
     files = []
-    result = get_data(
-        'https://cmsweb.cern.ch',
-        'file dataset=%s  instance=cms_dbs_ph_analysis_01' % dataset,
-        0, #idx
-        0, #limit
-        False
-    )
-    result = json.loads(result)
+    result = client.query(
+        'file dataset=%s  instance=cms_dbs_ph_analysis_01' % dataset)
     for file_result in result['data']:
         files.append(file_result['file'][0]['name'])
     log.info("Found %i files", len(files))
     return files
 
-def query_lumis(file):
-    ''' Get the list of lumis in a file
+def _lumi_query(file):
+    return 'lumi file=%s  instance=cms_dbs_ph_analysis_01' % file
 
-    Returns a list of (run, lumi) tuples.
-
-    '''
-    log.info("Getting lumis from file: %s" % file)
+def _parse_lumis(result):
+    ''' Get the set of (run, lumi) tuples from a lumi query result '''
     lumis = set([])
-    result = get_data(
-        'https://cmsweb.cern.ch',
-        'lumi file=%s  instance=cms_dbs_ph_analysis_01' % file,
-        0, #idx
-        0, #limit
-        False
-    )
-    result = json.loads(result)
     for lumi_result in result['data']:
         lumis.add((
             lumi_result['lumi'][0]['run_number'],
             lumi_result['lumi'][0]['id'],
         ))
+    return lumis
+
+def query_lumis(file, client=None):
+    ''' Get the list of lumis in a file
+
+    Returns a list of (run, lumi) tuples.
+
+    '''
+    log.info("Getting lumis from file: %s" % file)
+    client = client or default_client()
+    lumis = _parse_lumis(client.query(_lumi_query(file)))
     log.info("Found %i lumis", len(lumis))
     return lumis
 
-def query_lumis_in_dataset(dataset):
+def query_lumis_in_files(files, client=None):
+    ''' Get the lumis of many files, concurrently
+
+    Returns a dict mapping each file to its set of (run, lumi) tuples.
+
+    '''
+    client = client or default_client()
+    files = list(files)
+    results = client.query_many([_lumi_query(x) for x in files])
+    return dict((file, _parse_lumis(result))
+                for file, result in zip(files, results))
+
+def query_lumis_in_dataset(dataset, client=None):
     ''' Get all lumis in a dataset '''
     lumis = set([])
-    for file in query_files(dataset):
-        lumis |= query_lumis(file)
+    for file_lumis in query_lumis_in_files(
+            query_files(dataset, client), client).itervalues():
+        lumis |= file_lumis
     return json_summary(lumis)
 
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ import json
 import os
 from FinalStateAnalysis.MetaData.datatools import query_pattuple
 from FinalStateAnalysis.MetaData.dbslumis import query_lumis_in_dataset
+from FinalStateAnalysis.MetaData.dasquery import DASClient, DEFAULT_TTL
 import sys
 
 log = logging.getLogger("get_tuple_info")
@@ -27,6 +28,11 @@ if __name__ == "__main__":
                         help='Rebuild the output json from scratch')
     parser.add_argument('--verbose', default=False, action='store_true',
                         help='Increase verbosity')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Maximum number of concurrent DAS queries')
+    parser.add_argument('--cache-ttl', dest='ttl', type=int,
+                        default=DEFAULT_TTL, help='Time (s) the DAS responses'
+                        ' are cached.  Use 0 to disable the cache.')
 
     args = parser.parse_args()
 
@@ -35,6 +41,8 @@ if __name__ == "__main__":
         level = logging.DEBUG
     logging.basicConfig(level=level, stream=sys.stderr)
 
+    client = DASClient(ttl=args.ttl, max_concurrent=args.threads)
+
     tuple_info = {}
     # If desired, don't repeat calls
     if not args.update and os.path.exists(args.output):
@@ -47,7 +55,7 @@ if __name__ == "__main__":
                 dataset = line.strip()
                 if dataset not in tuple_info:
                     log.info("Querying DAS for %s" % dataset)
-                    info = query_pattuple(dataset)
+                    info = query_pattuple(dataset, client)
                     tuple_info[dataset] = info
 
         log.info("Checking if we need to compute lumi results")
@@ -56,7 +64,8 @@ if __name__ == "__main__":
                 log.info("Getting lumis for sample %s", sample)
                 # Ony update the files we don't have
                 current_lumimask = sample_info.setdefault('lumimask', {})
-                lumis = query_lumis_in_dataset(sample, current_lumimask)
+                lumis = query_lumis_in_dataset(sample, current_lumimask,
+                                               client=client)
                 sample_info['lumimask'] = lumis
 
     finally:
@@ -0,0 +1,114 @@
+'''
+
+Test of the DAS query layer against a local stub DAS server.
+
+The stub answers /das/cache?input=QUERY with a JSON record echoing the
+query, and can be told to fail the first requests with HTTP 503.  Queries
+containing 'refused' get a response with a failed DAS status.
+
+'''
+
+import BaseHTTPServer
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import urlparse
+from FinalStateAnalysis.MetaData.dasquery import DASClient, DASQueryError
+
+
+class StubDASHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        params = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        query = params['input'][0]
+        with server.lock:
+            server.requests.append(query)
+            fail = server.failures > 0 or 'broken' in query
+            if server.failures > 0:
+                server.failures -= 1
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        if 'refused' in query:
+            self.wfile.write(json.dumps(
+                {'status': 'fail', 'reason': 'refused', 'data': []}))
+            return
+        self.wfile.write(json.dumps(
+            {'status': 'ok', 'data': [{'query': query}]}))
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDASQuery(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(
+            ('127.0.0.1', 0), StubDASHandler)
+        self.server.requests = []
+        self.server.failures = 0
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.client = DASClient(
+            host='http://127.0.0.1:%i' % self.server.server_address[1],
+            cache_dir=self.cache_dir, retries=2, backoff=0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_query_is_cached(self):
+        first = self.client.query('file dataset=/A/B/C')
+        second = self.client.query('file dataset=/A/B/C')
+        self.assertEqual(first, {'status': 'ok',
+                                 'data': [{'query': 'file dataset=/A/B/C'}]})
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_retry(self):
+        self.server.failures = 2
+        result = self.client.query('file dataset=/A/B/C')
+        self.assertEqual(result['data'][0]['query'], 'file dataset=/A/B/C')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_failed_status_is_not_cached(self):
+        self.assertRaises(DASQueryError, self.client.query, 'file refused')
+        # Retried, then not cached
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertRaises(DASQueryError, self.client.query, 'file refused')
+        self.assertEqual(len(self.server.requests), 6)
+
+    def test_query_many(self):
+        queries = ['lumi file=%i' % (i % 10) for i in range(30)]
+        results = self.client.query_many(queries)
+        self.assertEqual([x['data'][0]['query'] for x in results], queries)
+        # Duplicates are only sent once
+        self.assertEqual(len(self.server.requests), 10)
+
+    def test_query_many_stops_workers(self):
+        before = threading.active_count()
+        for i in range(5):
+            self.client.query_many(['lumi file=%i' % j for j in range(10)])
+        self.assertEqual(threading.active_count(), before)
+
+    def test_failures_are_reported(self):
+        queries = ['lumi file=1', 'lumi file=broken', 'lumi file=2']
+        self.assertRaises(DASQueryError, self.client.query_many, queries)
+        # The good ones are kept in the cache
+        self.client.query_many(['lumi file=1', 'lumi file=2'])
+        self.assertEqual(
+            sorted(set(self.server.requests)),
+            ['lumi file=1', 'lumi file=2', 'lumi file=broken'])
+        self.assertEqual(self.server.requests.count('lumi file=1'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
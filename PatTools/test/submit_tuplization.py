@@ -10,8 +10,8 @@ Description: submit UW pattuple jobs via condor.
 '''
 
 from RecoLuminosity.LumiDB import argparse
-import fnmatch
 from FinalStateAnalysis.MetaData.datadefs import datadefs
+from FinalStateAnalysis.MetaData.dataquery import DatasetCatalog
 from FinalStateAnalysis.Utilities.version import fsa_version
 from FinalStateAnalysis.Utilities.dbsinterface import get_das_info
 from FinalStateAnalysis.PatTools.pattuple_option_configurator import \
@@ -43,21 +43,12 @@ jobId = args.jobid
 print " # Job ID: %s Version: %s" % (jobId, fsa_version())
 print 'export TERMCAP=screen'
 
-def any_matches(regexes, string):
-    for regex in regexes:
-        if fnmatch.fnmatchcase(string, regex):
-            return True
-    return False
-
-to_be_used = []
-for key, info in datadefs.iteritems():
-    if args.samples:
-        if any_matches(args.samples, key):
-            to_be_used.append(key)
-    if 'datasetpath' in info and args.dbsnames:
-        dbs = info['datasetpath']
-        if any_matches(args.dbsnames, dbs):
-            to_be_used.append(key)            
+catalog = DatasetCatalog(datadefs)
+to_be_used = set()
+if args.samples:
+    to_be_used.update(catalog.query(name=args.samples))
+if args.dbsnames:
+    to_be_used.update(catalog.query(dataset=args.dbsnames))
 
 production_info = {}
 
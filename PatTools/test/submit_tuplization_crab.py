@@ -11,8 +11,8 @@ submit_tuplization.py
 
 
 from RecoLuminosity.LumiDB import argparse
-import fnmatch
 from FinalStateAnalysis.MetaData.datadefs import datadefs
+from FinalStateAnalysis.MetaData.dataquery import DatasetCatalog
 from FinalStateAnalysis.Utilities.version import fsa_version
 from FinalStateAnalysis.PatTools.pattuple_option_configurator import \
         configure_pat_tuple
@@ -57,18 +57,9 @@ f.write('[MULTICRAB]\ncfg = crab.cfg\n')
 f.write('[COMMON]\nCMSSW.get_edm_output = 1\n\n')
 
 # Loop over samples
-for sample in sorted(datadefs.keys()):
+# Filter by sample wildcards
+for sample in DatasetCatalog(datadefs).query(name=args.samples):
     sample_info = datadefs[sample]
-    passes_filter = True
-    # Filter by sample wildcards
-    if args.samples:
-        passes_wildcard = False
-        for pattern in args.samples:
-            if fnmatch.fnmatchcase(sample, pattern):
-                passes_wildcard = True
-        passes_filter = passes_wildcard and passes_filter
-    if not passes_filter:
-        continue
 
     f.write('[')
     f.write(sample)
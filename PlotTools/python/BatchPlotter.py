@@ -0,0 +1,138 @@
+'''
+
+Render many plots in parallel with a pool of Plotters.
+
+Each worker process builds its own Plotter (own canvas, views and file
+handles over the same input files) in ROOT batch mode, then renders the
+plots it is given.  A plot is described by a dict:
+
+    {
+        'filename' : 'os/m_vis',        # name passed to Plotter.save
+        'method'   : 'plot_mc_vs_data', # Plotter method (default)
+        'save'     : {'dotroot' : True},# options of Plotter.save (optional)
+        # All other keys are passed to the method, i.e.
+        'folder'   : 'os/',
+        'variable' : 'm_vis',
+        'rebin'    : 5,
+        'xrange'   : (0, 200),
+        'show_ratio' : True,
+    }
+
+A plot that fails is reported (with its traceback) without stopping the
+others.  Example:
+
+    failed = render_plots(MyPlotter, specs, nworkers=16,
+                          args=(files, lumifiles, 'plots'))
+
+The factory (the Plotter class or a function building it), its arguments
+and the specs must be picklable, i.e. use module level functions for
+preprocess etc.
+
+'''
+
+import logging
+import multiprocessing
+import time
+import traceback
+
+log = logging.getLogger(__name__)
+
+# Default maximum time to wait for the next plot, in seconds.  A worker
+# which dies (e.g. segfault in ROOT) never returns its plot, so don't wait
+# for ever.
+DEFAULT_TIMEOUT = 5 * 60
+
+# The Plotter of this process, built by _init_worker
+_plotter = None
+# The error raised while building it, if any
+_plotter_error = None
+
+
+def _init_worker(factory, args, kwargs):
+    ''' Build the Plotter of a worker process '''
+    global _plotter, _plotter_error
+    import ROOT
+    ROOT.gROOT.SetBatch(True)
+    try:
+        _plotter = factory(*args, **kwargs)
+    except Exception:
+        # Don't let the worker die, or the pool would keep restarting it.
+        _plotter_error = traceback.format_exc()
+
+
+def _render(spec):
+    ''' Render one plot.  Returns (filename, error or None) '''
+    spec = dict(spec)
+    filename = spec.pop('filename')
+    method = spec.pop('method', 'plot_mc_vs_data')
+    save_options = spec.pop('save', {})
+    if _plotter_error is not None:
+        return filename, _plotter_error
+    try:
+        getattr(_plotter, method)(**spec)
+        _plotter.save(filename, **save_options)
+    except Exception:
+        error = traceback.format_exc()
+        # Don't leave half a plot on the canvas
+        _plotter.reset()
+        return filename, error
+    return filename, None
+
+
+def render_plots(factory, specs, nworkers=None, args=(), kwargs=None,
+                 timeout=DEFAULT_TIMEOUT):
+    ''' Render the plot [specs] with [nworkers] processes
+
+    Each worker builds its Plotter by calling factory(*args, **kwargs).
+    If [nworkers] is None, one per CPU is used.  Returns the list of
+    (filename, traceback) of the plots which failed.
+
+    If no plot is finished within [timeout] seconds, the pool is stopped
+    and the plots which are not done are reported as failed.
+
+    '''
+    if not specs:
+        return []
+    if nworkers is None:
+        nworkers = multiprocessing.cpu_count()
+    nworkers = max(1, min(nworkers, len(specs)))
+    kwargs = kwargs or {}
+    start = time.time()
+    failed = []
+    done = set()
+
+    def collect(results):
+        for i, (filename, error) in enumerate(results):
+            done.add(filename)
+            if error is not None:
+                log.error("Plot %s failed:\n%s", filename, error)
+                failed.append((filename, error))
+            else:
+                log.info("[%i/%i] saved %s", i + 1, len(specs), filename)
+
+    if nworkers == 1:
+        _init_worker(factory, args, kwargs)
+        collect(_render(spec) for spec in specs)
+    else:
+        pool = multiprocessing.Pool(nworkers, _init_worker,
+                                    (factory, args, kwargs))
+        try:
+            results = pool.imap_unordered(_render, specs, chunksize=1)
+            # The timeout is also needed to deliver KeyboardInterrupt
+            collect(results.next(timeout=timeout) for _ in specs)
+            pool.close()
+        except multiprocessing.TimeoutError:
+            pool.terminate()
+            error = "No plot finished in %i s, worker died or hung" % timeout
+            for spec in specs:
+                if spec['filename'] not in done:
+                    log.error("Plot %s failed: %s", spec['filename'], error)
+                    failed.append((spec['filename'], error))
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    log.info("Rendered %i plots (%i failed) with %i workers in %0.1f s",
+             len(specs), len(failed), nworkers, time.time() - start)
+    return failed
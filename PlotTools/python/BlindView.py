@@ -13,17 +13,21 @@ Author: Evan K. Friis, UW Madison
 '''
 
 from rootpy.plotting import views
+from HistArrays import contents, errors, set_errors
 import re
 
 def blind_in_range(start, end):
-    ''' Make a functor to blind a TH1 between start and end '''
+    ''' Make a functor to blind a histogram between start and end
+
+    The range is applied on the x axis.
+    '''
     def blind(histo):
-        startbin = histo.FindBin(start)
-        endbin = histo.FindBin(end)
-        for i in range(startbin, endbin+1):
-            histo.SetBinContent(i, 0)
-            histo.SetBinError(i, 0)
-        return histo
+        startbin = histo.GetXaxis().FindBin(start)
+        endbin = histo.GetXaxis().FindBin(end)
+        errs = errors(histo)
+        errs[startbin:endbin+1] = 0
+        contents(histo)[startbin:endbin+1] = 0
+        return set_errors(histo, errs)
     return blind
 
 def set_to_zero(histo):
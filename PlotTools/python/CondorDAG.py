@@ -20,13 +20,31 @@ def get_jobs(dagfile):
                 yield (fields[1], fields[2])
 
 
+def get_done_jobs(dagfile):
+    """ Generate the jobids marked as DONE in the DAG file. """
+    with open(dagfile, 'r') as dag:
+        for line in dag:
+            if line.startswith('JOB'):
+                fields = line.strip().split()
+                if fields[-1].upper() == 'DONE':
+                    yield fields[1]
+
+
 def get_edges(dagfile):
-    """ Generate list of (parentid, childid) dependencies in the DAG file. """
+    """ Generate list of (parentid, childid) dependencies in the DAG file.
+
+    A line can have several parents and children:
+    PARENT p1 p2 CHILD c1 c2
+
+    """
     with open(dagfile, 'r') as dag:
         for line in dag:
             if line.startswith('PARENT'):
-                fields = line.strip().split(' ')
-                yield (fields[1], fields[3])
+                fields = line.strip().split()
+                child_idx = fields.index('CHILD')
+                for parent in fields[1:child_idx]:
+                    for child in fields[child_idx + 1:]:
+                        yield (parent, child)
 
 
 class CondorDAGJob(object):
@@ -37,6 +55,8 @@ class CondorDAGJob(object):
         self.daughters = []
         self.parents = []
         self.status = ("UNKNOWN", "")
+        # Marked as DONE in the DAG file
+        self.done = False
 
     def __hash__(self):
         """ The jobname is always unique. """
@@ -78,6 +98,8 @@ class CondorDAG(object):
         self.dagfile = dagfile
         for jobid, submitfile in get_jobs(dagfile):
             self.nodes[jobid] = CondorDAGJob(jobid, submitfile)
+        for jobid in get_done_jobs(dagfile):
+            self.nodes[jobid].done = True
         for parent, child in get_edges(dagfile):
             self.nodes[parent].daughters.append(self.nodes[child])
             self.nodes[child].parents.append(self.nodes[parent])
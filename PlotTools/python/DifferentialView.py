@@ -13,10 +13,13 @@ except ImportError:
     from rootpy import asrootpy
 import ROOT
 import os
+from HistArrays import divide_by_bin_width
 
 class DifferentialView(views._FolderView):
     ''' Scales a histogram content by the bin width.
 
+    For 2D and 3D histograms, the content is scaled by the bin area/volume.
+
     The original histogram is unmodified, a clone is returned.
 
     '''
@@ -25,11 +28,5 @@ class DifferentialView(views._FolderView):
 
     def apply_view(self, object):
         object = object.Clone()
-        for i in range(0, object.GetNbinsX()+2): #scale underflow/overflow too
-            content = object.GetBinContent(i)
-            error   = object.GetBinError(i)
-            width   = object.GetBinWidth(i)  
-            object.SetBinContent(i, content / width)
-            object.SetBinError(i, error / width)  
-
-        return object
+        #scale underflow/overflow too
+        return divide_by_bin_width(object)
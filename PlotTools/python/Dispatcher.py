@@ -29,7 +29,7 @@ def group_list(files, n=1):
 class MegaDispatcher(object):
     log = multiprocessing.get_logger()
     def __init__(self, files, treename, output_file, selector, nworkers,
-                 nchain=1):
+                 nchain=1, merger=MegaMerger, **kwargs):
         self.files = files
         self.treename = treename
         self.output_file = output_file
@@ -37,10 +37,15 @@ class MegaDispatcher(object):
         self.nworkers = nworkers
         # Figure out how many inputs to chain together
         self.nchain=nchain
+        # Process which collects the worker outputs
+        self.merger = merger
+        # Passed to selector
+        self.options = kwargs
 
     def build_workers(self, input_q, result_q):
         workers = [
-            MegaWorker(input_q, result_q, self.treename, self.selector)
+            MegaWorker(input_q, result_q, self.treename, self.selector,
+                       **self.options)
             for x in range(self.nworkers)
         ]
         return workers
@@ -71,7 +76,7 @@ class MegaDispatcher(object):
             self.log.info("Started %i workers", len(workers))
 
             # Start the merger
-            merger = MegaMerger(result_q, self.output_file, len(self.files))
+            merger = self.merger(result_q, self.output_file, len(self.files))
             merger.start()
 
             self.log.info("Started the merger process")
@@ -0,0 +1,144 @@
+'''
+
+Precompute the entries of a TTree (or TChain) which pass a TTreeFormula
+selection string.
+
+The entries are computed once per file using a TEntryList, instead of
+evaluating the formula for every entry of the tree.  The result can
+optionally be cached on disk, keyed by the file (path, size and mtime),
+the path to the tree and the selection string.  The cache directory can
+be given explicitly or via the $megaentrylists environment variable.
+
+The cython proxies generated by make_cython_proxy.py use this in their
+where(...) method.
+
+'''
+
+from array import array
+import hashlib
+import logging
+import os
+import ROOT
+
+log = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    ''' Get the entry list cache directory from the environment '''
+    return os.environ.get('megaentrylists', None)
+
+
+def cache_key(filename, treepath, selection):
+    ''' Build the cache key for a (file, tree, selection) combination.
+
+    Returns None if the file is not on a local/mounted file system (i.e.
+    xrootd), since we can't check if it has changed.
+
+    '''
+    if filename.startswith('root://'):
+        return None
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    hash = hashlib.md5()
+    hash.update(os.path.abspath(filename))
+    hash.update('%i:%i' % (stat.st_size, int(stat.st_mtime)))
+    hash.update(treepath)
+    hash.update(selection)
+    return hash.hexdigest()
+
+
+def _read_cache(cache_file):
+    ''' Read cached (nentries, entries) from a binary file '''
+    entries = array('l')
+    with open(cache_file, 'rb') as cache:
+        cache.seek(0, os.SEEK_END)
+        nitems = cache.tell() / entries.itemsize
+        cache.seek(0)
+        entries.fromfile(cache, nitems)
+    # First item is the total number of entries in the tree.
+    return entries[0], entries[1:]
+
+
+def _write_cache(cache_file, nentries, entries):
+    ''' Atomically write (nentries, entries) to a binary file '''
+    tmp_file = '%s.%i.tmp' % (cache_file, os.getpid())
+    with open(tmp_file, 'wb') as cache:
+        array('l', [nentries]).tofile(cache)
+        entries.tofile(cache)
+    os.rename(tmp_file, cache_file)
+
+
+def tree_entry_list(tree, selection):
+    ''' Get the local entries of a TTree which pass the selection
+
+    Returns a tuple of (nentries in tree, array of passing entries)
+
+    '''
+    name = 'fsa_entrylist_%i' % id(tree)
+    tree.Draw('>>' + name, selection, 'entrylist')
+    elist = ROOT.gDirectory.Get(name)
+    entries = array('l')
+    if elist:
+        nentries = elist.GetN()
+        # Reading it sequentially is the fast path in TEntryList
+        entries.extend(elist.GetEntry(i) for i in xrange(nentries))
+        elist.SetDirectory(0)
+        elist.Delete()
+    return tree.GetEntries(), entries
+
+
+def file_entry_list(filename, treepath, selection, cache_dir=None):
+    ''' Get the entries of a tree in a file which pass the selection
+
+    Returns a tuple of (nentries in tree, array of passing entries)
+
+    '''
+    cache_file = None
+    if cache_dir is not None:
+        key = cache_key(filename, treepath, selection)
+        if key is not None:
+            cache_file = os.path.join(cache_dir, key + '.elist')
+            if os.path.exists(cache_file):
+                log.debug("Using cached entry list %s for %s",
+                          cache_file, filename)
+                return _read_cache(cache_file)
+
+    tfile = ROOT.TFile.Open(filename, 'READ')
+    if not tfile:
+        raise IOError("Can't open ROOT file: %s" % filename)
+    tree = tfile.Get(treepath)
+    if not tree:
+        raise IOError("Can't get tree: %s from file: %s" %
+                      (treepath, filename))
+    nentries, entries = tree_entry_list(tree, selection)
+    tfile.Close()
+
+    if cache_file is not None:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        _write_cache(cache_file, nentries, entries)
+    return nentries, entries
+
+
+def chain_entry_lists(tree, selection, cache_dir=None):
+    ''' Generate the entries of a TTree or TChain passing the selection
+
+    Yields tuples of (offset, entries) for each file in the chain, where
+    offset is the global entry number of the first entry in the file and
+    entries are the local passing entry numbers in that file.  The global
+    entry numbers are offset + entry.
+
+    '''
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    if not isinstance(tree, ROOT.TChain):
+        yield 0, tree_entry_list(tree, selection)[1]
+        return
+    offset = 0
+    for element in tree.GetListOfFiles():
+        nentries, entries = file_entry_list(
+            element.GetTitle(), element.GetName(), selection, cache_dir)
+        yield offset, entries
+        offset += nentries
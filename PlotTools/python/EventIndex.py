@@ -0,0 +1,220 @@
+'''
+
+Run/lumi/event indices for random access into FSA ntuples.
+
+An index maps each (run, lumi, evt) in a tree to its entry numbers.  The
+(run, evt) pair is packed into a single 64-bit key::
+
+    key = run << 40 | evt
+
+and the keys are stored sorted, so lookups are a binary search.  The lumi
+is kept alongside each key and checked on lookup.  Note that the FSA
+ntuples can contain several rows (candidates) for the same event, so a
+lookup returns a list of entries.
+
+The index is stored as a .npz sidecar file in the index directory, if one
+is given explicitly.  Otherwise it goes next to the ntuple
+(file.root.path_to_tree.evtidx.npz), or in $megaeventindex if the ntuple
+directory is not writable.  It records the size and mtime of the ntuple,
+and is ignored if the ntuple has changed.
+
+Build the indices with index_fsa_events.py.  scan_event.py and
+pick_fsa_events.py use them when they are present.
+
+'''
+
+import hashlib
+import logging
+import os
+import numpy
+
+log = logging.getLogger(__name__)
+
+_EVT_BITS = 40
+_RUN_BITS = 24
+
+
+def pack(run, evt):
+    ''' Pack a run and event number into a 64-bit key.
+
+    Works on scalars and numpy arrays.
+    '''
+    return (numpy.uint64(run) << numpy.uint64(_EVT_BITS)) | numpy.uint64(evt)
+
+
+def unpack(key):
+    ''' Unpack a key into (run, evt) '''
+    key = numpy.uint64(key)
+    return (int(key >> numpy.uint64(_EVT_BITS)),
+            int(key & numpy.uint64((1 << _EVT_BITS) - 1)))
+
+
+class EventIndex(object):
+    ''' Sorted (run, evt) keys mapped to entry numbers in a tree '''
+    def __init__(self, keys, lumis, entries, treepath=''):
+        order = numpy.argsort(keys, kind='mergesort')
+        self.keys = numpy.asarray(keys, dtype=numpy.uint64)[order]
+        self.lumis = numpy.asarray(lumis, dtype=numpy.uint32)[order]
+        self.entries = numpy.asarray(entries, dtype=numpy.int64)[order]
+        self.treepath = treepath
+
+    @property
+    def nentries(self):
+        ''' Number of entries in the indexed tree '''
+        return len(self.keys)
+
+    @classmethod
+    def from_arrays(cls, runs, lumis, evts, treepath=''):
+        ''' Build from the run, lumi, evt values of each entry in order '''
+        runs = numpy.asarray(runs, dtype=numpy.uint64)
+        evts = numpy.asarray(evts, dtype=numpy.uint64)
+        if len(runs) and (runs.max() >= 2 ** _RUN_BITS or
+                          evts.max() >= 2 ** _EVT_BITS):
+            raise ValueError("Run or event number too large to pack")
+        return cls(pack(runs, evts), lumis,
+                   numpy.arange(len(runs), dtype=numpy.int64), treepath)
+
+    @classmethod
+    def from_tree(cls, tree, treepath=''):
+        ''' Build the index by reading the run, lumi and evt branches '''
+        nentries = tree.GetEntries()
+        tree.SetEstimate(nentries + 1)
+        tree.Draw('run:lumi:evt', '', 'goff')
+        columns = []
+        for buffer in (tree.GetV1(), tree.GetV2(), tree.GetV3()):
+            buffer.SetSize(nentries)
+            columns.append(numpy.frombuffer(buffer, dtype=numpy.float64,
+                                            count=nentries).copy())
+        return cls.from_arrays(*columns, treepath=treepath)
+
+    def find(self, run, lumi, evt):
+        ''' Get the (sorted) list of entries for a given event '''
+        key = pack(run, evt)
+        first = numpy.searchsorted(self.keys, key, side='left')
+        last = numpy.searchsorted(self.keys, key, side='right')
+        matches = self.lumis[first:last] == lumi
+        return sorted(int(x) for x in self.entries[first:last][matches])
+
+    def find_many(self, events):
+        ''' Get a dict mapping (run, lumi, evt) => [entries]
+
+        Only events which are found are included.
+        '''
+        output = {}
+        for run, lumi, evt in events:
+            entries = self.find(run, lumi, evt)
+            if entries:
+                output[(run, lumi, evt)] = entries
+        return output
+
+    def save(self, filename, size, mtime):
+        ''' Write the index, tagged with the size/mtime of the ntuple '''
+        tmp_file = '%s.%i.tmp.npz' % (filename, os.getpid())
+        numpy.savez(tmp_file, keys=self.keys, lumis=self.lumis,
+                    entries=self.entries, treepath=self.treepath,
+                    size=size, mtime=mtime)
+        os.rename(tmp_file, filename)
+
+
+def default_index_dir():
+    ''' Get the index directory from the environment '''
+    return os.environ.get('megaeventindex', None)
+
+
+def index_path(filename, treepath, index_dir=None):
+    ''' Where the index for the tree in the given file lives
+
+    If [index_dir] is None, this is the sidecar next to the ntuple.
+    '''
+    tag = treepath.replace('/', '_')
+    if index_dir is None:
+        return '%s.%s.evtidx.npz' % (filename, tag)
+    hash = hashlib.md5(os.path.abspath(filename)).hexdigest()
+    return os.path.join(index_dir, '%s.%s.evtidx.npz' % (hash, tag))
+
+
+def find_index_path(filename, treepath, index_dir=None):
+    ''' Get the path of an existing index, or None
+
+    Without an explicit [index_dir], looks next to the ntuple, then in
+    $megaeventindex.
+    '''
+    if index_dir is not None:
+        candidates = [index_path(filename, treepath, index_dir)]
+    else:
+        candidates = [index_path(filename, treepath)]
+        if default_index_dir() is not None:
+            candidates.append(
+                index_path(filename, treepath, default_index_dir()))
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def writable_index_path(filename, treepath, index_dir=None):
+    ''' Where to write the index for the tree in the given file
+
+    Without an explicit [index_dir], this is next to the ntuple if its
+    directory is writable, otherwise in $megaeventindex.
+    '''
+    if index_dir is None:
+        dirname = os.path.dirname(os.path.abspath(filename))
+        if not os.access(dirname, os.W_OK):
+            index_dir = default_index_dir()
+            if index_dir is None:
+                raise IOError(
+                    "Can't write the index of %s: %s is not writable, use "
+                    "--index-dir or set $megaeventindex" % (filename, dirname))
+    return index_path(filename, treepath, index_dir)
+
+
+def load_index(filename, treepath, index_dir=None):
+    ''' Load the index of a tree in a file
+
+    Returns None if there is no index, or the file has changed since the
+    index was built.
+    '''
+    if filename.startswith('root://'):
+        return None
+    sidecar = find_index_path(filename, treepath, index_dir)
+    if sidecar is None:
+        return None
+    stat = os.stat(filename)
+    stored = numpy.load(sidecar)
+    if int(stored['size']) != stat.st_size or \
+       int(stored['mtime']) != int(stat.st_mtime):
+        log.info("Index %s is out of date", sidecar)
+        return None
+    output = EventIndex.__new__(EventIndex)
+    # Already sorted, don't redo it.
+    output.keys = stored['keys']
+    output.lumis = stored['lumis']
+    output.entries = stored['entries']
+    output.treepath = str(stored['treepath'])
+    return output
+
+
+def build_index(filename, treepath, index_dir=None, force=False):
+    ''' Get the index of a tree in a file, building it if necessary '''
+    if not force:
+        index = load_index(filename, treepath, index_dir)
+        if index is not None:
+            return index
+    # Fail before reading the tree if there is nowhere to put the index
+    sidecar = writable_index_path(filename, treepath, index_dir)
+    import ROOT
+    stat = os.stat(filename)
+    tfile = ROOT.TFile.Open(filename, 'READ')
+    if not tfile:
+        raise IOError("Can't open ROOT file: %s" % filename)
+    tree = tfile.Get(treepath)
+    if not tree:
+        raise IOError("Can't get tree: %s from file: %s" %
+                      (treepath, filename))
+    index = EventIndex.from_tree(tree, treepath)
+    tfile.Close()
+    if not os.path.exists(os.path.dirname(os.path.abspath(sidecar))):
+        os.makedirs(os.path.dirname(os.path.abspath(sidecar)))
+    index.save(sidecar, stat.st_size, int(stat.st_mtime))
+    return index
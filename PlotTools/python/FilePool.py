@@ -0,0 +1,201 @@
+'''
+
+Lazily opened ROOT files, with a bounded number of open file handles.
+
+A LazyFile behaves like a (rootpy) ROOT file, but is only opened on first
+use.  The open files are managed by a FilePool, which closes the least
+recently used file when more than max_open files are open.  A closed
+LazyFile is transparently reopened when it is used again.
+
+The objects returned by LazyFile.Get (histograms, directories, ...) still
+belong to the file, and are deleted when it is closed.  The pool remembers
+the objects it gave out, and keeps their files open until the caller calls
+FilePool.release() to say it's done with them (the Plotter does after each
+plot).  If all the open files are in use, it keeps more than max_open
+files open.  Histograms which were detached from their file since (e.g.
+kept by a CachedView, see HistCache.py) don't keep it open.
+
+A file which changed on disk since it was opened is reopened, so the new
+contents are read.  The old handle is closed once its objects are
+released.
+
+'''
+
+from collections import OrderedDict
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+# Default maximum number of open files
+DEFAULT_MAX_OPEN = int(os.environ.get('megamaxopenfiles', 100))
+
+
+def file_mtime(filename):
+    ''' Modification time of a local file, None if unknown (e.g. remote) '''
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
+
+def attached(handles):
+    ''' The objects of the dict [handles] which still belong to the file '''
+    import ROOT
+    output = {}
+    for key, handle in handles.iteritems():
+        # Detached histograms (e.g. cached) don't need the file
+        if isinstance(handle, ROOT.TH1) and not handle.GetDirectory():
+            continue
+        output[key] = handle
+    return output
+
+
+class FilePool(object):
+    ''' Keeps at most max_open files open, closing the least recently used '''
+    def __init__(self, max_open=DEFAULT_MAX_OPEN):
+        self.max_open = max_open
+        # filename => open file, least recently used first
+        self.open_files = OrderedDict()
+        # filename => {path: object} of the file given out, not released
+        self.handles = {}
+        # filename => modification time when it was opened
+        self.mtimes = {}
+        # (filename, file, objects given out) of files replaced by a newer
+        # version
+        self.retired = []
+        self.nopens = 0
+
+    def track(self, filename, key, obj):
+        ''' Keep the file open until [obj] (from the file) is released
+
+        [key] identifies the object in the file, so fetching it again
+        doesn't grow the list.
+        '''
+        if obj is not None:
+            self.handles.setdefault(filename, {})[key] = obj
+        return obj
+
+    def in_use(self, filename):
+        ''' Check if objects of the file given out are not released '''
+        handles = attached(self.handles.get(filename, {}))
+        if handles:
+            self.handles[filename] = handles
+        else:
+            self.handles.pop(filename, None)
+        return bool(handles)
+
+    def release(self, filename=None):
+        ''' Declare the objects given out of a file (default: all files) as
+        no longer used, so the file can be closed.
+        '''
+        if filename is None:
+            self.handles.clear()
+            released, self.retired = self.retired, []
+        else:
+            self.handles.pop(filename, None)
+            released = [x for x in self.retired if x[0] == filename]
+            self.retired = [x for x in self.retired if x[0] != filename]
+        for _, tfile, _ in released:
+            tfile.Close()
+
+    def retire(self, filename):
+        ''' Stop using the open file, closing it when its objects are
+        released
+        '''
+        tfile = self.open_files.pop(filename, None)
+        if tfile is not None:
+            self.retired.append(
+                (filename, tfile, self.handles.pop(filename, {})))
+        self.close_retired()
+
+    def close_retired(self):
+        ''' Close the replaced files whose objects were all detached '''
+        still_used = []
+        for filename, tfile, handles in self.retired:
+            handles = attached(handles)
+            if handles:
+                still_used.append((filename, tfile, handles))
+            else:
+                tfile.Close()
+        self.retired = still_used
+
+    def get(self, filename):
+        ''' Get the open file, opening it if necessary '''
+        if self.retired:
+            self.close_retired()
+        if filename in self.open_files:
+            if file_mtime(filename) == self.mtimes.get(filename):
+                tfile = self.open_files.pop(filename)
+                self.open_files[filename] = tfile
+                return tfile
+            log.info("%s changed on disk, reopening it", filename)
+            self.retire(filename)
+        if len(self.open_files) >= self.max_open:
+            idle = [x for x in self.open_files if not self.in_use(x)]
+            for oldest in idle[:len(self.open_files) - self.max_open + 1]:
+                self.close(oldest)
+            if len(self.open_files) >= self.max_open:
+                log.debug("All %i open files are in use, opening one more",
+                          len(self.open_files))
+        import ROOT
+        import rootpy.io as io
+        log.debug("Opening %s", filename)
+        self.mtimes[filename] = file_mtime(filename)
+        tfile = io.open(filename)
+        # Opening a file makes it the current directory - don't let newly
+        # created objects end up in it.
+        ROOT.gROOT.cd()
+        self.nopens += 1
+        self.open_files[filename] = tfile
+        return tfile
+
+    def close(self, filename):
+        ''' Close a file, if it is open
+
+        The objects of the file given out are deleted.
+        '''
+        self.handles.pop(filename, None)
+        tfile = self.open_files.pop(filename, None)
+        if tfile is not None:
+            log.debug("Closing %s", filename)
+            tfile.Close()
+
+    def close_all(self):
+        for filename in list(self.open_files):
+            self.close(filename)
+        for _, tfile, _ in self.retired:
+            tfile.Close()
+        self.retired = []
+
+
+# Pool used if none is specified.
+default_pool = FilePool()
+
+
+class LazyFile(object):
+    ''' A ROOT file which is opened on first use, through a FilePool '''
+    def __init__(self, filename, pool=None):
+        self.filename = filename
+        self.pool = pool if pool is not None else default_pool
+
+    def GetName(self):
+        return self.filename
+
+    def GetListOfKeys(self):
+        return self.pool.track(
+            self.filename, None, self.pool.get(self.filename).GetListOfKeys())
+
+    def Get(self, path):
+        # The object belongs to the file, which stays open until released
+        return self.pool.track(
+            self.filename, path, self.pool.get(self.filename).Get(path))
+
+    def Close(self):
+        self.pool.close(self.filename)
+
+    def __getattr__(self, name):
+        return getattr(self.pool.get(self.filename), name)
+
+    def __repr__(self):
+        return "LazyFile('%s')" % self.filename
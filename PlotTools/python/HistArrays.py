@@ -0,0 +1,242 @@
+'''
+
+NumPy access to the contents and errors of ROOT histograms.
+
+The bin contents and sum of weights squared of a TH1/TH2/TH3 are exposed
+as NumPy arrays which share the memory of the histogram (no copy), so
+whole-histogram operations can be done with array operations instead of
+looping over bins with GetBinContent/SetBinContent.
+
+The arrays include the under/overflow bins, and are indexed as
+array[x], array[x, y] or array[x, y, z] with the ROOT bin numbers, i.e.
+array[0] is the underflow and array[1:-1] are the bins in range.
+
+Example::
+
+    values = contents(histo)     # modifying values modifies histo
+    errs = errors(histo)         # a copy
+    errs[inner_bins(histo)] *= 1.1
+    set_errors(histo, errs)
+
+'''
+
+import array
+import numpy
+import ROOT
+
+# Storage type of the different histogram flavors
+_dtypes = [
+    (ROOT.TArrayD, numpy.float64),
+    (ROOT.TArrayF, numpy.float32),
+    (ROOT.TArrayI, numpy.int32),
+    (ROOT.TArrayS, numpy.int16),
+    (ROOT.TArrayC, numpy.int8),
+]
+
+
+def shape(hist):
+    ''' Shape of the arrays of a histogram, including under/overflow '''
+    output = (hist.GetNbinsX() + 2,)
+    if hist.GetDimension() > 1:
+        output += (hist.GetNbinsY() + 2,)
+    if hist.GetDimension() > 2:
+        output += (hist.GetNbinsZ() + 2,)
+    return output
+
+
+def inner_bins(hist):
+    ''' Index selecting the bins in range (no under/overflow) '''
+    return (slice(1, -1),) * hist.GetDimension()
+
+
+def _as_array(buffer, size, dtype, hist):
+    ''' Wrap a PyROOT buffer in an array with the shape of hist '''
+    buffer.SetSize(size)
+    flat = numpy.frombuffer(buffer, dtype=dtype, count=size)
+    # ROOT global bin = x + nx*(y + ny*z), i.e. x changes fastest
+    return flat.reshape(shape(hist), order='F')
+
+
+def contents(hist):
+    ''' The bin contents of the histogram, sharing its memory '''
+    for array_type, dtype in _dtypes:
+        if isinstance(hist, array_type):
+            return _as_array(hist.GetArray(), hist.GetSize(), dtype, hist)
+    raise TypeError("Don't know the storage type of %s" % hist)
+
+
+def sumw2(hist):
+    ''' The sum of weights squared, sharing the memory of the histogram.
+
+    Returns None if the histogram doesn't store them (see errors).
+    '''
+    if not hist.GetSumw2N():
+        return None
+    return _as_array(hist.GetSumw2().GetArray(), hist.GetSize(),
+                     numpy.float64, hist)
+
+
+def errors(hist):
+    ''' The bin errors of the histogram (a copy)
+
+    Like TH1::GetBinError, this is sqrt(|content|) if the histogram has
+    no sum of weights squared.
+    '''
+    weights = sumw2(hist)
+    if weights is not None:
+        weights = weights.copy()
+    if weights is None:
+        return numpy.sqrt(numpy.abs(contents(hist).astype(numpy.float64)))
+    return numpy.sqrt(weights)
+
+
+def set_contents(hist, values):
+    ''' Write the bin contents (including under/overflow) in one go '''
+    contents(hist)[...] = values
+    return hist
+
+
+def set_errors(hist, values):
+    ''' Write the bin errors (including under/overflow) in one go '''
+    if not hist.GetSumw2N():
+        hist.Sumw2()
+    sumw2(hist)[...] = numpy.square(values)
+    return hist
+
+
+def axis_edges(axis):
+    ''' The nbins + 1 bin edges of an axis '''
+    nbins = axis.GetNbins()
+    edges = axis.GetXbins()
+    if edges.GetSize():
+        buffer = edges.GetArray()
+        buffer.SetSize(nbins + 1)
+        return numpy.frombuffer(buffer, dtype=numpy.float64,
+                                count=nbins + 1).copy()
+    return numpy.linspace(axis.GetXmin(), axis.GetXmax(), nbins + 1)
+
+
+def bin_widths(axis):
+    ''' Widths of the bins of an axis, including under/overflow
+
+    Like TAxis::GetBinWidth, the under/overflow bins get the width of the
+    first/last bin.
+    '''
+    widths = numpy.diff(axis_edges(axis))
+    return numpy.concatenate(([widths[0]], widths, [widths[-1]]))
+
+
+def bin_volumes(hist):
+    ''' Product of the bin widths along each axis, shaped like contents '''
+    axes = [hist.GetXaxis(), hist.GetYaxis(), hist.GetZaxis()]
+    output = bin_widths(axes[0])
+    for axis in axes[1:hist.GetDimension()]:
+        output = numpy.multiply.outer(output, bin_widths(axis))
+    return output
+
+
+def divide_by_bin_width(hist):
+    ''' Divide the contents and errors by the bin width (area/volume in 2D
+    and 3D), in place.  Under/overflow bins are scaled too. '''
+    volumes = bin_volumes(hist)
+    errs = errors(hist)
+    set_contents(hist, contents(hist) / volumes)
+    set_errors(hist, errs / volumes)
+    return hist
+
+
+def edge_indices(old_edges, new_edges, tolerance=1e-8):
+    ''' Find the index of the old edge matching each of the new edges
+
+    Each new edge must match an old one within a relative [tolerance]
+    (absolute for an edge at 0), otherwise a ValueError is raised.
+
+    >>> edge_indices([0, 1, 2, 5, 10], [1, 5, 10])
+    array([1, 3, 4])
+    >>> edge_indices([0, 1, 2, 5, 10], [1, 4])
+    Traceback (most recent call last):
+        ...
+    ValueError: New bin edge 4.0 does not match any old bin edge, operation not permitted
+    '''
+    old_edges = numpy.asarray(old_edges, dtype=numpy.float64)
+    new_edges = numpy.asarray(new_edges, dtype=numpy.float64)
+    if numpy.any(numpy.diff(new_edges) <= 0):
+        raise ValueError("New bin edges %s are not increasing"
+                         % list(new_edges))
+    # The closest old edge is either just below or just above
+    above = numpy.searchsorted(old_edges, new_edges)
+    above = numpy.minimum(above, len(old_edges) - 1)
+    below = numpy.maximum(above - 1, 0)
+    closest = numpy.where(
+        numpy.abs(old_edges[above] - new_edges) <
+        numpy.abs(old_edges[below] - new_edges), above, below)
+    allowed = numpy.where(new_edges == 0, tolerance,
+                          tolerance * numpy.abs(new_edges))
+    bad = numpy.abs(old_edges[closest] - new_edges) >= allowed
+    if numpy.any(bad):
+        raise ValueError("New bin edge %s does not match any old bin edge, "
+                         "operation not permitted" % new_edges[bad][0])
+    return closest
+
+
+def merge_bins(values, old_edges, new_edges, axis=0):
+    ''' Sum the bins of [values] along [axis] into the new binning
+
+    [values] includes the under/overflow bins.  The old bins below (above)
+    the new range end up in the new underflow (overflow).
+
+    >>> merge_bins(numpy.arange(6), [0, 1, 2, 3, 4], [1, 3])
+    array([1, 5, 9])
+    '''
+    indices = edge_indices(old_edges, new_edges)
+    # Old bin i + 1 starts at old edge i
+    starts = numpy.concatenate(([0], indices + 1))
+    return numpy.add.reduceat(values, starts, axis=axis)
+
+
+def rebin(hist, *binnings):
+    ''' Rebin a histogram to variable bin edges, in place.
+
+    One list of edges per axis of the histogram; None keeps the binning of
+    that axis.  Every new edge must be an existing edge.  The contents and
+    sum of weights squared are merged with array operations.
+
+    Profiles are not supported (their bin entries would not be merged).
+
+    '''
+    if isinstance(hist, (ROOT.TProfile, ROOT.TProfile2D, ROOT.TProfile3D)):
+        raise TypeError("Can't rebin profile %s, use its Rebin method" %
+                        hist.GetName())
+    axes = [hist.GetXaxis(), hist.GetYaxis(), hist.GetZaxis()]
+    axes = axes[:hist.GetDimension()]
+    if len(binnings) != len(axes):
+        raise ValueError("Need %i binnings to rebin %s, got %i" % (
+            len(axes), hist.GetName(), len(binnings)))
+    values = contents(hist).copy()
+    weights = sumw2(hist)
+    if weights is not None:
+        weights = weights.copy()
+    new_edges = []
+    for i, (axis, binning) in enumerate(zip(axes, binnings)):
+        old_edges = axis_edges(axis)
+        if binning is None:
+            new_edges.append(old_edges)
+            continue
+        values = merge_bins(values, old_edges, binning, axis=i)
+        if weights is not None:
+            weights = merge_bins(weights, old_edges, binning, axis=i)
+        new_edges.append(numpy.asarray(binning, dtype=numpy.float64))
+    entries = hist.GetEntries()
+    args = []
+    for edges in new_edges:
+        args.extend([len(edges) - 1, array.array('d', edges)])
+    hist.SetBins(*args)
+    set_contents(hist, values)
+    if weights is not None:
+        sumw2(hist)[...] = weights
+    hist.SetEntries(entries)
+    return hist
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,196 @@
+'''
+
+Memoizing cache for histograms retrieved through views.
+
+Getting a histogram through a view chain (e.g. ScaleView => StyleView =>
+TitleView) reads it from disk and clones it at each step.  A CachedView
+keeps the result of each Get(path) in a HistogramCache, and returns a
+clone of the cached object on subsequent calls.
+
+The cache is keyed by (sample, view chain signature, path), is bounded in
+(approximate) bytes, evicting the least recently used objects, and an
+entry is invalidated when the modification time of any of its source
+files changes.  The files are then read again: a LazyFile reopens a file
+which changed since it was opened (see FilePool.py).
+
+>>> cache = HistogramCache(max_bytes=100)
+>>> cache.get('a', [], lambda: 'A', nbytes=60)
+'A'
+>>> cache.get('a', [], lambda: 'other', nbytes=60)
+'A'
+>>> cache.get('b', [], lambda: 'B', nbytes=60)
+'B'
+>>> cache.get('a', [], lambda: 'A2', nbytes=60)
+'A2'
+>>> sorted(cache.stats().items())
+[('bytes', 60), ('entries', 1), ('evictions', 2), ('hits', 1), ('invalidations', 0), ('misses', 3)]
+
+Objects from files without a known modification time aren't cached:
+
+>>> cache.get('c', ['root://host//store/c.root'], lambda: 'C', nbytes=10)
+'C'
+>>> cache.stats()['entries']
+1
+
+'''
+
+from collections import OrderedDict
+import logging
+from FinalStateAnalysis.PlotTools.FilePool import file_mtime
+
+log = logging.getLogger(__name__)
+
+# Default size of the cache
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def object_bytes(obj):
+    ''' Estimate the memory used by a histogram (or other object) '''
+    if hasattr(obj, 'GetNbinsX'):
+        # Every TH1 has GetNbinsY/Z, only count the axes it uses
+        dimension = obj.GetDimension() if hasattr(obj, 'GetDimension') else 1
+        ncells = obj.GetNbinsX() + 2
+        if dimension > 1:
+            ncells *= obj.GetNbinsY() + 2
+        if dimension > 2:
+            ncells *= obj.GetNbinsZ() + 2
+        # content and sum of weights squared
+        return 16 * ncells + 1024
+    return 1024
+
+
+def copy_object(obj):
+    ''' Clone an object, keeping the rootpy style '''
+    if not hasattr(obj, 'Clone'):
+        return obj
+    output = obj.Clone()
+    if hasattr(obj, 'decorators'):
+        output.decorate(**obj.decorators)
+    return output
+
+
+def view_signature(view):
+    ''' Build a string identifying a chain of views
+
+    Made from the class names and the simple (number/string) attributes of
+    the views in the chain, and the names of the files at the bottom.
+
+    '''
+    if hasattr(view, 'GetName') and hasattr(view, 'GetListOfKeys'):
+        return 'File(%s)' % view.GetName()
+    attributes = []
+    children = []
+    for name, value in sorted(vars(view).iteritems()):
+        if name == 'dir':
+            children.append(view_signature(value))
+        elif name == 'views':
+            children.extend(view_signature(x) for x in value)
+        elif isinstance(value, (int, long, float, basestring, tuple, list,
+                                dict)):
+            attributes.append('%s=%r' % (name, value))
+    return '%s(%s)' % (type(view).__name__,
+                       ','.join(attributes + children))
+
+
+class HistogramCache(object):
+    ''' LRU cache of objects, bounded in bytes '''
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # key => (object, nbytes, mtimes of source files)
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def remove(self, key):
+        obj, nbytes, mtimes = self.entries.pop(key)
+        self.nbytes -= nbytes
+
+    def get(self, key, files, loader, nbytes=None):
+        ''' Get the object for key, calling loader() if it's not cached
+
+        [files] are the source files of the object, if any of them changed
+        since the object was cached, it is reloaded.  If the modification
+        time of one of them is unknown (e.g. remote files), the object is
+        not cached.
+
+        '''
+        mtimes = tuple(file_mtime(x) for x in files)
+        if None in mtimes:
+            self.misses += 1
+            return loader()
+        if key in self.entries:
+            obj, obj_nbytes, cached_mtimes = self.entries[key]
+            if cached_mtimes == mtimes:
+                self.hits += 1
+                # Move to the end (most recently used)
+                del self.entries[key]
+                self.entries[key] = (obj, obj_nbytes, cached_mtimes)
+                return obj
+            self.invalidations += 1
+            self.remove(key)
+        self.misses += 1
+        obj = loader()
+        if nbytes is None:
+            nbytes = object_bytes(obj)
+        self.entries[key] = (obj, nbytes, mtimes)
+        self.nbytes += nbytes
+        # Evict the least recently used, but always keep the new one.
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+        return obj
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        ''' Get a dict of hit/miss statistics '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self.entries),
+            'bytes': self.nbytes,
+        }
+
+
+class CachedView(object):
+    ''' Wrap a view, caching the objects returned by Get.
+
+    Each call to Get returns a new clone of the cached object, so the
+    caller is free to modify it.  Can be used in place of the view by
+    other views.
+
+    '''
+    def __init__(self, view, cache, sample='', files=()):
+        self.view = view
+        self.cache = cache
+        self.sample = sample
+        self.files = list(files)
+        self.signature = view_signature(view)
+
+    def load(self, path):
+        obj = self.view.Get(path)
+        if hasattr(obj, 'SetDirectory'):
+            # Don't let the file own the cached object, the cache does
+            import ROOT
+            obj.SetDirectory(0)
+            ROOT.SetOwnership(obj, True)
+        return obj
+
+    def Get(self, path):
+        obj = self.cache.get((self.sample, self.signature, path), self.files,
+                             lambda: self.load(path))
+        return copy_object(obj)
+
+    def __getattr__(self, name):
+        return getattr(self.view, name)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,215 @@
+'''
+
+Columnar snapshot of the histograms of one or more ROOT files.
+
+Reopening large mega output files to read a few hundred histograms is
+slow.  export_snapshot copies the bin edges, contents and sum of weights
+squared of all the histograms of a set of files into a snapshot
+directory:
+
+    SNAPSHOT/data.npy       all the numbers, in one float64 array
+    SNAPSHOT/catalog.json   sample => path => class, title, shape and
+                            offsets of the edges/contents/sumw2 in data.npy
+
+The data is memory mapped when the snapshot is read, so only the bins
+of the histograms which are used are read from disk.  A SnapshotFile can
+be used in place of a ROOT file in views: Get(path) builds the histogram
+from the arrays, and no ROOT file is opened.  The raw arrays are
+available with Snapshot.arrays, without making any ROOT object.
+
+The sample of a file is its name without .root, like in data_views.
+
+'''
+
+import array
+import fnmatch
+import json
+import logging
+import os
+import numpy
+
+from FinalStateAnalysis.PlotTools.KeyIndex import KeyIndex
+
+log = logging.getLogger(__name__)
+
+# Classes of the objects copied to the snapshot
+HISTOGRAM_CLASSES = ['TH1[DFISC]', 'TH2[DFISC]', 'TH3[DFISC]']
+
+
+def sample_name(filename):
+    ''' The sample name of a file
+
+    >>> sample_name('results/2012/Zjets_M50.root')
+    'Zjets_M50'
+    '''
+    return os.path.basename(filename).replace('.root', '')
+
+
+def export_snapshot(files, output, class_patterns=HISTOGRAM_CLASSES):
+    ''' Write the histograms in [files] to the snapshot [output] '''
+    import ROOT
+    from FinalStateAnalysis.PlotTools import HistArrays
+    chunks = []
+    offset = [0]
+
+    def store(values):
+        values = numpy.asarray(values, dtype=numpy.float64).ravel(order='F')
+        chunks.append(values)
+        offset[0] += len(values)
+        return offset[0] - len(values)
+
+    catalog = {}
+    for filename in files:
+        sample = sample_name(filename)
+        log.info("Exporting %s", filename)
+        tfile = ROOT.TFile.Open(filename, 'READ')
+        if not tfile:
+            raise IOError("Can't open ROOT file: %s" % filename)
+        index = KeyIndex.from_directory(tfile)
+        entries = {}
+        for path, classname, size in index.entries:
+            if not any(fnmatch.fnmatchcase(classname, x)
+                       for x in class_patterns):
+                continue
+            hist = tfile.Get(path)
+            axes = [hist.GetXaxis(), hist.GetYaxis(), hist.GetZaxis()]
+            axes = axes[:hist.GetDimension()]
+            weights = HistArrays.sumw2(hist)
+            entries[path] = {
+                'class': classname,
+                'title': hist.GetTitle(),
+                'axis_titles': [x.GetTitle() for x in axes],
+                'entries': hist.GetEntries(),
+                'shape': list(HistArrays.shape(hist)),
+                'edges': [store(HistArrays.axis_edges(x)) for x in axes],
+                'contents': store(HistArrays.contents(hist)),
+                'sumw2': store(weights) if weights is not None else None,
+            }
+        catalog[sample] = {
+            'directories': index.directories(),
+            'histograms': entries,
+        }
+        tfile.Close()
+    if not os.path.exists(output):
+        os.makedirs(output)
+    if chunks:
+        data = numpy.concatenate(chunks)
+    else:
+        data = numpy.zeros(0)
+    numpy.save(os.path.join(output, 'data.npy'), data)
+    with open(os.path.join(output, 'catalog.json'), 'w') as catalog_file:
+        json.dump(catalog, catalog_file)
+    log.info("Wrote %i histograms (%0.1f MB) to %s",
+             sum(len(x['histograms']) for x in catalog.itervalues()),
+             data.nbytes / 1e6, output)
+    return output
+
+
+class Snapshot(object):
+    ''' Read access to a snapshot directory '''
+    def __init__(self, path):
+        self.path = path
+        self.data_file = os.path.join(path, 'data.npy')
+        with open(os.path.join(path, 'catalog.json')) as catalog_file:
+            self.catalog = json.load(catalog_file)
+        self.data = numpy.load(self.data_file, mmap_mode='r')
+
+    def samples(self):
+        return sorted(self.catalog.keys())
+
+    def entry(self, sample, path):
+        try:
+            return self.catalog[sample]['histograms'][path]
+        except KeyError:
+            raise KeyError("Snapshot %s has no histogram %s in sample %s" %
+                           (self.path, path, sample))
+
+    def arrays(self, sample, path):
+        ''' Get the (edges, contents, sumw2) arrays of a histogram
+
+        The arrays are read only views of the memory mapped data.  [edges]
+        is a list with the edges of each axis, the contents and sumw2
+        include the under/overflow bins, like HistArrays.contents.  sumw2
+        is None if the histogram doesn't store it.
+        '''
+        entry = self.entry(sample, path)
+        shape = tuple(entry['shape'])
+        size = int(numpy.prod(shape))
+        # nbins + 2 bins have nbins + 1 edges
+        edges = [self.data[offset:offset + nbins - 1]
+                 for offset, nbins in zip(entry['edges'], shape)]
+
+        def get(offset):
+            return self.data[offset:offset + size].reshape(shape, order='F')
+        sumw2 = get(entry['sumw2']) if entry['sumw2'] is not None else None
+        return edges, get(entry['contents']), sumw2
+
+    def histogram(self, sample, path):
+        ''' Build the (rootpy) histogram at [path] '''
+        import ROOT
+        from rootpy import asrootpy
+        from FinalStateAnalysis.PlotTools import HistArrays
+        entry = self.entry(sample, path)
+        edges, contents, sumw2 = self.arrays(sample, path)
+        args = [os.path.basename(path), str(entry['title'])]
+        for axis_edges in edges:
+            args.extend([len(axis_edges) - 1, array.array('d', axis_edges)])
+        add_directory = ROOT.TH1.AddDirectoryStatus()
+        ROOT.TH1.AddDirectory(False)
+        try:
+            hist = getattr(ROOT, str(entry['class']))(*args)
+        finally:
+            ROOT.TH1.AddDirectory(add_directory)
+        for axis, title in zip([hist.GetXaxis(), hist.GetYaxis(),
+                                hist.GetZaxis()], entry['axis_titles']):
+            axis.SetTitle(str(title))
+        HistArrays.set_contents(hist, contents)
+        if sumw2 is not None:
+            hist.Sumw2()
+            HistArrays.sumw2(hist)[...] = sumw2
+        hist.SetEntries(entry['entries'])
+        return asrootpy(hist)
+
+    def key_index(self, sample):
+        ''' Get a KeyIndex of the histograms and directories of a sample '''
+        entries = [(str(x), 'TDirectoryFile', 0)
+                   for x in self.catalog[sample]['directories']]
+        entries.extend(
+            (str(path), str(entry['class']),
+             8 * int(numpy.prod(entry['shape'])))
+            for path, entry in self.catalog[sample]['histograms'].iteritems())
+        return KeyIndex(sorted(entries))
+
+
+class SnapshotFile(object):
+    ''' A sample of a snapshot, which can be used like a ROOT file in views
+    '''
+    def __init__(self, snapshot, sample):
+        if isinstance(snapshot, basestring):
+            snapshot = Snapshot(snapshot)
+        if sample not in snapshot.catalog:
+            raise KeyError("Snapshot %s has no sample %s, I have: %s" % (
+                snapshot.path, sample, ' '.join(snapshot.samples())))
+        self.snapshot = snapshot
+        self.filename = snapshot.path
+        self.sample = sample
+
+    def GetName(self):
+        return '%s:%s' % (self.filename, self.sample)
+
+    def Get(self, path):
+        return self.snapshot.histogram(self.sample, path)
+
+    def Close(self):
+        pass
+
+    @property
+    def key_index(self):
+        return self.snapshot.key_index(self.sample)
+
+    def __repr__(self):
+        return "SnapshotFile('%s', '%s')" % (self.filename, self.sample)
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,5 +1,5 @@
 import rootpy.plotting.views as views
-from THBin import zipBins
+from HistArrays import errors, set_errors, inner_bins
 
 class InflateErrorView(views._FolderView):
     ''' 
@@ -11,6 +11,7 @@ class InflateErrorView(views._FolderView):
 
     def apply_view(self, object):
         object = object.Clone()
-        for hbin in zipBins(object):
-            hbin.error *= self.inflation 
-        return object
+        # under/overflow are left untouched
+        errs = errors(object)
+        errs[inner_bins(object)] *= self.inflation
+        return set_errors(object, errs)
@@ -0,0 +1,205 @@
+'''
+
+Pack input files into batch jobs of about the same size.
+
+Instead of a fixed number of files per job, the files are weighted by
+their number of tree entries or their size in bytes, and distributed over
+the jobs so each job gets about the same total weight.
+
+The expected run time of a job can be estimated from the throughput
+(events/second) measured in previous runs of the same selector.  mega
+appends the measured throughput of each job to a log file when run with
+--throughput-log.
+
+>>> jobs = pack_files(['a', 'b', 'c', 'd'], [10, 50, 30, 20], 60)
+>>> sorted(sorted(x) for x in jobs)
+[['a', 'b'], ['c', 'd']]
+>>> pack_files(['a', 'b'], [10, 10], 100)
+[['a', 'b']]
+
+A file larger than the target still gets its own job:
+
+>>> sorted(pack_files(['a', 'b'], [500, 10], 100))
+[['a'], ['b']]
+
+Batch systems only take a fixed number of input files per job, so each
+packed job is submitted with one of its files as input, and the job looks
+up the rest of its files in an index written by write_packed_index:
+
+>>> index = packed_index([['/store/a.root', '/store/b.root'], ['/store/c.root']])
+>>> index['representatives']
+['/store/a.root', '/store/c.root']
+>>> packed_job_files(index, 'root://cmsxrootd.hep.wisc.edu//store/a.root')
+['/store/a.root', '/store/b.root']
+
+'''
+
+import heapq
+import json
+import logging
+import math
+import os
+
+log = logging.getLogger(__name__)
+
+
+def pack_files(files, weights, target):
+    ''' Pack files into jobs with a total weight close to target
+
+    The number of jobs is sum(weights)/target, rounded up.  The files are
+    assigned to the jobs heaviest first, always to the lightest job so far.
+    The files in each job keep their original order.  Returns a list of
+    lists of files.
+
+    '''
+    if not files:
+        return []
+    total = sum(weights)
+    njobs = max(1, int(math.ceil(float(total) / target)))
+    njobs = min(njobs, len(files))
+    # (total weight, job number, [file indices])
+    jobs = [(0, i, []) for i in range(njobs)]
+    order = sorted(range(len(files)), key=lambda i: weights[i], reverse=True)
+    for i in order:
+        weight, jobid, members = heapq.heappop(jobs)
+        members.append(i)
+        heapq.heappush(jobs, (weight + weights[i], jobid, members))
+    return [[files[i] for i in sorted(members)]
+            for weight, jobid, members in sorted(jobs, key=lambda x: x[1])
+            if members]
+
+
+def file_sizes(files):
+    ''' Get the size in bytes of each file '''
+    return [os.path.getsize(x) for x in files]
+
+
+def file_entries(files, treepath):
+    ''' Get the number of entries of the tree in each file
+
+    Uses the run/lumi/evt index of the file if available, to avoid opening
+    the file.
+
+    '''
+    from FinalStateAnalysis.PlotTools.EventIndex import load_index
+    import ROOT
+    output = []
+    for filename in files:
+        index = load_index(filename, treepath)
+        if index is not None:
+            output.append(index.nentries)
+            continue
+        tfile = ROOT.TFile.Open(filename, 'READ')
+        if not tfile:
+            raise IOError("Can't open ROOT file: %s" % filename)
+        tree = tfile.Get(treepath)
+        if not tree:
+            raise IOError("Can't get tree: %s from file: %s" %
+                          (treepath, filename))
+        output.append(tree.GetEntries())
+        tfile.Close()
+    return output
+
+
+def input_key(path):
+    ''' Identify an input file, whatever the prefix the batch system adds
+
+    >>> input_key('/hdfs/store/user/x/f.root')
+    '/store/user/x/f.root'
+    >>> input_key('/nfs/x/f.root')
+    'f.root'
+    '''
+    if '/store/' in path:
+        return path[path.index('/store/'):]
+    return os.path.basename(path)
+
+
+def packed_index(jobs):
+    ''' Build the index of the files of packed jobs
+
+    Each job is represented by the first of its files whose key
+    (input_key) isn't used by another job.  Returns a dict with the list of
+    representatives (the inputs to give to the batch system) and the map
+    key of representative => files of the job.
+
+    '''
+    representatives = []
+    files = {}
+    for job in jobs:
+        for path in job:
+            key = input_key(path)
+            if key not in files:
+                break
+        else:
+            raise ValueError("Can't find a unique input to represent the "
+                             "job with %s" % ', '.join(job))
+        representatives.append(path)
+        files[key] = list(job)
+    return {'representatives': representatives, 'files': files}
+
+
+def write_packed_index(jobs, filename):
+    ''' Write the index of packed [jobs].  Returns the representatives '''
+    index = packed_index(jobs)
+    with open(filename, 'w') as index_file:
+        json.dump(index, index_file, indent=2)
+    return index['representatives']
+
+
+def packed_job_files(index, inputs):
+    ''' Get the files of the job whose inputs (comma separated) were given
+
+    [index] is a dict from packed_index, or the file it was written to.
+    '''
+    if isinstance(index, basestring):
+        with open(index) as index_file:
+            index = json.load(index_file)
+    output = []
+    for path in inputs.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        key = input_key(path)
+        if key not in index['files']:
+            raise KeyError("Input %s is not in the packed job index" % path)
+        output.extend(str(x) for x in index['files'][key])
+    return output
+
+
+def record_throughput(logfile, selector, nevents, seconds):
+    ''' Append the throughput of a job to the log file '''
+    with open(logfile, 'a') as log_file:
+        log_file.write(json.dumps({
+            'selector': selector,
+            'events': nevents,
+            'seconds': seconds,
+        }) + '\n')
+
+
+def measured_throughput(logfile, selector):
+    ''' Get the events/second of a selector measured in previous jobs
+
+    Returns None if there are no measurements.
+
+    '''
+    if not os.path.exists(logfile):
+        return None
+    events = 0
+    seconds = 0.
+    with open(logfile) as log_file:
+        for line in log_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Partially written line
+                continue
+            if entry['selector'] == selector:
+                events += entry['events']
+                seconds += entry['seconds']
+    if not seconds:
+        return None
+    return events / seconds
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,195 @@
+'''
+
+Index of the objects (keys) in a ROOT file.
+
+Walking GetListOfKeys of a file with tens of thousands of histograms is
+slow.  The KeyIndex records the path, class and size of every object in
+the file once, and stores it in a JSON sidecar file next to it
+(FILE.keys.json), or in the directory given by the $megakeyindex
+environment variable.  The sidecar is rebuilt when the ROOT file changes.
+
+>>> index = KeyIndex([
+...     ('os', 'TDirectoryFile', 0),
+...     ('os/pt', 'TH1F', 100),
+...     ('os/eta', 'TH1F', 100),
+...     ('os/pt_vs_eta', 'TH2F', 400),
+...     ('os/tight', 'TDirectoryFile', 0),
+...     ('os/tight/pt', 'TH1D', 150),
+... ])
+>>> index.directories()
+['os', 'os/tight']
+>>> index.glob('os/*')
+['os/pt', 'os/eta', 'os/pt_vs_eta', 'os/tight']
+>>> index.glob('*/*/pt')
+['os/tight/pt']
+>>> index.paths(class_pattern='TH1*')
+['os/pt', 'os/eta', 'os/tight/pt']
+>>> index.regex(r'.*/pt$')
+['os/pt', 'os/tight/pt']
+>>> index.children('os', class_pattern='TH*')
+['pt', 'eta', 'pt_vs_eta']
+>>> 'os/tight/pt' in index, 'os/tight/eta' in index
+(True, False)
+
+'''
+
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+
+def default_index_dir():
+    ''' Get the key index directory from the environment '''
+    return os.environ.get('megakeyindex', None)
+
+
+def glob_to_regex(pattern):
+    ''' Convert a glob pattern to a regex where * and ? don't match /
+
+    >>> bool(glob_to_regex('os/*/pt?').match('os/tight/pt1'))
+    True
+    >>> bool(glob_to_regex('os/*/pt?').match('os/tight/iso/pt1'))
+    False
+    >>> bool(glob_to_regex('*.root').match('a.root'))
+    True
+    >>> bool(glob_to_regex('*.root').match('a_root'))
+    False
+    '''
+    special = {'*': '[^/]*', '?': '[^/]'}
+    return re.compile('^' + ''.join(
+        special.get(x, re.escape(x)) for x in pattern) + '$')
+
+
+class KeyIndex(object):
+    ''' The (path, class name, size) of each object in a ROOT file '''
+    def __init__(self, entries):
+        self.entries = [tuple(x) for x in entries]
+        self.classes = dict((path, classname)
+                            for path, classname, size in self.entries)
+
+    @staticmethod
+    def from_directory(directory, dirname=''):
+        ''' Build the index by walking the keys of a file or directory '''
+        entries = []
+        seen = set()
+        for key in directory.GetListOfKeys():
+            name = key.GetName()
+            # Only keep the highest cycle, which comes first
+            if name in seen:
+                continue
+            seen.add(name)
+            path = os.path.join(dirname, name)
+            classname = key.GetClassName()
+            entries.append((path, classname, key.GetObjlen()))
+            if classname.startswith('TDirectory'):
+                entries.extend(KeyIndex.from_directory(
+                    directory.Get(name), path).entries)
+        return KeyIndex(entries)
+
+    def __contains__(self, path):
+        return path in self.classes
+
+    def __len__(self):
+        return len(self.entries)
+
+    def classname(self, path):
+        ''' Get the class name of the object at [path] '''
+        return self.classes[path]
+
+    def paths(self, class_pattern='*'):
+        ''' All paths of objects with a class matching [class_pattern] '''
+        return [path for path, classname, size in self.entries
+                if fnmatch.fnmatchcase(classname, class_pattern)]
+
+    def directories(self):
+        ''' All the (sub)directories, like Plotter.map_dir_structure '''
+        return self.paths(class_pattern='TDirectory*')
+
+    def regex(self, pattern, class_pattern='*'):
+        ''' All paths matching a regex '''
+        if isinstance(pattern, basestring):
+            pattern = re.compile(pattern)
+        return [path for path in self.paths(class_pattern)
+                if pattern.match(path)]
+
+    def glob(self, pattern, class_pattern='*'):
+        ''' All paths matching a glob, where * and ? don't match / '''
+        return self.regex(glob_to_regex(pattern), class_pattern)
+
+    def children(self, directory, class_pattern='*'):
+        ''' Names of the objects directly in [directory] '''
+        prefix = directory.rstrip('/') + '/' if directory else ''
+        return [path[len(prefix):] for path in self.paths(class_pattern)
+                if path.startswith(prefix) and '/' not in path[len(prefix):]]
+
+    def save(self, filename, size, mtime):
+        with open(filename, 'w') as output:
+            json.dump({'size': size, 'mtime': mtime,
+                       'entries': self.entries}, output)
+
+
+def index_path(filename, index_dir=None):
+    ''' Where the key index of the given file lives '''
+    if index_dir is None:
+        index_dir = default_index_dir()
+    if index_dir is None:
+        return filename + '.keys.json'
+    hash = hashlib.md5(os.path.abspath(filename)).hexdigest()
+    return os.path.join(index_dir, hash + '.keys.json')
+
+
+def load_key_index(filename, index_dir=None):
+    ''' Load the key index of a file
+
+    Returns None if there is no index, or the file has changed since the
+    index was built.
+    '''
+    if filename.startswith('root://'):
+        return None
+    sidecar = index_path(filename, index_dir)
+    if not os.path.exists(sidecar):
+        return None
+    stat = os.stat(filename)
+    with open(sidecar) as input:
+        stored = json.load(input)
+    if stored['size'] != stat.st_size or \
+       stored['mtime'] != int(stat.st_mtime):
+        log.info("Key index %s is out of date", sidecar)
+        return None
+    return KeyIndex((str(path), str(classname), size)
+                    for path, classname, size in stored['entries'])
+
+
+def build_key_index(filename, index_dir=None, force=False):
+    ''' Get the key index of a file, building it if necessary '''
+    if not force:
+        index = load_key_index(filename, index_dir)
+        if index is not None:
+            return index
+    import ROOT
+    tfile = ROOT.TFile.Open(filename, 'READ')
+    if not tfile:
+        raise IOError("Can't open ROOT file: %s" % filename)
+    index = KeyIndex.from_directory(tfile)
+    tfile.Close()
+    if filename.startswith('root://'):
+        return index
+    stat = os.stat(filename)
+    sidecar = index_path(filename, index_dir)
+    try:
+        if not os.path.exists(os.path.dirname(os.path.abspath(sidecar))):
+            os.makedirs(os.path.dirname(os.path.abspath(sidecar)))
+        index.save(sidecar, stat.st_size, int(stat.st_mtime))
+    except (IOError, OSError), e:
+        # Still usable, it will just be rebuilt next time
+        log.warning("Can't write key index %s: %s", sidecar, e)
+    return index
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
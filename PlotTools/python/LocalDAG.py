@@ -0,0 +1,292 @@
+""" Run a Condor DAG on the local machine.
+
+Runs the jobs of a DAG file (as produced by farmoutAnalysisJobs via
+mega-farmout or submit_job.py) as local processes instead of submitting it
+to Condor.  At most N jobs run at the same time, a job starts once all of
+its parents are done, and failed jobs are retried.
+
+The node status is written to DAGFILE.status in the same format as the
+Condor node status file, so CondorDAG.update_status and condor_summary.py
+work unchanged.
+
+Only the parts of the submit files needed to run a job on a shared file
+system are understood: executable, arguments, initialdir, output, error,
+getenv and environment, and the $(Cluster), $(Process) and VARS macros.
+
+Submit file arguments are parsed using the Condor quoting rules:
+
+>>> parse_arguments('"-a \\'b c\\' d"')
+['-a', 'b c', 'd']
+>>> parse_arguments('-a b\\\\"c')
+['-a', 'b"c']
+>>> parse_arguments('"\\'it\\'\\'s here\\' ""quoted"" x"')
+["it's here", '"quoted"', 'x']
+
+"""
+
+import logging
+import os
+import re
+import subprocess
+import time
+
+from FinalStateAnalysis.PlotTools.CondorDAG import CondorDAG
+
+log = logging.getLogger(__name__)
+
+_macro = re.compile(r'\$\((?P<name>[A-Za-z0-9_.]+)\)')
+
+
+def parse_arguments(value):
+    """ Split a Condor submit file arguments value into a list. """
+    value = value.strip()
+    if not value.startswith('"'):
+        # Old syntax: whitespace separated, \" is a literal quote
+        return value.replace('\\"', '"').split()
+    # New syntax: enclosed in "", '' groups whitespace, doubled quotes
+    # are literal quotes.
+    value = value[1:-1]
+    args = []
+    current = None
+    quoted = False
+    i = 0
+    while i < len(value):
+        char = value[i]
+        next_char = value[i + 1] if i + 1 < len(value) else None
+        if char == '"' and next_char == '"':
+            current = (current or '') + '"'
+            i += 2
+            continue
+        if char == "'":
+            if quoted and next_char == "'":
+                current += "'"
+                i += 2
+                continue
+            quoted = not quoted
+            current = current or ''
+        elif char.isspace() and not quoted:
+            if current is not None:
+                args.append(current)
+            current = None
+        else:
+            current = (current or '') + char
+        i += 1
+    if current is not None:
+        args.append(current)
+    return args
+
+
+def parse_environment(value):
+    """ Parse a Condor submit file environment value into a dict. """
+    value = value.strip()
+    if value.startswith('"'):
+        items = parse_arguments(value)
+    else:
+        items = value.split(';')
+    output = {}
+    for item in items:
+        if '=' in item:
+            key, val = item.split('=', 1)
+            output[key.strip()] = val
+    return output
+
+
+def parse_submit_file(submitfile, macros=None):
+    """ Parse a Condor submit file into a dict of lowercase commands. """
+    commands = {}
+    with open(submitfile, 'r') as submit:
+        for line in submit:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            commands[key.strip().lower()] = value.strip()
+    # Substitute the macros ($(Process), VARS from the DAG, other commands)
+    all_macros = dict((key.lower(), value) for key, value in
+                      (macros or {}).iteritems())
+    all_macros.setdefault('cluster', '0')
+    all_macros.setdefault('process', '0')
+
+    def substitute(match):
+        name = match.group('name').lower()
+        if name in all_macros:
+            return all_macros[name]
+        return commands.get(name, '')
+    for key in commands:
+        for i in range(10):
+            new_value = _macro.sub(substitute, commands[key])
+            if new_value == commands[key]:
+                break
+            commands[key] = new_value
+    return commands
+
+
+def get_dag_commands(dagfile):
+    """ Parse the VARS and RETRY commands of a DAG file.
+
+    Returns a tuple of dicts ({jobid: {macro: value}}, {jobid: nretries}).
+
+    """
+    macros = {}
+    retries = {}
+    var_matcher = re.compile(r'(?P<name>\S+)\s*=\s*"(?P<value>[^"]*)"')
+    with open(dagfile, 'r') as dag:
+        for line in dag:
+            fields = line.strip().split()
+            if not fields:
+                continue
+            if fields[0] == 'VARS':
+                macros.setdefault(fields[1], {}).update(
+                    (x.group('name'), x.group('value'))
+                    for x in var_matcher.finditer(line))
+            elif fields[0] == 'RETRY':
+                retries[fields[1]] = int(fields[2])
+    return macros, retries
+
+
+class LocalDAGRunner(object):
+    """ Run the jobs of a DAG file with a bounded number of processes. """
+    def __init__(self, dagfile, nworkers=4, retries=0, poll_interval=1):
+        self.dag = CondorDAG(dagfile)
+        self.dagfile = dagfile
+        self.nworkers = nworkers
+        self.poll_interval = poll_interval
+        self.macros, dag_retries = get_dag_commands(dagfile)
+        # How many times each job may still be retried
+        self.retries = dict(
+            (jobid, max(retries, dag_retries.get(jobid, 0)))
+            for jobid in self.dag.nodes)
+        # jobid => (STATUS, info)
+        self.status = dict(
+            (jobid, ("STATUS_UNREADY", "")) for jobid in self.dag.nodes)
+        # jobid => Popen
+        self.running = {}
+
+    def is_ready(self, jobid):
+        """ Check if a job can be started (doesn't change its status). """
+        if self.status[jobid][0] not in ("STATUS_UNREADY", "STATUS_READY"):
+            return False
+        return all(self.status[x.jobname][0] == "STATUS_DONE"
+                   for x in self.dag.nodes[jobid].parents)
+
+    def has_ready_jobs(self):
+        """ Check if any job can be started (doesn't change the status). """
+        return any(self.is_ready(x) for x in self.dag.nodes)
+
+    def ready_jobs(self):
+        """ Generate the jobs which can be started, marking them READY. """
+        for jobid in sorted(self.dag.nodes):
+            if self.is_ready(jobid):
+                self.status[jobid] = ("STATUS_READY", "")
+                yield jobid
+
+    def start_job(self, jobid):
+        """ Start the process for a job. """
+        node = self.dag.nodes[jobid]
+        submitdir = os.path.dirname(os.path.abspath(node.submitfile))
+        commands = parse_submit_file(node.submitfile,
+                                     self.macros.get(jobid, {}))
+        workdir = os.path.join(submitdir, commands.get('initialdir', ''))
+        executable = os.path.join(workdir, commands['executable'])
+        args = [executable] + parse_arguments(commands.get('arguments', ''))
+        env = {}
+        if commands.get('getenv', 'false').lower() in ('true', '1'):
+            env.update(os.environ)
+        env.update(parse_environment(commands.get('environment', '')))
+        # Condor defaults to /dev/null
+        stdout = open(os.path.join(
+            workdir, commands.get('output', os.devnull)), 'w')
+        stderr = open(os.path.join(
+            workdir, commands.get('error', os.devnull)), 'w')
+        log.info("Starting %s: %s", jobid, ' '.join(args))
+        try:
+            self.running[jobid] = subprocess.Popen(
+                args, cwd=workdir, env=env or None,
+                stdout=stdout, stderr=stderr)
+            self.status[jobid] = ("STATUS_SUBMITTED", "")
+        except OSError, e:
+            self.job_failed(jobid, str(e))
+        finally:
+            stdout.close()
+            stderr.close()
+
+    def job_failed(self, jobid, reason):
+        """ Retry a failed job, or mark it as failed. """
+        if self.retries[jobid] > 0:
+            self.retries[jobid] -= 1
+            log.warning("%s failed (%s), retrying", jobid, reason)
+            self.status[jobid] = ("STATUS_READY", "")
+        else:
+            log.error("%s failed (%s)", jobid, reason)
+            self.status[jobid] = ("STATUS_ERROR", reason)
+
+    def poll(self):
+        """ Check the running jobs.  Returns True if any job finished. """
+        changed = False
+        for jobid, process in self.running.items():
+            exit_code = process.poll()
+            if exit_code is None:
+                continue
+            del self.running[jobid]
+            changed = True
+            if exit_code == 0:
+                log.info("%s done", jobid)
+                self.status[jobid] = ("STATUS_DONE", "")
+            else:
+                self.job_failed(
+                    jobid, "Job proc (0.0.0) failed with status %i"
+                    % exit_code)
+        return changed
+
+    def dag_status(self):
+        """ Get the overall (STATUS, info) of the DAG. """
+        if self.running or self.has_ready_jobs():
+            return ("STATUS_SUBMITTED", "")
+        if all(x[0] == "STATUS_DONE" for x in self.status.itervalues()):
+            return ("STATUS_DONE", "")
+        return ("STATUS_ERROR", "")
+
+    def write_status(self):
+        """ Write the node status file, like condor_dagman does. """
+        statusfile = self.dagfile + '.status'
+        with open(statusfile + '.tmp', 'w') as status:
+            status.write('BEGIN %i (%s)\n' % (time.time(), time.ctime()))
+            status.write('Status of nodes of DAG(s): %s\n\n' % self.dagfile)
+            for jobid in sorted(self.status):
+                status.write('JOB %s %s (%s)\n' % (
+                    jobid, self.status[jobid][0], self.status[jobid][1]))
+            status.write('\nDAG status: %s (%s)\n' % self.dag_status())
+            status.write('END %i (%s)\n' % (time.time(), time.ctime()))
+        os.rename(statusfile + '.tmp', statusfile)
+
+    def terminate(self):
+        """ Kill all running jobs. """
+        for jobid, process in self.running.iteritems():
+            log.error("Terminating %s", jobid)
+            process.terminate()
+
+    def run(self):
+        """ Run the DAG.  Returns True if all the jobs succeeded. """
+        for jobid, node in self.dag.nodes.iteritems():
+            if node.done:
+                self.status[jobid] = ("STATUS_DONE", "")
+        self.write_status()
+        try:
+            while True:
+                for jobid in list(self.ready_jobs()):
+                    if len(self.running) >= self.nworkers:
+                        break
+                    self.start_job(jobid)
+                self.write_status()
+                if not self.running:
+                    if self.has_ready_jobs():
+                        # A job failed to start and will be retried.
+                        continue
+                    break
+                while not self.poll():
+                    time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            self.terminate()
+            raise
+        self.write_status()
+        return self.dag_status()[0] == "STATUS_DONE"
@@ -1,5 +1,7 @@
 import rootpy.plotting.views as views
 import math
+import numpy
+from HistArrays import contents, errors, set_errors, inner_bins
 def quad(*xs):
     return math.sqrt(sum(x * x for x in xs))
 
@@ -13,18 +15,13 @@ class MedianView(object):
     @staticmethod
     def apply_view(central_hist, high_hist, low_hist=None):
         ret_hist = central_hist.Clone()
-        for bin in range(1, ret_hist.GetNbinsX() + 1):
-            error = quad(
-                central_hist.GetBinError(bin),
-                abs(high_hist.GetBinContent(bin) - central_hist.GetBinContent(bin))
-            ) if high_hist else \
-            quad(
-                central_hist.GetBinError(bin),
-                abs(central_hist.GetBinContent(bin) - low_hist.GetBinContent(bin))
-            ) 
-            
-            ret_hist.SetBinError(bin, error)
-        return ret_hist
+        shifted = contents(high_hist if high_hist else low_hist)
+        # under/overflow are left untouched
+        inner = inner_bins(ret_hist)
+        errs = errors(ret_hist)
+        errs[inner] = numpy.hypot(
+            errs[inner], shifted[inner] - contents(central_hist)[inner])
+        return set_errors(ret_hist, errs)
         
 
     def Get(self, path):
@@ -2,6 +2,9 @@
 
 A Process object which takes a list of files and TFileMerger's them together.
 
+MegaEventsMerger instead concatenates the line-delimited event lists
+written by megaevents.
+
 Author: Evan K. Friis, UW Madison
 
 '''
@@ -112,3 +115,34 @@ class MegaMerger(multiprocessing.Process):
                 self.merge_into_output(files_to_merge)
             if done:
                 return
+
+def events_file_name(output_file):
+    ''' Line-delimited events file written alongside a worker output file '''
+    return output_file.replace('.root', '.events.jsonl')
+
+class MegaEventsMerger(MegaMerger):
+    ''' Appends the line-delimited event files of the jobs to the output.
+
+    Used by megaevents, where the workers write their passing events to
+    events_file_name(output_file) instead of histograms.
+
+    '''
+    def __init__(self, input_file_queue, output_file, ninputs):
+        super(MegaEventsMerger, self).__init__(
+            input_file_queue, output_file, ninputs)
+        # Start from an empty output
+        open(self.output, 'w').close()
+
+    def merge_into_output(self, files):
+        self.log.info("Appending events from %i files to output %s",
+                      len(files), self.output)
+        with open(self.output, 'a') as output:
+            for file in files:
+                events_file = events_file_name(file)
+                if os.path.exists(events_file):
+                    with open(events_file) as events:
+                        shutil.copyfileobj(events, output)
+                    os.remove(events_file)
+                # The (empty) ROOT output of the job
+                os.remove(file)
+        return True
@@ -1,11 +1,21 @@
 ''' Utilities to find data using the $MEGAPATH search path
 
+Resolving many files (find_input_files) goes through a PathResolver, which
+lists each directory once instead of testing every file in every search
+path.  The directory listings are cached on disk ($megapathcache, default
+~/.megapath_cache, one file per search path) and reused as long as the
+directory mtime does not change.
+
 Author: Evan K. Friis, UW Madison
 
 '''
 
+import hashlib
+import json
 import logging
 import os
+import sys
+import time
 
 # Where to look for files.
 SEARCH_PATHS = ['.'] + os.environ.get("MEGAPATH", "").split(':')
@@ -31,6 +41,173 @@ def resolve_file(path, nolocal=False):
     return path
 
 
+def default_cache_dir():
+    """ Get the directory listing cache directory from the environment """
+    return os.environ.get(
+        'megapathcache', os.path.expanduser('~/.megapath_cache'))
+
+
+# Cached listings not used for this long are dropped, in seconds
+MAX_UNUSED_TIME = 30 * 24 * 3600
+# Max. number of directory listings cached per search path
+MAX_LISTINGS = 1000
+# How often the last use of a cached listing is updated, in seconds
+_TOUCH_INTERVAL = 24 * 3600
+
+
+class PathResolver(object):
+    """ Resolve paths in the search paths using cached directory listings
+
+    Equivalent to resolve_file, but each directory in the search paths is
+    listed (at most) once.  A listing holds the files of the directory
+    (not the subdirectories), so only files are resolved, as with
+    os.path.isfile.
+
+    The listings are cached in cache_dir, one file per search path, and a
+    cached listing is used if the mtime of the directory is unchanged, so
+    resolving a file list only needs one stat per directory.  Listings of
+    missing directories, and listings unused for MAX_UNUSED_TIME, are
+    dropped, and at most MAX_LISTINGS are kept per search path.
+
+    """
+    def __init__(self, search_paths=None, cache_dir=None):
+        self.search_paths = search_paths
+        if self.search_paths is None:
+            self.search_paths = SEARCH_PATHS
+        self.cache_dir = cache_dir
+        if self.cache_dir is None:
+            self.cache_dir = default_cache_dir()
+        # abs. directory => set of files, or None if it doesn't exist
+        self.listings = {}
+        # search path => {abs. directory => [mtime, [files], last use]}
+        self.disk_caches = {}
+        self.changed = set()
+        # Bookkeeping, to report how much time we saved
+        self.nprobes = 0
+        self.nstats = 0
+        self.nlistdirs = 0
+        self.stat_time = 0.
+
+    def cache_file(self, search_path):
+        """ Where the listings under search_path are cached """
+        key = hashlib.md5(os.path.abspath(search_path)).hexdigest()
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def disk_cache(self, search_path):
+        """ Get the cached listings under a search path """
+        if search_path in self.disk_caches:
+            return self.disk_caches[search_path]
+        cached = {}
+        if self.cache_dir:
+            cache_file = self.cache_file(search_path)
+            if os.path.exists(cache_file):
+                try:
+                    with open(cache_file) as cache:
+                        cached = json.load(cache)['listings']
+                except (IOError, ValueError, KeyError):
+                    log.warning("Ignoring corrupt path cache %s", cache_file)
+        self.disk_caches[search_path] = cached
+        return cached
+
+    def listing(self, directory, search_path=''):
+        """ Get the set of files in a directory, None if it is missing """
+        directory = os.path.abspath(directory)
+        if directory in self.listings:
+            return self.listings[directory]
+        disk_cache = self.disk_cache(search_path)
+        start = time.time()
+        self.nstats += 1
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            self.listings[directory] = None
+            self.stat_time += time.time() - start
+            if disk_cache.pop(directory, None) is not None:
+                self.changed.add(search_path)
+            return None
+        self.stat_time += time.time() - start
+        cached = disk_cache.get(directory)
+        now = time.time()
+        if cached is not None and cached[0] == mtime:
+            files = set(cached[1])
+            if now - cached[2] > _TOUCH_INTERVAL:
+                cached[2] = now
+                self.changed.add(search_path)
+        else:
+            self.nlistdirs += 1
+            files = set(x for x in os.listdir(directory)
+                        if os.path.isfile(os.path.join(directory, x)))
+            disk_cache[directory] = [mtime, sorted(files), now]
+            self.changed.add(search_path)
+        self.listings[directory] = files
+        return files
+
+    def exists(self, path, search_path=''):
+        """ Check if path is a file, using its directory listing """
+        self.nprobes += 1
+        files = self.listing(os.path.dirname(path) or '.', search_path)
+        return files is not None and os.path.basename(path) in files
+
+    def resolve(self, path, nolocal=False):
+        """ Same as resolve_file, using the directory listings """
+        if path.startswith('root://'):
+            return path
+        if not os.path.isabs(path):
+            for search_path in self.search_paths:
+                if nolocal and '/store' not in search_path:
+                    continue
+                full_path = os.path.join(search_path, path)
+                if self.exists(full_path, search_path):
+                    path = full_path
+                    break
+        return path
+
+    def resolve_files(self, paths, nolocal=False):
+        """ Resolve a list of paths, and save the directory listings """
+        start = time.time()
+        output = [self.resolve(x, nolocal) for x in paths]
+        self.save()
+        if self.nstats:
+            # Each probe would have been a stat with resolve_file
+            saved = (self.nprobes - self.nstats) * self.stat_time / self.nstats
+            log.info("Resolved %i files in %0.2fs with %i directory stats "
+                     "and %i listings instead of %i stats (~%0.1fs saved)",
+                     len(output), time.time() - start, self.nstats,
+                     self.nlistdirs, self.nprobes, saved)
+        return output
+
+    @staticmethod
+    def prune(listings, now):
+        """ Drop the old listings, and keep at most MAX_LISTINGS """
+        recent = sorted(
+            ((entry[2], directory) for directory, entry
+             in listings.iteritems()
+             if now - entry[2] < MAX_UNUSED_TIME), reverse=True)
+        return dict((directory, listings[directory])
+                    for last_use, directory in recent[:MAX_LISTINGS])
+
+    def save(self):
+        """ Write the changed directory listings to the cache """
+        if not self.cache_dir:
+            return
+        now = time.time()
+        for search_path in sorted(self.changed):
+            cache_file = self.cache_file(search_path)
+            tmp_file = '%s.%i.tmp' % (cache_file, os.getpid())
+            listings = self.prune(self.disk_caches[search_path], now)
+            try:
+                if not os.path.exists(self.cache_dir):
+                    os.makedirs(self.cache_dir)
+                with open(tmp_file, 'w') as cache:
+                    json.dump({'search_path': os.path.abspath(search_path),
+                               'listings': listings}, cache)
+                os.rename(tmp_file, cache_file)
+            except (IOError, OSError), e:
+                log.warning("Could not write path cache %s: %s",
+                            cache_file, e)
+        self.changed.clear()
+
+
 def find_input_files(input_file_list, nolocal=False):
     """ Generate all of the input files given the input_file_list.
 
@@ -50,11 +227,13 @@ def find_input_files(input_file_list, nolocal=False):
             log.error(
                 "Error: inputs %s input file does not exist", input_file_list)
             sys.exit(5)
+        paths = []
         with open(input_file_list) as inputs_file:
             for line in inputs_file:
                 line = line.strip()
                 if line and not line.startswith('#'):
-                    yield resolve_file(line, nolocal)
+                    paths.append(line)
     else:
-        for x in input_file_list.split(','):
-            yield resolve_file(x.strip(), nolocal)
+        paths = [x.strip() for x in input_file_list.split(',')]
+    for path in PathResolver().resolve_files(paths, nolocal):
+        yield path
@@ -8,6 +8,7 @@ analyzes, them, and stores the results in output ROOT files.
 from FileProcessor import FileProcessor
 from ChainProcessor import ChainProcessor
 import hashlib
+import json
 import multiprocessing
 import os
 import signal
@@ -24,6 +25,23 @@ def make_hashed_filename(to_process):
             hash.update(input_file)
         return hash.hexdigest() + '.root'
 
+def dump_branch_report(selector, report_file):
+    ''' Write the branch access counts of all instrumented proxies
+
+    Any attribute of the selector with a branch_access_report() method (the
+    instrumented build of the cython proxies) is included.  Returns the
+    number of proxies found.
+
+    '''
+    reports = {}
+    for name, value in vars(selector).iteritems():
+        if hasattr(value, 'branch_access_report'):
+            reports[name] = value.branch_access_report()
+    if reports:
+        with open(report_file, 'w') as output:
+            json.dump(reports, output, indent=2)
+    return len(reports)
+
 class MegaWorker(multiprocessing.Process):
     log = multiprocessing.get_logger()
     def __init__(self, input_file_queue, results_queue, treename, selector,
@@ -89,6 +107,23 @@ class MegaWorker(multiprocessing.Process):
                                     globals(), locals(), profile_output)
                     # Fake this.
                     result = (len(to_process), output_file_name)
+
+                # Check if we want a report of the accessed branches
+                report_dir_base = os.environ.get('megabranchreport', None)
+                if report_dir_base is not None:
+                    report_dir = os.path.join(
+                        report_dir_base,
+                        self.selector.__name__,
+                    )
+                    if not os.path.exists(report_dir):
+                        os.makedirs(report_dir)
+                    report_output = os.path.join(
+                        report_dir,
+                        make_hashed_filename(to_process).replace('.root', '.json')
+                    )
+                    if not dump_branch_report(processor.selector, report_output):
+                        self.log.warning("No instrumented tree proxy found in"
+                                         " selector %s", self.selector.__name__)
                 self.output.put(result)
             except:
                 # If we fail, put a poison pill to stop the merge job.
@@ -0,0 +1,257 @@
+'''
+
+Cached, parallel summaries of the FSA meta info trees.
+
+The meta tree has one entry per processed run/lumi, with the number of
+originally processed events.  A summary of a file is the total number of
+events and the list of (run, lumi) pairs in it.  The branches are read in
+bulk with TTree::Draw, and the files are summarized in a pool of
+processes.
+
+The summaries are cached in a directory ($megametacache, default
+~/.megameta_cache), one JSON file per (file, tree).  A cached summary is
+only used if the size and mtime of the file are unchanged, so re-running
+after new files land only opens the new ones.  Remote (root://) files are
+never cached.
+
+'''
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+import numpy
+
+log = logging.getLogger(__name__)
+
+# Default maximum time to wait for the next file, in seconds.  A worker
+# which dies never returns its file, so don't wait for ever.
+DEFAULT_TIMEOUT = 10 * 60
+
+
+def default_cache_dir():
+    ''' Get the summary cache directory from the environment '''
+    return os.environ.get(
+        'megametacache', os.path.expanduser('~/.megameta_cache'))
+
+
+def file_stamp(filename):
+    ''' (size, mtime) of a local file, or None if it can't be cached '''
+    if filename.startswith('root://'):
+        return None
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def cache_path(filename, treepath, cache_dir):
+    ''' Where the summary of the tree in the given file lives '''
+    key = hashlib.md5(
+        '%s\n%s' % (os.path.abspath(filename), treepath)).hexdigest()
+    return os.path.join(cache_dir, key + '.json')
+
+
+def load_summary(filename, treepath, cache_dir):
+    ''' Get the cached summary, or None if missing or out of date '''
+    stamp = file_stamp(filename)
+    if stamp is None:
+        return None
+    path = cache_path(filename, treepath, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as cached:
+            stored = json.load(cached)
+    except (IOError, ValueError):
+        return None
+    if stored.get('stamp') != stamp:
+        log.debug("Summary of %s is out of date", filename)
+        return None
+    return stored['summary']
+
+
+def save_summary(filename, treepath, cache_dir, stamp, summary):
+    ''' Cache a summary, tagged with the size/mtime of the file '''
+    path = cache_path(filename, treepath, cache_dir)
+    tmp_file = '%s.%i.tmp' % (path, os.getpid())
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with open(tmp_file, 'w') as cached:
+            json.dump({'file': os.path.abspath(filename), 'tree': treepath,
+                       'stamp': stamp, 'summary': summary}, cached)
+        os.rename(tmp_file, path)
+    except (IOError, OSError), e:
+        log.warning("Can't cache summary of %s in %s: %s", filename, path, e)
+
+
+def summarize_tree(tree):
+    ''' Get the summary of a meta tree
+
+    Returns a dict with the total number of events (n_evts) and the list
+    of [run, lumi] pairs (run_lumis), in entry order.
+    '''
+    nentries = tree.GetEntries()
+    if not nentries:
+        return {'n_evts': 0, 'run_lumis': []}
+    tree.SetEstimate(nentries + 1)
+    tree.Draw('run:lumi:nevents', '', 'goff')
+    columns = []
+    for buffer in (tree.GetV1(), tree.GetV2(), tree.GetV3()):
+        buffer.SetSize(nentries)
+        columns.append(numpy.frombuffer(buffer, dtype=numpy.float64,
+                                        count=nentries).copy())
+    runs, lumis, nevents = columns
+    n_evts = nevents.sum()
+    # Keep integer counts as ints in the JSON
+    if n_evts == int(n_evts):
+        n_evts = int(n_evts)
+    else:
+        n_evts = float(n_evts)
+    run_lumis = numpy.column_stack(
+        (runs, lumis)).astype(numpy.int64).tolist()
+    return {'n_evts': n_evts, 'run_lumis': run_lumis}
+
+
+def summarize_file(filename, treepath):
+    ''' Get the summary of the meta tree [treepath] in a file '''
+    import ROOT
+    tfile = ROOT.TFile.Open(filename, 'READ')
+    if not tfile:
+        raise IOError("Can't open ROOT file: %s" % filename)
+    try:
+        tree = tfile.Get(treepath)
+        if not tree:
+            raise IOError("Cannot get tree %s from file %s" %
+                          (treepath, filename))
+        return summarize_tree(tree)
+    finally:
+        tfile.Close()
+
+
+def _summarize(job):
+    ''' Summarize one file in a worker.  Returns (index, summary, error) '''
+    index, filename, treepath = job
+    try:
+        return index, summarize_file(filename, treepath), None
+    except Exception, e:
+        return index, None, '%s: %s' % (type(e).__name__, e)
+
+
+def _init_worker():
+    import ROOT
+    ROOT.gROOT.SetBatch(True)
+
+
+def summarize_files(files, treepath, nworkers=None, cache_dir=None,
+                    use_cache=True, timeout=DEFAULT_TIMEOUT):
+    ''' Get the summaries of the meta tree in each of [files]
+
+    Returns the list of summaries, in the order of [files].  Only the
+    files without an up to date cached summary are opened, using
+    [nworkers] processes (one per CPU if None).  Raises an IOError
+    listing the files which could not be read, or which were not done
+    after waiting [timeout] seconds without any file finishing.
+
+    '''
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    summaries = [None] * len(files)
+    todo = []
+    for i, filename in enumerate(files):
+        if use_cache:
+            summaries[i] = load_summary(filename, treepath, cache_dir)
+        if summaries[i] is None:
+            todo.append((i, filename, treepath))
+    log.info("Using %i cached summaries, scanning %i files",
+             len(files) - len(todo), len(todo))
+    if not todo:
+        return summaries
+
+    if nworkers is None:
+        nworkers = multiprocessing.cpu_count()
+    nworkers = max(1, min(nworkers, len(todo)))
+    start = time.time()
+    failed = []
+    done = set()
+
+    def collect(results):
+        for i, summary, error in results:
+            done.add(i)
+            filename = files[i]
+            if error is not None:
+                log.error("Can't summarize %s: %s", filename, error)
+                failed.append(filename)
+                continue
+            log.debug("Summarized %s", filename)
+            summaries[i] = summary
+            stamp = file_stamp(filename)
+            if use_cache and stamp is not None:
+                save_summary(filename, treepath, cache_dir, stamp, summary)
+
+    if nworkers == 1:
+        _init_worker()
+        collect(_summarize(job) for job in todo)
+    else:
+        pool = multiprocessing.Pool(nworkers, _init_worker)
+        try:
+            results = pool.imap_unordered(_summarize, todo, chunksize=1)
+            # The timeout is also needed to deliver KeyboardInterrupt
+            collect(results.next(timeout=timeout) for _ in todo)
+            pool.close()
+        except multiprocessing.TimeoutError:
+            pool.terminate()
+            for i, filename, _ in todo:
+                if i not in done:
+                    log.error("Can't summarize %s: no file finished in %i s",
+                              filename, timeout)
+                    failed.append(filename)
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    log.info("Scanned %i files with %i workers in %0.1f s",
+             len(todo), nworkers, time.time() - start)
+    if failed:
+        raise IOError("Can't summarize %i files, first: %s" %
+                      (len(failed), failed[0]))
+    return summaries
+
+
+def merge_summaries(files, summaries):
+    ''' Merge the summaries of [files]
+
+    Returns (total events, dict mapping (run, lumi) => file, duplicates),
+    where duplicates is a list of (run_lumi, file, other file) for each
+    run/lumi found more than once.
+
+    >>> total, run_lumis, duplicates = merge_summaries(['a', 'b'], [
+    ...     {'n_evts': 10, 'run_lumis': [[1, 1], [1, 2]]},
+    ...     {'n_evts': 5, 'run_lumis': [[1, 3], [1, 2]]}])
+    >>> total
+    15
+    >>> sorted(run_lumis.items())
+    [((1, 1), 'a'), ((1, 2), 'b'), ((1, 3), 'b')]
+    >>> duplicates
+    [((1, 2), 'b', 'a')]
+    '''
+    total = 0
+    run_lumis = {}
+    duplicates = []
+    for filename, summary in zip(files, summaries):
+        total += summary['n_evts']
+        for run, lumi in summary['run_lumis']:
+            run_lumi = (run, lumi)
+            if run_lumi in run_lumis:
+                duplicates.append((run_lumi, filename, run_lumis[run_lumi]))
+            run_lumis[run_lumi] = filename
+    return total, run_lumis, duplicates
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
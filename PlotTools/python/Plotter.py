@@ -13,6 +13,10 @@ import rootpy.plotting.views as views
 import rootpy.plotting as plotting
 from FinalStateAnalysis.MetaData.data_views import data_views
 from FinalStateAnalysis.PlotTools.RebinView import RebinView
+from FinalStateAnalysis.PlotTools.HistCache import HistogramCache
+from FinalStateAnalysis.PlotTools.HistCache import DEFAULT_MAX_BYTES
+from FinalStateAnalysis.PlotTools.FilePool import FilePool, DEFAULT_MAX_OPEN
+from FinalStateAnalysis.PlotTools.KeyIndex import build_key_index
 from FinalStateAnalysis.Utilities.struct import FSAstruct as struct
 import FinalStateAnalysis.Utilities.prettyjson as prettyjson
 import ROOT
@@ -26,7 +30,9 @@ def _monkey_patch_legend_draw(self, *args, **kwargs):
 plotting.Legend.Draw = _monkey_patch_legend_draw
 
 class Plotter(object):
-    def __init__(self, files, lumifiles, outputdir, blinder=None, forceLumi=-1):
+    def __init__(self, files, lumifiles, outputdir, blinder=None, forceLumi=-1,
+                 cache_bytes=DEFAULT_MAX_BYTES, max_open_files=DEFAULT_MAX_OPEN,
+                 snapshot=None):
         ''' Initialize the Plotter object
 
         Files should be a list of SAMPLE_NAME.root files.
@@ -34,9 +40,23 @@ class Plotter(object):
         each of the files.
 
         If [blinder] is not None, it will be applied to the data view.
+
+        Histograms retrieved from the views are cached in memory, up to
+        [cache_bytes] (512 MB by default).  Set it to 0 to disable the
+        cache.
+
+        The files are opened on first use, and at most [max_open_files] are
+        kept open at the same time.  The files used by the current plot are
+        kept open until it is saved or reset.
+
+        If [snapshot] is given, the histograms are read from this snapshot
+        (see HistSnapshot) instead of from the files.
         '''
         self.outputdir = outputdir
-        self.views = data_views(files, lumifiles, forceLumi)
+        self.hist_cache = HistogramCache(cache_bytes) if cache_bytes else False
+        self.file_pool = FilePool(max_open_files)
+        self.views = data_views(files, lumifiles, forceLumi, self.hist_cache,
+                                self.file_pool, snapshot)
         self.canvas = plotting.Canvas(name='adsf', title='asdf')
         self.canvas.cd()
         self.pad    = plotting.Pad('up', 'up', 0., 0., 1., 1.) #ful-size pad
@@ -63,7 +83,19 @@ class Plotter(object):
         if not file_to_map: #no data here!
             file_to_map = self.views.keys()[0]
         #from pdb import set_trace; set_trace()
-        self.file_dir_structure = Plotter.map_dir_structure( self.views[file_to_map]['file'] )
+        # Index of the objects in the file, cached next to it
+        file_to_map = self.views[file_to_map]['file']
+        if hasattr(file_to_map, 'key_index'):
+            self.key_index = file_to_map.key_index
+        else:
+            self.key_index = build_key_index(file_to_map.GetName())
+        self.file_dir_structure = self.key_index.directories()
+
+    def cache_stats(self):
+        ''' Get the hit/miss statistics of the histogram cache '''
+        if not self.hist_cache:
+            return {}
+        return self.hist_cache.stats()
 
     @staticmethod
     def map_dir_structure(directory, dirName=''):
@@ -273,6 +305,7 @@ class Plotter(object):
         self.pad.Draw()
         self.pad.cd()
         self.lower_pad = None
+        self.file_pool.release()
 
     def save(self, filename, dotc=False, dotroot=False, json=False, verbose=False):
         ''' Save the current canvas contents to [filename] '''
@@ -320,6 +353,8 @@ class Plotter(object):
         # Reset logx/y
         self.canvas.SetLogx(False)
         self.canvas.SetLogy(False)
+        # The histograms of this plot are no longer needed
+        self.file_pool.release()
         
     def plot(self, sample, path, drawopt='', rebin=None, styler=None, xaxis='', xrange=None):
         ''' Plot a single histogram from a single sample.
@@ -360,8 +395,7 @@ class Plotter(object):
     def expand_path(self, pattern):
         #because fnmatch does not treat / properly and may generate LOTS of problems
         if any((i in pattern) for i in ['*', '?']):
-            repattern = re.compile('^'+pattern.replace('*','[^/]*').replace('?','[^/]')+'$')
-            return [i for i in self.file_dir_structure if repattern.match(i)]
+            return self.key_index.glob(pattern, class_pattern='TDirectory*')
         else:
             return [pattern]
 
@@ -8,11 +8,11 @@ Author: Evan K. Friis, UW Madison
 
 import array
 import rootpy.plotting.views as views
-import rootpy.plotting as plotting
 try:
     from rootpy.utils import asrootpy
 except ImportError:
     from rootpy import asrootpy
+from HistArrays import rebin as rebin_edges
 import ROOT
 import os
 
@@ -29,45 +29,12 @@ class RebinView(views._FolderView):
     @staticmethod
     def newRebin2D(histogram, bin_arrayx, bin_arrayy):
         'Rebin 2D histo with irregular bin size'
-        
-        #create a clone with proper binning
-        # from pdb import set_trace; set_trace()
-        new_histo = plotting.Hist2D(
-            bin_arrayx,
-            bin_arrayy,
-            #name = histogram.name,
-            title = histogram.title,
-            **histogram.decorators
-        )
+        new_histo = histogram.Clone(histogram.GetName() + 'rebin')
+        if hasattr(histogram, 'decorators'):
+            new_histo.decorate(**histogram.decorators)
+        # Every new edge must match an old one, see HistArrays.rebin
+        return rebin_edges(new_histo, bin_arrayx, bin_arrayy)
 
-        #check that new bins don't overlap on old edges
-        oldbinx = [float(histogram.GetXaxis().GetBinLowEdge(1))]
-        oldbiny = [float(histogram.GetYaxis().GetBinLowEdge(1))]
-        oldbinx.extend(float(histogram.GetXaxis().GetBinUpEdge(x)) for x in xrange(1, histogram.GetNbinsX()+1))
-        oldbiny.extend(float(histogram.GetYaxis().GetBinUpEdge(y)) for y in xrange(1, histogram.GetNbinsY()+1))
-        for x in bin_arrayx:
-            if x==0:
-                if not any( abs((oldx)) < 10**-8 for oldx in oldbinx ):
-                    raise Exception('New bin edge in x axis %s does not match any old bin edge, operation not permitted' % x)
-            else:
-                if not any( abs((oldx / x)-1.) < 10**-8 for oldx in oldbinx ):
-                    raise Exception('New bin edge in x axis %s does not match any old bin edge, operation not permitted' % x)
-        for y in bin_arrayy:
-            if y ==0:
-                if not any( abs((oldy) )< 10**-8 for oldy in oldbiny ):
-                    raise Exception('New bin edge in y axis %s does not match any old bin edge, operation not permitted' % y)
-            else:
-                if not any( abs((oldy / y)-1.) < 10**-8 for oldy in oldbiny ):
-                    raise Exception('New bin edge in y axis %s does not match any old bin edge, operation not permitted' % y)
-        
-        #fill the new histogram
-        for x in xrange(1, histogram.GetNbinsX()+1 ):
-            for y in xrange(1, histogram.GetNbinsY()+1 ):
-                new_histo.Fill(histogram.GetXaxis().GetBinCenter(x), histogram.GetYaxis().GetBinCenter(y), histogram.GetBinContent(x,y))
-
-        new_histo.SetEntries( histogram.GetEntries() )
-        return new_histo
-                              
     def rebin(self, histogram, binning):
         ''' Rebin a histogram
 
@@ -82,7 +49,12 @@ class RebinView(views._FolderView):
             histogram.Rebin(binning)
             return histogram
         # Fancy variable size bins
-        if isinstance(histogram, ROOT.TH2):
+        if isinstance(histogram, ROOT.TH3):
+            if len(binning) != 3 or \
+                    not isinstance(binning[0], (list, tuple)):
+                return histogram
+            return rebin_edges(histogram, *binning)
+        elif isinstance(histogram, ROOT.TH2):
             if not isinstance(binning[0], (list, tuple)):
                 return histogram
             #print binning[0], ' ' , binning[1] 
@@ -95,11 +67,18 @@ class RebinView(views._FolderView):
         elif isinstance(histogram, ROOT.TH1):
             if isinstance(binning[0], (list, tuple)):
                 return histogram
+            if not isinstance(histogram, ROOT.TProfile):
+                try:
+                    return rebin_edges(histogram, binning)
+                except ValueError:
+                    # The new edges don't match the old ones
+                    pass
+            # TH1::Rebin takes any edges, and merges the TProfile entries
             bin_array = array.array('d', binning)
             ret = asrootpy( histogram.Rebin(len(binning)-1, histogram.GetName() + 'rebin', bin_array) )
             if hasattr(histogram, 'decorators'):
                 ret.decorate( **histogram.decorators )
-            return ret 
+            return ret
         else:
             print 'ERROR in RebinView: not a TH1 or TH2 histo. Rebin not done'
             
@@ -14,6 +14,7 @@ Author: Evan K. Friis, UW Madison
 '''
 
 from rootpy.plotting import views
+from HistArrays import contents
 
 class PositiveView(views._FolderView):
     ''' Restrict a histogram to non-negative entries
@@ -27,9 +28,8 @@ class PositiveView(views._FolderView):
     @staticmethod
     def positivize(histogram):
         output = histogram.Clone()
-        for i in range(output.GetSize()):
-            if output.GetArray()[i] < 0:
-                output.AddAt(0, i)
+        values = contents(output)
+        values[values < 0] = 0
         return output
 
     def apply_view(self, histogram):
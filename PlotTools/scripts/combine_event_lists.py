@@ -11,6 +11,7 @@ Usage: combine_event_lists.py file [file [file] ]]
 from RecoLuminosity.LumiDB import argparse
 import json
 import sys
+import FinalStateAnalysis.Utilities.eventsets as eventsets
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -21,22 +22,32 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    full_event_list = []
-    unique_events = set([])
+    n_events = 0
+    separator = ''
+    unique_events = eventsets.union()
 
+    if not args.count:
+        sys.stdout.write('[')
     for filename in args.files:
         with open(filename) as file:
             event_list = json.load(file)
-            full_event_list.extend(event_list)
+        n_events += len(event_list)
+        unique_events = eventsets.union(unique_events, eventsets.from_events(
+            tuple(eventsets.event_info(x)) for x in event_list))
+        if not args.count:
+            # Write the events of each file as they are read
             for event in event_list:
-                unique_events.add(tuple(event['evt']))
+                text = json.dumps(event, indent=2, sort_keys=True)
+                sys.stdout.write(
+                    '%s\n  %s' % (separator, text.replace('\n', '\n  ')))
+                separator = ','
 
     if not args.count:
-        json.dump(full_event_list, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n]')
         sys.stderr.write(
             'Combined %i events [%i unique]\n'
-            % (len(full_event_list), len(unique_events))
+            % (n_events, len(unique_events))
         )
     else:
         sys.stderr.write(
-            '%i[%i unique]' % (len(full_event_list), len(unique_events)) )
+            '%i[%i unique]' % (n_events, len(unique_events)) )
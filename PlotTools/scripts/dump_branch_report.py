@@ -0,0 +1,47 @@
+#! /bin/env python
+
+'''
+
+Merge the branch access reports written by mega when running with an
+instrumented cython proxy (make_cython_proxy.py --instrument) and
+$megabranchreport set.
+
+Prints the branches sorted by the number of GetEntry calls.  With
+--names-only, only the names of the accessed branches are printed, one per
+line, which can be used as the list of branches to activate or to keep
+when slimming the ntuples.
+
+'''
+
+from RecoLuminosity.LumiDB import argparse
+import json
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('reports', nargs='+',
+                        help='Branch report .json files')
+    parser.add_argument('--names-only', action='store_true', dest='names',
+                        help='Only print the names of accessed branches')
+    args = parser.parse_args()
+
+    calls = {}
+    nbytes = {}
+    for report_file in args.reports:
+        with open(report_file) as report:
+            for proxy, branches in json.load(report).iteritems():
+                for branch, ncalls, nread in branches:
+                    calls[branch] = calls.get(branch, 0) + ncalls
+                    nbytes[branch] = nbytes.get(branch, 0) + nread
+
+    accessed = sorted((x for x in calls if calls[x]),
+                      key=lambda x: (calls[x], nbytes[x]), reverse=True)
+
+    if args.names:
+        for branch in accessed:
+            print branch
+    else:
+        print '%-40s %15s %15s' % ('branch', 'calls', 'bytes')
+        for branch in accessed:
+            print '%-40s %15i %15i' % (branch, calls[branch], nbytes[branch])
+        print '%i/%i branches accessed, %i bytes read' % (
+            len(accessed), len(calls), sum(nbytes.itervalues()))
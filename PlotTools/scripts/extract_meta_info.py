@@ -7,7 +7,9 @@ run/lumi which contains the number of originally processed events.
 
 You can use this to normalize an MC sample to a given int. lumi.
 
-This script extract that info and puts in it a json file.
+This script extract that info and puts in it a json file.  The files are
+summarized in parallel, and the summaries are cached (see MetaSummary), so
+only new or changed files are read again.
 
 Author: Evan K. Friis, UW
 
@@ -19,7 +21,9 @@ import logging
 import sys
 
 from FinalStateAnalysis.PlotTools.MegaPath import resolve_file
-from FinalStateAnalysis.Utilities.lumitools import json_summary
+from FinalStateAnalysis.PlotTools.MetaSummary import summarize_files, \
+    merge_summaries
+from FinalStateAnalysis.Utilities.lumitools import LumiMask
 
 log = logging.getLogger(__name__)
 
@@ -37,12 +41,17 @@ if __name__ == "__main__":
     parser.add_argument('--lumimask', action='store_const',
                         const=True, default=False,
                         help='If true, include the run-lumi mask result')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes reading the files.'
+                        ' Default: one per CPU')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        default=True,
+                        help='Ignore the cached summaries ($megametacache)')
     parser.add_argument('--debug', action='store_const',
                         const=True, default=False,
                         help='Print debug output')
 
     args = parser.parse_args()
-    import ROOT
 
     files = []
     if '.txt' in args.input:
@@ -61,34 +70,25 @@ if __name__ == "__main__":
 
     log.info("Extracting meta info from %i files", len(files))
 
-    total_events = 0
-    run_lumis = {}
-
-    for file in files:
-        log.debug("OPEN file %s", file)
-        tfile = ROOT.TFile.Open(file, "READ")
-        tree = tfile.Get(args.tree)
-        if not tree:
-            log.error("Cannot get tree %s from file %s", args.tree, file)
-            raise SystemExit(1)
-        for entry in xrange(tree.GetEntries()):
-            tree.GetEntry(entry)
-            total_events += tree.nevents
-            # We only care about this if we are building the lumimask
-            if args.lumimask:
-                run_lumi = (tree.run, tree.lumi)
-                log.debug("R-L %s %s", repr(run_lumi), file)
-                if run_lumi in run_lumis:
-                    log.error("Run-lumi %s found in file \n%s \nand %s!",
-                              run_lumi, file, run_lumis[run_lumi])
-                run_lumis[run_lumi] = file
-        tfile.Close()
+    try:
+        summaries = summarize_files(files, args.tree, args.workers,
+                                    use_cache=args.cache)
+    except IOError, e:
+        log.error(str(e))
+        raise SystemExit(1)
+
+    total_events, run_lumis, duplicates = merge_summaries(files, summaries)
+    # We only care about this if we are building the lumimask
+    if args.lumimask:
+        for run_lumi, file, other in duplicates:
+            log.error("Run-lumi %s found in file \n%s \nand %s!",
+                      run_lumi, file, other)
 
     output = {
         'n_evts': total_events,
     }
     if args.lumimask:
-        output['lumi_mask'] = json_summary(run_lumis)
+        output['lumi_mask'] = LumiMask.from_run_lumis(run_lumis).to_json()
 
     with open(args.output, 'w') as output_file:
         output_file.write(json.dumps(output, indent=2, sort_keys=True) + '\n')
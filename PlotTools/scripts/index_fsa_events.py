@@ -0,0 +1,72 @@
+#! /bin/env python
+
+'''
+
+Build run/lumi/event indices for a set of FSA ntuples.
+
+The indices are written as sidecar files next to the ntuples, or in
+--index-dir (default: $megaeventindex) if given.  Up to date indices are
+not rebuilt unless --force is given.
+
+usage::
+    index_fsa_events.py inputs.txt mmt/final/Ntuple
+
+'''
+
+from RecoLuminosity.LumiDB import argparse
+import logging
+import multiprocessing
+import sys
+
+from FinalStateAnalysis.PlotTools.MegaPath import find_input_files
+
+log = logging.getLogger("index_fsa_events")
+
+
+def index_one(job):
+    ''' Build the index for one file.  Returns (file, nentries or error) '''
+    filename, treepath, index_dir, force = job
+    # Import here, so ROOT is not loaded in the parent process
+    from FinalStateAnalysis.PlotTools.EventIndex import build_index
+    try:
+        return filename, build_index(filename, treepath, index_dir,
+                                     force).nentries
+    except Exception, e:
+        return filename, e
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('inputs', help='.txt file with input files, or a '
+                        'comma separated list of files')
+    parser.add_argument('treepath', help='Path to TTree in the files')
+    parser.add_argument('--index-dir', dest='index_dir', default=None,
+                        help='Store the indices in this directory (def: next '
+                        'to the ntuples, or $megaeventindex if their '
+                        'directory is not writable)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of worker processes (def: 4)')
+    parser.add_argument('--force', action='store_true',
+                        help='Rebuild up to date indices')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print debug output')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO
+                        if args.verbose else logging.WARNING)
+
+    jobs = [(x, args.treepath, args.index_dir, args.force)
+            for x in find_input_files(args.inputs)]
+    log.info("Indexing %i files", len(jobs))
+
+    pool = multiprocessing.Pool(args.workers)
+    failed = 0
+    for filename, result in pool.imap_unordered(index_one, jobs):
+        if isinstance(result, Exception):
+            log.error("Could not index %s: %s", filename, result)
+            failed += 1
+        else:
+            log.info("Indexed %s: %i entries", filename, result)
+    pool.close()
+    pool.join()
+    if failed:
+        sys.exit(2)
@@ -7,11 +7,17 @@ setup.py build file.
 Currently only simple, single types (I, F) are supported.
 
 usage::
-    make_cython_proxy.py [-h] template_file.root tree_path ClassName
+    make_cython_proxy.py [-h] [--instrument] template_file.root tree_path ClassName
 
 This will generate ClassName.pyx and ClassName_setup.py based
 on the tree found at [tree_path] in [template_file.root]
 
+If --instrument is given, the proxy counts the number of GetEntry calls
+and bytes read for each branch.  The counts are available from the
+branch_access_report() method of the proxy, and are dumped by mega at the
+end of each unit of work if $megabranchreport is set.  The merged report
+(dump_branch_report.py) can be used as a list of branches to activate.
+
 The proxy is built by running::
     python ClassName_setup.py build_ext --inplace
 this will create a ClassName.so which can be imported in a regular
@@ -55,14 +61,6 @@ cdef extern from "TFile.h":
         TFile(char*, char*, char*, int)
         TObject* Get(char*)
 
-# Used for filtering with a string
-cdef extern from "TTreeFormula.h":
-    cdef cppclass TTreeFormula:
-        TTreeFormula(char*, char*, TTree*)
-        double EvalInstance(int, char**)
-        void UpdateFormulaLeaves()
-        void SetTree(TTree*)
-
 from cpython cimport PyCObject_AsVoidPtr
 import warnings
 def my_warning_format(message, category, filename, lineno, line=""):
@@ -77,6 +75,8 @@ cdef class {TreeName}:
     cdef int currentTreeNumber
     cdef long ientry
     cdef long localentry
+    # Python handle of the tree, used to build entry lists
+    cdef object pytree
     # Keep track of missing branches we have complained about.
     cdef public set complained
 
@@ -88,6 +88,7 @@ cdef class {TreeName}:
         # Constructor from a ROOT.TTree
         from ROOT import AsCObject
         self.tree = <TTree*>PyCObject_AsVoidPtr(AsCObject(ttree))
+        self.pytree = ttree
         self.ientry = 0
         self.currentTreeNumber = -1
         #print self.tree.GetEntries()
@@ -121,23 +122,18 @@ cdef class {TreeName}:
             yield self
             self.ientry += 1
 
-    # Iterate over rows which pass the filter
-    def where(self, filter):
-        print "where"
-        cdef TTreeFormula* formula = new TTreeFormula(
-            "cyiter", filter, self.tree)
-        self.ientry = 0
-        cdef TTree* currentTree = self.tree.GetTree()
-        while self.ientry < self.tree.GetEntries():
-            self.tree.LoadTree(self.ientry)
-            if currentTree != self.tree.GetTree():
-                currentTree = self.tree.GetTree()
-                formula.SetTree(currentTree)
-                formula.UpdateFormulaLeaves()
-            if formula.EvalInstance(0, NULL):
+    # Iterate over rows which pass the filter.  The passing entries are
+    # computed once per file using a TEntryList, and optionally cached in
+    # cache_dir (default: $megaentrylists)
+    def where(self, filter, cache_dir=None):
+        from FinalStateAnalysis.PlotTools.EntryListCache import chain_entry_lists
+        cdef long offset
+        cdef long local
+        for offset, entries in chain_entry_lists(self.pytree, filter, cache_dir):
+            for local in entries:
+                self.ientry = offset + local
+                self.load_entry(self.ientry)
                 yield self
-            self.ientry += 1
-        del formula
 
     # Getting/setting the Tree entry number
     property entry:
@@ -150,7 +146,19 @@ cdef class {TreeName}:
 
     # Access to the current branch values
 {getbranchesblock}
+{reportblock}
+
+'''
 
+_report_template = '''
+    # Per-branch (name, GetEntry calls, bytes read), most accessed first
+    def branch_access_report(self):
+        from operator import itemgetter
+        report = [
+{reportentries}
+        ]
+        report.sort(key=itemgetter(1, 2), reverse=True)
+        return report
 '''
 
 _setup_template = '''
@@ -199,11 +207,17 @@ def get_branches(tree):
         yield name, type_map[type]
 
 
-def make_pyx(name, tree):
-    ''' Generate the content of a pyx file for this Tree '''
+def make_pyx(name, tree, instrument=False):
+    ''' Generate the content of a pyx file for this Tree
+
+    If instrument is True, count the GetEntry calls and bytes read for
+    each branch.
+
+    '''
     branchblock = cStringIO.StringIO()
     setbranchesblock = cStringIO.StringIO()
     getbranchesblock = cStringIO.StringIO()
+    reportentries = cStringIO.StringIO()
 
     # Declare data members & methods for each branch.
     for branch_name, branch_type in get_branches(tree):
@@ -239,19 +253,49 @@ def make_pyx(name, tree):
         # into the value, and then return the value.
         # Note that the entry number is available/set via
         # the class member ientry.
-        getbranchesblock.write(
+        if not instrument:
+            getbranchesblock.write(
 '''
     property {branchname}:
         def __get__(self):
             self.{branchname}_branch.GetEntry(self.localentry, 0)
             return self.{branchname}_value
 '''.format(branchname=branch_name, branchtype=branch_type)
+            )
+            continue
+
+        # In the instrumented build, keep track of how often each branch
+        # is read, and how many bytes GetEntry returned.
+        branchblock.write(
+'''    cdef long {branchname}_calls
+    cdef long {branchname}_bytes
+'''.format(branchname=branch_name)
         )
+        getbranchesblock.write(
+'''
+    property {branchname}:
+        def __get__(self):
+            self.{branchname}_calls += 1
+            self.{branchname}_bytes += self.{branchname}_branch.GetEntry(self.localentry, 0)
+            return self.{branchname}_value
+'''.format(branchname=branch_name, branchtype=branch_type)
+        )
+        reportentries.write(
+'''            ("{branchname}", self.{branchname}_calls, self.{branchname}_bytes),
+'''.format(branchname=branch_name)
+        )
+
+    reportblock = ''
+    if instrument:
+        reportblock = _report_template.format(
+            reportentries=reportentries.getvalue())
+
     return _pyx_template.format(
         TreeName=name,
         branchblock=branchblock.getvalue(),
         setbranchesblock=setbranchesblock.getvalue(),
-        getbranchesblock=getbranchesblock.getvalue()
+        getbranchesblock=getbranchesblock.getvalue(),
+        reportblock=reportblock,
     )
 
 if __name__ == "__main__":
@@ -260,6 +304,8 @@ if __name__ == "__main__":
                         help='File path to .root file with template TTree')
     parser.add_argument('tree_path', help='Path in .root file to TTree')
     parser.add_argument('ClassName', help='Name of cython proxy class')
+    parser.add_argument('--instrument', action='store_true',
+                        help='Count GetEntry calls and bytes read per branch')
 
     args = parser.parse_args()
 
@@ -267,7 +313,7 @@ if __name__ == "__main__":
     tree = file.Get(args.tree_path)
 
     with open('%s.pyx' % args.ClassName, 'w') as pyx_file:
-        pyx_file.write(make_pyx(args.ClassName, tree))
+        pyx_file.write(make_pyx(args.ClassName, tree, args.instrument))
 
     # Figure out the root include and lib paths
     incdir = subprocess.Popen(
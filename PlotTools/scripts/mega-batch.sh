@@ -4,10 +4,12 @@
 # Authors: M. Verzetti (Zurich), E. Friis (UW)
 # ARGS
 # 1 --> analyzer
-# 2 --> input files, comma separated
+# 2 --> input files, comma separated, or a .txt file list
 # 3 --> output file name
 # 4 --> working directory
 # 5 --> TTree path
+# 6 --> optional --packed-inputs=INDEX: the input is one file of a packed
+#       job, whose other files are in INDEX (see JobPacking.py)
 
 echo "mega-batch.sh with arguments: $@"
 
@@ -16,6 +18,11 @@ inputs=$2
 output=$3
 workingdir=$4
 tree=$5
+packed=$6
+# An empty tree path may be dropped
+case "$tree" in
+    --packed-inputs=*) packed=$tree; tree="";;
+esac
 
 pushd $CMSSW_BASE
 source $CMSSW_BASE/src/UWHiggs/environment.sh
@@ -31,8 +38,11 @@ pushd $workingdir
 echo "Now in directory $workingdir"
 ls
 
-echo time $MEGA $analyzer $inputs $sandbox/$output --tree "$tree" --single-mode 
-time $MEGA $analyzer $inputs $sandbox/$output --tree "$tree" --single-mode --verbose
+# Record the throughput of the selector, used by mega-farmout to pack jobs
+throughputlog=$workingdir/mega-throughput.jsonl
+
+echo time $MEGA $analyzer $inputs $sandbox/$output --tree "$tree" --single-mode --throughput-log $throughputlog $packed
+time $MEGA $analyzer $inputs $sandbox/$output --tree "$tree" --single-mode --throughput-log $throughputlog $packed --verbose
 retcode=$?
 popd
 
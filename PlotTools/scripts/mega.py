@@ -13,10 +13,13 @@ import logging
 import multiprocessing
 import os
 import sys
+import time
 
 from FinalStateAnalysis.PlotTools.ChainProcessor import ChainProcessor
 from FinalStateAnalysis.PlotTools.Dispatcher import MegaDispatcher
 from FinalStateAnalysis.PlotTools.MegaPath import find_input_files
+from FinalStateAnalysis.PlotTools.JobPacking import record_throughput, \
+    packed_job_files
 
 log = multiprocessing.log_to_stderr()
 log.setLevel(logging.WARNING)
@@ -62,6 +65,15 @@ if __name__ == "__main__":
     parser.add_argument('--single-mode', action='store_true', dest='single',
                         help="Run as a single job.")
 
+    parser.add_argument('--throughput-log', dest='throughput_log',
+                        default=None, help='Append the measured events/second'
+                        ' to this file (single mode only)')
+
+    parser.add_argument('--packed-inputs', dest='packed_inputs',
+                        default=None, help='Index of packed jobs (made by '
+                        'mega-farmout): run over all the files of the job '
+                        'the inputs belong to')
+
     parser.add_argument('--verbose', action='store_const', const=True,
                         default=False, help='Print debug output')
 
@@ -77,7 +89,11 @@ if __name__ == "__main__":
     else:
         log.info("Creating mega session with 1 workers - single mode")
 
-    file_list = list(xrootify(find_input_files(args.inputs)))
+    if args.packed_inputs:
+        file_list = list(xrootify(
+            packed_job_files(args.packed_inputs, args.inputs)))
+    else:
+        file_list = list(xrootify(find_input_files(args.inputs)))
 
     if not file_list:
         log.error("Dataset %s has no files!  Skipping..." % file_list)
@@ -112,5 +128,12 @@ if __name__ == "__main__":
         print args.output
         processor = ChainProcessor(file_list, tree_name, selector,
                                    args.output, log)
+        nevents = processor.tree.GetEntries()
+        start = time.time()
         result = processor.process()
+        elapsed = time.time() - start
+        log.info("Processed %i events in %0.1f seconds", nevents, elapsed)
+        if args.throughput_log:
+            record_throughput(args.throughput_log, class_name,
+                              nevents, elapsed)
     log.info("Mega2 job is complete")
@@ -4,7 +4,11 @@
 
 Command Line tool to get the events which pass a set of cuts.
 
-Maybe should be parallelized in the future?
+The input files are processed in parallel using the mega worker pool.  Each
+worker streams the passing events into a line-delimited JSON file, which
+are concatenated into the output as the jobs finish.  If the output file
+ends with .json, the events are additionally collected into a JSON list
+at the end (the line-delimited version is kept as output + 'l').
 
 Author: Evan K. Friis, UW Madison
 
@@ -13,12 +17,11 @@ Author: Evan K. Friis, UW Madison
 from RecoLuminosity.LumiDB import argparse
 import logging
 import json
+import multiprocessing
 import os
-from progressbar import ETA, ProgressBar, FormatLabel, Bar
 import sys
 
-log = logging.getLogger("megadebug")
-logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+log = multiprocessing.log_to_stderr()
 log.setLevel(logging.WARNING)
 
 parser = argparse.ArgumentParser()
@@ -27,6 +30,62 @@ sys.argv = []
 
 import ROOT
 
+from FinalStateAnalysis.PlotTools.Dispatcher import MegaDispatcher
+from FinalStateAnalysis.PlotTools.MegaMerger import MegaEventsMerger
+from FinalStateAnalysis.PlotTools.MegaMerger import events_file_name
+
+
+class EventSelector(object):
+    ''' Mega "selector" which writes the events passing the selections
+
+    The events are written as one JSON object per line into
+    events_file_name(output), where output is the ROOT output file of the
+    job.
+
+    '''
+    def __init__(self, tree, output, selections=(), branches=(),
+                 active_branches=None):
+        self.tree = tree
+        self.output = output
+        self.selections = selections
+        self.branches = branches
+        self.active_branches = active_branches
+        self.events_file = None
+
+    def begin(self):
+        if self.active_branches is not None:
+            self.tree.SetBranchStatus('*', 0)
+            for b in self.active_branches:
+                self.tree.SetBranchStatus(b, 1)
+            self.tree.SetBranchStatus('run', 1)
+            self.tree.SetBranchStatus('lumi', 1)
+            self.tree.SetBranchStatus('evt', 1)
+            for b in self.branches:
+                self.tree.SetBranchStatus(b, 1)
+        self.events_file = open(events_file_name(self.output.GetName()), 'w')
+
+    def process(self):
+        tree = self.tree
+        for row in xrange(tree.GetEntries()):
+            tree.GetEntry(row)
+            all_passed = True
+            for name, selection in self.selections:
+                passed = selection(tree)
+                if not passed:
+                    all_passed = False
+                    break
+            if all_passed:
+                this_event = {
+                    'evt': (tree.run, tree.lumi, tree.evt),
+                }
+                for branch in self.branches:
+                    this_event[branch] = getattr(tree, branch)
+                self.events_file.write(json.dumps(this_event) + '\n')
+
+    def finish(self):
+        self.events_file.close()
+
+
 if __name__ == "__main__":
 
     parser.add_argument('selector', metavar='selector', type=str,
@@ -50,6 +109,12 @@ if __name__ == "__main__":
     parser.add_argument('--branches', default=[], metavar="branch", nargs='*',
                         help="Store the values of the branches in the output")
 
+    parser.add_argument('--workers', type=int, required=False, default=4,
+                        help='Number of worker processes (def: 4)')
+
+    parser.add_argument('--chain', type=int, required=False,
+                        default=1, help='Number of files to chain together')
+
     args = parser.parse_args(args[1:])
 
     log.info("Checking inputs file %s exists..." % args.inputs)
@@ -73,13 +138,9 @@ if __name__ == "__main__":
         log.error("Dataset %s has no files!  Skipping..." % args.inputs)
         sys.exit(1)
 
-    log.info("Building TChain")
-    chain = ROOT.TChain(args.tree)
-    for file in file_list:
-        chain.AddFile(file)
-
     log.info("Building selectors")
     path_to_selector = os.path.dirname(os.path.abspath(args.selector))
+    sys.path = [path_to_selector] + sys.path
     module_name = os.path.basename(args.selector)
     class_name = module_name.replace('.py', '')
     log.info("Importing class %s from %s", class_name, path_to_selector)
@@ -92,54 +153,32 @@ if __name__ == "__main__":
         selection = selection.replace('-', '')
         selections.append( (selection, getattr(module, selection)) )
 
-    log.info("Beginning loop over %i TChain entries", chain.GetEntries())
-    current_event = (None, None, None)
-
     log.info("Trying to import meta tree")
+    active_branches = None
     try:
-        #metamodule = __import__(class_name, fromlist=['meta'])
         meta = getattr(module, 'meta')
         log.info("Got meta tree! - Disabling unused branches")
-        chain.SetBranchStatus('*', 0)
-        for b in meta.active_branches():
-            chain.SetBranchStatus(b, 1)
-        chain.SetBranchStatus('run', 1)
-        chain.SetBranchStatus('lumi', 1)
-        chain.SetBranchStatus('evt', 1)
-        for b in args.branches:
-            chain.SetBranchStatus(b, 1)
+        active_branches = meta.active_branches()
     except:
         raise
         log.warning("Couldn't get meta tree - will not disable branches")
 
-
-    passed_events = []
-
-    nrows = chain.GetEntries()
-    pbar = ProgressBar(widgets=[
-        FormatLabel('Processed %(value)i/' + str(nrows) + ' rows. '),
-        ETA(), Bar('>')], maxval=nrows).start()
-    pbar.update(0)
-
-    for row in xrange(nrows):
-        pbar.update(row)
-        chain.GetEntry(row)
-        all_passed = True
-        for name, selection in selections:
-            passed = selection(chain)
-            if not passed:
-                all_passed = False
-                break
-        if all_passed:
-            this_event = {
-                'evt': (chain.run, chain.lumi, chain.evt),
-            }
-            for branch in args.branches:
-                this_event[branch] = getattr(chain, branch)
-            passed_events.append(this_event)
-
-    log.info("Dumping output")
-    with open(args.output, 'w') as json_file:
-        json.dump(passed_events, json_file, indent=2)
-
-
+    lines_output = args.output
+    if args.output.endswith('.json'):
+        lines_output = args.output + 'l'
+
+    log.info("Dispatching %i files to %i workers", len(file_list),
+             args.workers)
+    dispatch = MegaDispatcher(file_list, args.tree, lines_output,
+                              EventSelector, args.workers, nchain=args.chain,
+                              merger=MegaEventsMerger,
+                              selections=selections, branches=args.branches,
+                              active_branches=active_branches)
+    dispatch.run()
+
+    if lines_output != args.output:
+        log.info("Dumping output")
+        with open(lines_output) as lines_file:
+            passed_events = [json.loads(line) for line in lines_file]
+        with open(args.output, 'w') as json_file:
+            json.dump(passed_events, json_file, indent=2)
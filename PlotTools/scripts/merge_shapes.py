@@ -6,6 +6,8 @@ import sys
 import os
 import logging
 from pdb import set_trace
+from FinalStateAnalysis.PlotTools.HistArrays import divide_by_bin_width
+from FinalStateAnalysis.PlotTools.KeyIndex import build_key_index
 
 logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
 
@@ -37,14 +39,8 @@ def parse_cgs(cgs_filename):
     return ret
 
 def normalize(hist):
-    for i in range(0, hist.GetNbinsX()+2): #scale underflow/overflow too                                                                                                                              
-        content = hist.GetBinContent(i)
-        error   = hist.GetBinError(i)
-        width   = hist.GetBinWidth(i)
-        hist.SetBinContent(i, content / width)
-        hist.SetBinError(i, error / width)
-        
-    return hist
+    #scale underflow/overflow too
+    return divide_by_bin_width(hist)
 
 
 if __name__ == '__main__':
@@ -82,9 +78,11 @@ if __name__ == '__main__':
     h_bkg    = None
 
     root_files = []
+    key_indices = {}
     for i in root_names:
         logging.info('opening %s' % i)
         root_files.append( ROOT.TFile.Open(i) )
+        key_indices[root_files[-1].GetName()] = build_key_index(i)
 
     ofile      = ROOT.TFile(args.ofile_name, 'recreate')
 
@@ -94,7 +92,9 @@ if __name__ == '__main__':
             for bkg in cgs['backgrounds']:
                 path = os.path.join(category, bkg)
                 for tfile in root_files:
-                    tmp_h = tfile.Get(path)
+                    # Don't probe paths which aren't in the file
+                    tmp_h = tfile.Get(path) \
+                        if path in key_indices[tfile.GetName()] else None
                     logging.info( 'getting %s' % path )
                     if tmp_h:
                         if not h_bkg:
@@ -109,7 +109,9 @@ if __name__ == '__main__':
             for sig in cgs['signals']:
                 path = os.path.join(category, sig)+mass_point
                 for tfile in root_files:
-                    tmp_h = tfile.Get(path)
+                    # Don't probe paths which aren't in the file
+                    tmp_h = tfile.Get(path) \
+                        if path in key_indices[tfile.GetName()] else None
                     logging.info( 'getting %s' % path )
                     if tmp_h:
                         if not h_signal:
@@ -123,7 +125,9 @@ if __name__ == '__main__':
             for dat in cgs['data']:
                 path = os.path.join(category, dat) 
                 for tfile in root_files:
-                    tmp_h = tfile.Get(path)
+                    # Don't probe paths which aren't in the file
+                    tmp_h = tfile.Get(path) \
+                        if path in key_indices[tfile.GetName()] else None
                     logging.info( 'getting %s' % path )
                     if tmp_h:
                         if not h_data:
@@ -9,6 +9,7 @@ from pdb import set_trace
 import glob
 import os
 import ROOT
+from FinalStateAnalysis.PlotTools.EventIndex import load_index
 
 ROOT.gROOT.SetBatch(True)
 #log = logging.getLogger("CorrectFakeRateData")
@@ -77,7 +78,27 @@ if __name__ == "__main__":
             print 'restricting to following epochs: %s' % periods
             input_files = filter(lambda x: any(y in x for y in periods), input_files)
 
-    if args.needle_mode:
+    # If all the files have run/lumi/evt indices, we only need to read the
+    # matching entries of the files containing the events.
+    indices = [load_index(x, args.treepath) for x in input_files]
+    entries_to_pick = None
+    if input_files and all(x is not None for x in indices):
+        print "using run/lumi/evt indices..."
+        good_files = []
+        entries_to_pick = []
+        offset = 0
+        for tfile_name, index in zip(input_files, indices):
+            found = index.find_many(evts_to_pick)
+            if not found:
+                continue
+            good_files.append(tfile_name)
+            for entries in found.itervalues():
+                entries_to_pick.extend(offset + x for x in entries)
+            offset += index.nentries
+        entries_to_pick.sort()
+        print 'restricting to following files: %s' % good_files
+        input_files = good_files
+    elif args.needle_mode:
         good_files = []
         progress= ProgressBar(
             widgets = [
@@ -119,15 +140,24 @@ if __name__ == "__main__":
     evt_in_file  = dict([(i,[]) for i in evts_to_pick])
     picked = 0
 
-    entries = in_tree.GetEntries()
+    def rows():
+        if entries_to_pick is None:
+            for i, row in enumerate( in_tree ):
+                yield i, row
+        else:
+            for i in entries_to_pick:
+                in_tree.GetEntry(i)
+                yield i, in_tree
+
+    entries = in_tree.GetEntries() if entries_to_pick is None else len(entries_to_pick)
     progress= ProgressBar(
         widgets = [
             ETA(),
             Bar('>')],
         maxval = entries ).start()
 
-    for i, row in enumerate( in_tree ):
-        progress.update(i+1)
+    for n, (i, row) in enumerate( rows() ):
+        progress.update(n+1)
         etv_tuple = row2tuple(row)
         if etv_tuple in evts_to_pick:
             picked += 1
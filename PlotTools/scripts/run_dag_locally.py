@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+'''
+
+Run the jobs of a Condor DAG file on the local machine.
+
+The jobs are run with at most --workers processes at the same time,
+respecting the PARENT/CHILD dependencies.  The status is written to
+DAGFILE.status, so condor_summary.py can be used to follow the progress.
+
+usage::
+    run_dag_locally.py /nfs_scratch/user/jobid/sample/dags/dag --workers 16
+
+'''
+
+from RecoLuminosity.LumiDB import argparse
+import logging
+import sys
+
+from FinalStateAnalysis.PlotTools.LocalDAG import LocalDAGRunner
+
+log = logging.getLogger("run_dag_locally")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dagfiles', nargs='+', help='DAG file(s) to run')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of jobs to run at once (def: 4)')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='Number of times to retry a failed job,'
+                        ' if not given by RETRY in the DAG (def: 0)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print debug output')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO
+                        if args.verbose else logging.WARNING)
+
+    failed = False
+    for dagfile in args.dagfiles:
+        log.info("Running %s with %i workers", dagfile, args.workers)
+        runner = LocalDAGRunner(dagfile, args.workers, args.retries)
+        if not runner.run():
+            failed = True
+            for node, node_error in runner.dag.failing_nodes():
+                log.error("%s ==> %s: %s", dagfile, node, node_error)
+    if failed:
+        sys.exit(1)
@@ -6,6 +6,7 @@ from RecoLuminosity.LumiDB import argparse
 import ROOT
 import re
 from pdb import set_trace
+from FinalStateAnalysis.PlotTools.EventIndex import load_index
 
 ROOT.gROOT.SetBatch(True)
 
@@ -55,10 +56,21 @@ branches_to_monitor = [ i for i in branches if any(regex.match(i) for regex in r
 grouped = group(branches_to_monitor)
 monitor = dict((i,[]) for i in branches_to_monitor)
 
-for row in tree:
-    if row2tuple(row) == event: 
-        for i in branches_to_monitor:
-            monitor[i].append( getattr(row, i) )
+def matching_rows():
+    # Use the run/lumi/evt index if it exists, otherwise scan the tree
+    index = load_index(args.file, args.treepath)
+    if index is not None:
+        for entry in index.find(*event):
+            tree.GetEntry(entry)
+            yield tree
+    else:
+        for row in tree:
+            if row2tuple(row) == event:
+                yield row
+
+for row in matching_rows():
+    for i in branches_to_monitor:
+        monitor[i].append( getattr(row, i) )
 
 by_option = {}
 for gr, branches in grouped.iteritems():
@@ -7,6 +7,7 @@ import rootpy.plotting as plotting
 from rootpy import io
 from FinalStateAnalysis.MetaData.data_styles import data_styles
 from FinalStateAnalysis.PlotTools.DifferentialView import DifferentialView
+from FinalStateAnalysis.PlotTools.KeyIndex import build_key_index
 from fnmatch import fnmatch
 from optparse import OptionParser
 import logging
@@ -68,7 +69,8 @@ if __name__ == '__main__':
     logging.info("Opened file %s" % tfile_name)
     
     #get a directory and look into that
-    keys = [i.GetName() for i in tfile.Get(categories[0]).GetListOfKeys() if not fnmatch(i.GetName(), options.nuisances)]
+    key_index = build_key_index(tfile_name)
+    keys = [i for i in key_index.children(categories[0]) if not fnmatch(i, options.nuisances)]
     if options.excluded:
         keys = [ i for i in keys if not fnmatch(i, options.excluded)]
     data = [i for i in keys if i.startswith('data')][0]
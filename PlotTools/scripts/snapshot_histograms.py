@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+'''
+
+Copy the histograms of mega output files to a columnar snapshot.
+
+The snapshot can then be used by data_views/Plotter (snapshot=...)
+instead of the ROOT files, see PlotTools/python/HistSnapshot.py.
+
+usage::
+    snapshot_histograms.py results/2012/plots.snapshot results/2012/*.root
+
+'''
+
+from RecoLuminosity.LumiDB import argparse
+import logging
+import sys
+
+from FinalStateAnalysis.PlotTools.HistSnapshot import export_snapshot
+from FinalStateAnalysis.PlotTools.HistSnapshot import HISTOGRAM_CLASSES
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output', help='Output snapshot directory')
+    parser.add_argument('files', nargs='+', help='Input .root files')
+    parser.add_argument('--classes', nargs='+', default=HISTOGRAM_CLASSES,
+                        help='Class name patterns of the objects to copy'
+                        ' (def: %s)' % ' '.join(HISTOGRAM_CLASSES))
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print debug output')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO
+                        if args.verbose else logging.WARNING)
+
+    export_snapshot(args.files, args.output, args.classes)
@@ -0,0 +1,281 @@
+'''
+
+Precomputed correction bundles.
+
+Building the correctors (muon POG scale factors, PU weights, fake rates,
+...) opens many ROOT files, which is slow and costs memory in every
+worker.  build_bundle evaluates a set of correctors once into a single
+bundle file, with the arrays of all the lookup tables, and a
+CorrectionBundle loads them back without ROOT.  The arrays are memory
+mapped, so the bundle is shared by all the processes using it.  The
+scalar lookups of the bundled correctors search the mapped arrays
+directly, a bit slower than in the python copies used in memory, but
+without a private copy in each process.
+
+The file holds a JSON header (name => description of the lookup
+tables) followed by all the numbers, as one float64 array::
+
+    'FSACORR1' | header size (uint64) | header (padded) | data
+
+The correctors which can be bundled are BinnedCorrections (e.g.
+make_corrector_from_th2), PileupWeights, the muon POG correctors and
+combiners, and tabulated functors of one variable (see tabulated()).
+
+A tabulated functor only keeps its grid in the bundle.  In memory it calls
+the exact function outside of the grid, bundled it can't: by default it
+returns the value at the closest edge of the grid ('clamp'), or raises a
+ValueError ('raise'), see tabulated().  Choose the grid to cover all the
+values the analysis can ask for.
+Plain python functions (e.g. the H2Tau corrections) don't open any file,
+and are not bundled.
+
+If $megacorrections points to a bundle, load_corrector(name, factory)
+takes the corrector from it, otherwise it calls factory().
+
+'''
+
+import imp
+import json
+import logging
+import os
+import struct
+import numpy
+
+from FinalStateAnalysis.StatTools.BinnedCorrection import BinnedCorrection
+from FinalStateAnalysis.TagAndProbe.MuonPOGTables import PiecewiseLinear, \
+    MuonPOGTable
+
+log = logging.getLogger(__name__)
+
+MAGIC = 'FSACORR1'
+_SIZE_FORMAT = '<Q'
+
+
+class WeightedSum(object):
+    ''' Sum of correctors with weights (for combiners which can't be folded)
+    '''
+    def __init__(self, correctors_and_weights):
+        self.correctors_and_weights = correctors_and_weights
+
+    def __call__(self, *values):
+        return sum(corrector(*values) * weight
+                   for corrector, weight in self.correctors_and_weights)
+
+    def evaluate(self, *values):
+        return sum(corrector.evaluate(*values) * weight
+                   for corrector, weight in self.correctors_and_weights)
+
+
+def tabulated(functor, xmin, xmax, npoints=1000, tolerance=None,
+              outside='clamp'):
+    ''' Tabulate a functor of one variable (see RooFunctorFromWS) so it can
+    be bundled.  Returns the functor.
+
+    [outside] is what the bundled functor does outside of [xmin, xmax]:
+    'clamp' to the value at the edge, or 'raise' a ValueError.
+    '''
+    if outside not in ('clamp', 'raise'):
+        raise ValueError("Tabulated functors can only 'clamp' or 'raise'"
+                         " outside of the grid, not %s" % outside)
+    error = functor.tabulate(xmin, xmax, npoints, tolerance)
+    functor.table.bundle_outside = outside
+    log.info("Tabulated %s in [%g, %g], estimated error %g",
+             functor, xmin, xmax, error)
+    return functor
+
+
+class _Writer(object):
+    ''' Collects the arrays of the bundle '''
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def store(self, values):
+        values = numpy.ascontiguousarray(values, dtype=numpy.float64).ravel()
+        self.chunks.append(values)
+        self.size += len(values)
+        return [self.size - len(values), len(values)]
+
+    def encode(self, obj):
+        ''' Get the JSON description of a corrector, storing its arrays '''
+        if isinstance(obj, BinnedCorrection):
+            return {
+                'type': 'binned',
+                'edges': [self.store(x) for x in obj.edges],
+                'values': self.store(obj.values),
+                'shape': list(obj.values.shape),
+                'overflow': obj.overflow,
+                'default': obj.default,
+            }
+        if isinstance(obj, PiecewiseLinear):
+            return {
+                'type': 'linear',
+                'xs': self.store(obj.xs),
+                'ys': self.store(obj.ys),
+                'outside': obj.outside,
+            }
+        if isinstance(obj, MuonPOGTable):
+            return {
+                'type': 'muon_pog',
+                'pt_thr': obj.pt_thr,
+                'pt_tables': [[upper, self.encode(table)]
+                              for upper, table in obj.pt_tables],
+                'eta_table': self.encode(obj.eta_table),
+                'abs_eta': obj.abs_eta,
+            }
+        # TabulatedFunction: the same linear interpolation inside the grid,
+        # the function itself is not available outside of it
+        if hasattr(obj, 'error_estimate') and hasattr(obj, 'y'):
+            return self.encode(PiecewiseLinear.from_sorted(
+                obj.x, obj.y, getattr(obj, 'bundle_outside', 'clamp')))
+        # PileupWeight
+        if isinstance(getattr(obj, 'weights', None), BinnedCorrection):
+            return self.encode(obj.weights)
+        # Compiled muon POG correctors and combiners, tabulated functors
+        if getattr(obj, 'table', None) is not None:
+            return self.encode(obj.table)
+        if hasattr(obj, 'correctors_and_weights'):
+            return {'type': 'sum', 'terms': [
+                [weight, self.encode(corrector)]
+                for corrector, weight in obj.correctors_and_weights]}
+        raise TypeError("Don't know how to bundle %r" % obj)
+
+    def data(self):
+        if not self.chunks:
+            return numpy.zeros(0)
+        return numpy.concatenate(self.chunks)
+
+
+def build_bundle(correctors, output):
+    ''' Write the bundle of [correctors] to [output]
+
+    [correctors] is a dict mapping name => corrector, or a function
+    building it.
+    '''
+    writer = _Writer()
+    header = {}
+    for name in sorted(correctors):
+        corrector = correctors[name]
+        if not hasattr(corrector, 'evaluate') and callable(corrector):
+            log.info("Building %s", name)
+            corrector = corrector()
+        header[name] = writer.encode(corrector)
+    data = writer.data().astype('<f8')
+    text = json.dumps(header, sort_keys=True)
+    # Align the data
+    text += ' ' * (-(len(MAGIC) + struct.calcsize(_SIZE_FORMAT) +
+                     len(text)) % 8)
+    tmp_file = '%s.%i.tmp' % (output, os.getpid())
+    with open(tmp_file, 'wb') as bundle:
+        bundle.write(MAGIC)
+        bundle.write(struct.pack(_SIZE_FORMAT, len(text)))
+        bundle.write(text)
+        data.tofile(bundle)
+    os.rename(tmp_file, output)
+    log.info("Wrote %i correctors (%0.1f kB) to %s",
+             len(header), data.nbytes / 1e3, output)
+    return output
+
+
+class CorrectionBundle(object):
+    ''' Read access to a bundle file.  Get the correctors with bundle[name]
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as bundle:
+            magic = bundle.read(len(MAGIC))
+            if magic != MAGIC:
+                raise IOError("%s is not a correction bundle" % path)
+            size, = struct.unpack(
+                _SIZE_FORMAT, bundle.read(struct.calcsize(_SIZE_FORMAT)))
+            self.header = dict((str(name), entry) for name, entry in
+                               json.loads(bundle.read(size)).iteritems())
+        offset = len(MAGIC) + struct.calcsize(_SIZE_FORMAT) + size
+        if os.path.getsize(path) > offset:
+            self.data = numpy.memmap(path, dtype='<f8', mode='r',
+                                     offset=offset)
+        else:
+            self.data = numpy.zeros(0)
+        self.correctors = {}
+
+    def names(self):
+        return sorted(self.header.keys())
+
+    def __contains__(self, name):
+        return name in self.header
+
+    def __getitem__(self, name):
+        if name not in self.correctors:
+            if name not in self.header:
+                raise KeyError("Bundle %s has no corrector %s" %
+                               (self.path, name))
+            self.correctors[name] = self.decode(self.header[name])
+        return self.correctors[name]
+
+    def array(self, location):
+        offset, size = location
+        return self.data[offset:offset + size]
+
+    def decode(self, entry):
+        ''' Build a corrector from its JSON description '''
+        kind = entry['type']
+        if kind == 'binned':
+            return BinnedCorrection(
+                [self.array(x) for x in entry['edges']],
+                self.array(entry['values']).reshape(entry['shape']),
+                overflow=str(entry['overflow']), default=entry['default'])
+        if kind == 'linear':
+            return PiecewiseLinear.from_sorted(
+                self.array(entry['xs']), self.array(entry['ys']),
+                str(entry.get('outside', 'extrapolate')))
+        if kind == 'muon_pog':
+            return MuonPOGTable(
+                entry['pt_thr'],
+                [(upper, self.decode(table))
+                 for upper, table in entry['pt_tables']],
+                self.decode(entry['eta_table']), entry['abs_eta'])
+        if kind == 'sum':
+            return WeightedSum([(self.decode(term), weight)
+                                for weight, term in entry['terms']])
+        raise ValueError("Unknown corrector type %s in bundle %s" %
+                         (kind, self.path))
+
+
+def load_definitions(filename):
+    ''' Get the [correctors] dict defined in a python file '''
+    module = imp.load_source(
+        os.path.splitext(os.path.basename(filename))[0], filename)
+    return module.correctors
+
+
+def default_bundle_file():
+    ''' Get the bundle file from the environment '''
+    return os.environ.get('megacorrections', None)
+
+_default_bundle = None
+
+
+def default_bundle():
+    ''' The bundle given by $megacorrections (None if not set)
+
+    It is loaded once per process, load it before forking the workers to
+    share it.
+    '''
+    global _default_bundle
+    path = default_bundle_file()
+    if path is None:
+        return None
+    if _default_bundle is None or _default_bundle.path != path:
+        _default_bundle = CorrectionBundle(path)
+    return _default_bundle
+
+
+def load_corrector(name, factory):
+    ''' Get corrector [name] from the default bundle, or build it '''
+    bundle = default_bundle()
+    if bundle is not None and name in bundle:
+        return bundle[name]
+    if bundle is not None:
+        log.warning("Corrector %s is not in bundle %s, building it",
+                    name, bundle.path)
+    return factory()
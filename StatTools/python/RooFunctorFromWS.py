@@ -4,7 +4,11 @@ RooFunctorFromWS
 
 Builds a functor from a function in a RooWorkspace.
 
-This could be improved with cython.
+Each call goes through PyROOT, which is slow if the functor is called many
+times per event.  The functors of one variable can be tabulated: the
+function is sampled once on a grid, and the calls are answered by linear
+interpolation (see TabulatedFunction).  All the functors also have an
+evaluate() method which computes many values at once.
 
 Author: Evan K. Friis, UW Madison
 
@@ -16,19 +20,128 @@ Author: Evan K. Friis, UW Madison
 '0.0244'
 >>> '%0.4f' % functor(140)
 '0.0138'
+>>> ['%0.4f' % x for x in functor.evaluate([60, 140])]
+['0.0244', '0.0138']
+>>> functor.tabulate(0, 200, 2001) < 1e-5
+True
+>>> '%0.4f' % functor(140)
+'0.0138'
 
 '''
 
 from FinalStateAnalysis.Utilities.rootbindings import ROOT
 import array
+import numpy
 from pdb import set_trace
-from FinalStateAnalysis.PlotTools.decorators import memo_last
+from FinalStateAnalysis.StatTools.BinnedCorrection import BinnedCorrection
 
 #ROOT.gSystem.Load("libFinalStateAnalysisStatTools")
 
 TMVA_tools = ROOT.TMVA.Tools.Instance()
 
-class RooFunctorFromWS(ROOT.RooFunctor):
+class TabulatedFunction(object):
+    ''' Linear interpolation of a function of one variable on a grid
+
+    The function is sampled at [npoints] equidistant points between xmin
+    and xmax.  Outside of this range the function itself is called.
+
+    error_estimate is an estimate of the interpolation error, not a bound:
+    the largest difference between the interpolation and the function at
+    the midpoints of the grid.  This is where the error of a linear
+    interpolation is largest if the curvature does not change sign within
+    a grid step, but features narrower than a step are missed.  If
+    [tolerance] is given, a ValueError is raised if error_estimate is
+    larger.
+
+    >>> import math
+    >>> table = TabulatedFunction(math.exp, 0, 1, 101)
+    >>> '%0.5f' % table(0.5)
+    '1.64872'
+    >>> table.error_estimate < 1e-4
+    True
+    >>> ['%0.3f' % x for x in table.evaluate([0, 0.25, 2])]
+    ['1.000', '1.284', '7.389']
+    >>> table = TabulatedFunction(math.exp, 0, 1, 11, tolerance=1e-6)
+    Traceback (most recent call last):
+        ...
+    ValueError: Estimated interpolation error 0.00323281 is larger than the tolerance 1e-06, use more points
+    '''
+    def __init__(self, function, xmin, xmax, npoints=1000, tolerance=None):
+        if npoints < 2 or xmax <= xmin:
+            raise ValueError("Need at least 2 points in a non-empty range")
+        self.function = function
+        self.xmin = float(xmin)
+        self.xmax = float(xmax)
+        self.npoints = npoints
+        self.step = (self.xmax - self.xmin) / (npoints - 1)
+        self.x = numpy.linspace(self.xmin, self.xmax, npoints)
+        self.y = numpy.array([function(x) for x in self.x], dtype=float)
+        # Python list, faster for the scalar lookups
+        self.values = self.y.tolist()
+        midpoints = 0.5 * (self.x[1:] + self.x[:-1])
+        exact = numpy.array([function(x) for x in midpoints], dtype=float)
+        self.error_estimate = float(
+            numpy.abs(numpy.interp(midpoints, self.x, self.y) - exact).max())
+        if tolerance is not None and self.error_estimate > tolerance:
+            raise ValueError(
+                "Estimated interpolation error %g is larger than the"
+                " tolerance %g, use more points" %
+                (self.error_estimate, tolerance))
+
+    def __call__(self, x):
+        if not self.xmin <= x <= self.xmax:
+            return self.function(x)
+        position = (x - self.xmin) / self.step
+        i = min(int(position), self.npoints - 2)
+        low = self.values[i]
+        return low + (position - i) * (self.values[i + 1] - low)
+
+    def evaluate(self, xs):
+        ''' Get the values at an array of points '''
+        xs = numpy.asarray(xs, dtype=float)
+        output = numpy.interp(xs, self.x, self.y)
+        outside = (xs < self.xmin) | (xs > self.xmax)
+        if outside.any():
+            output[outside] = [self.function(x) for x in xs[outside]]
+        return output
+
+
+def evaluate_each(function, xs):
+    ''' Call function on each of an array of points '''
+    xs = numpy.asarray(xs, dtype=float)
+    return numpy.fromiter((function(x) for x in xs.flat), dtype=float,
+                          count=xs.size).reshape(xs.shape)
+
+
+class TabulatedFunctor(object):
+    ''' Adds the evaluate() and tabulate() methods to a functor
+
+    The functor must implement exact(x).
+    '''
+    table = None
+
+    def __call__(self, x):
+        if self.table is not None:
+            return self.table(x)
+        return self.exact(x)
+
+    def evaluate(self, xs):
+        ''' Get the values at an array of points '''
+        if self.table is not None:
+            return self.table.evaluate(xs)
+        return evaluate_each(self.exact, xs)
+
+    def tabulate(self, xmin, xmax, npoints=1000, tolerance=None):
+        ''' Answer the calls by interpolating in a TabulatedFunction
+
+        Returns the estimated interpolation error (see TabulatedFunction).
+        '''
+        self.table = TabulatedFunction(self.exact, xmin, xmax, npoints,
+                                       tolerance)
+        return self.table.error_estimate
+
+
+class RooFunctorFromWS(TabulatedFunctor, ROOT.RooFunctor):
     def __init__(self, workspace, functionname, var='x'):
         # Get the RooFormulaVar
         self.function = workspace.function(functionname)
@@ -37,17 +150,28 @@ class RooFunctorFromWS(ROOT.RooFunctor):
         self.x = self.function.getParameter(var) if hasattr(self.function, 'getParameter') else self.function.getVariables().find(var)
         self.x.setRange(0, 1e99)
 
-    def __call__(self, x):
+    def exact(self, x):
         self.x.setVal(x)
         return self.function.getVal()
 
-class FunctorFromTF1(object):
+    def evaluate(self, xs):
+        if self.table is not None:
+            return self.table.evaluate(xs)
+        # Avoid the attribute lookups for each point
+        setVal = self.x.setVal
+        getVal = self.function.getVal
+        def _f(x):
+            setVal(x)
+            return getVal()
+        return evaluate_each(_f, xs)
+
+class FunctorFromTF1(TabulatedFunctor):
     def __init__(self, tfile_name, path):
         # Get the RooFormulaVar
         self.tfile    = ROOT.TFile.Open(tfile_name)
         self.function = self.tfile.Get(path)
 
-    def __call__(self, x):
+    def exact(self, x):
         return self.function.Eval(x)
 
 class MultiFunctorFromTF1(object):
@@ -57,52 +181,150 @@ class MultiFunctorFromTF1(object):
         self.fcns_and_borders = []
         for path, borders in paths_and_borders:
             self.fcns_and_borders.append(
-                (self.tfile.Get(path),
+                (self.tfile.Get(path).Eval,
                 borders)
                 )
 
     def __call__(self, x, y):
         for fcn, border in self.fcns_and_borders:
             if border[0] <= y < border[1]:
-                return fcn.Eval(x)
+                return fcn(x)
         raise ValueError("MultiFunctorFromTF1: y range aoutside boundaries!")
 
+    def evaluate(self, xs, ys):
+        ''' Get the values at arrays of x and y points '''
+        xs = numpy.asarray(xs, dtype=float)
+        ys = numpy.asarray(ys, dtype=float)
+        output = numpy.empty(xs.shape)
+        done = numpy.zeros(xs.shape, dtype=bool)
+        for fcn, border in self.fcns_and_borders:
+            selected = (border[0] <= ys) & (ys < border[1]) & ~done
+            if selected.any():
+                if isinstance(fcn, TabulatedFunction):
+                    output[selected] = fcn.evaluate(xs[selected])
+                else:
+                    output[selected] = evaluate_each(fcn, xs[selected])
+                done |= selected
+        if not done.all():
+            raise ValueError("MultiFunctorFromTF1: y range aoutside boundaries!")
+        return output
+
+    def tabulate(self, xmin, xmax, npoints=1000, tolerance=None):
+        ''' Tabulate the function of each y range in x, see TabulatedFunctor
+
+        Returns the largest estimated interpolation error.
+        '''
+        tabulated = []
+        for fcn, border in self.fcns_and_borders:
+            if isinstance(fcn, TabulatedFunction):
+                fcn = fcn.function
+            tabulated.append((TabulatedFunction(fcn, xmin, xmax, npoints,
+                                                tolerance), border))
+        self.fcns_and_borders = tabulated
+        return max(x[0].error_estimate for x in tabulated)
+
 class FunctorFromMVA(object):
+    ''' Evaluates a TMVA method booked from an xml file
+
+    Call it with the variables as keywords (checked against the booked
+    ones), or use the positional fast path evaluate(*values), with the
+    values in the order of [variables].  evaluate_many(*columns) computes
+    a whole array of events.
+
+    The reader reads the input variables from [buffers] (one array('f')
+    per variable) if given, so several readers can share them.
+    '''
     def __init__(self, name, xml_filename, *variables, **kwargs):
         self.reader    = ROOT.TMVA.Reader( "!Color:Silent=%s:Verbose=%s" % (kwargs.get('silent','T'), kwargs.get('verbose','F')))
         self.var_map   = {}
         self.name      = name
         self.variables = variables
+        self.variable_set = frozenset(variables)
         self.xml_filename = xml_filename
-        for var in variables:
-            self.var_map[var] = array.array('f',[0]) 
-            self.reader.AddVariable(var, self.var_map[var])
+        self.buffers   = kwargs.get('buffers') or [
+            array.array('f',[0]) for var in variables]
+        for var, buffer in zip(variables, self.buffers):
+            self.var_map[var] = buffer
+            self.reader.AddVariable(var, buffer)
         self.reader.BookMVA(name, xml_filename)
+        self._last = (None, None)
 
     def evaluate_(self): #so I can profile the time needed
         return self.reader.EvaluateMVA(self.name)
 
-    @memo_last
-    def __call__(self, **kvars):
+    def evaluate(self, *values):
+        ''' Evaluate the MVA for values in the order of self.variables
+
+        No checks are done.  The last result is cached.
+        '''
+        last_values, last_result = self._last
+        if values == last_values:
+            return last_result
+        for buffer, value in zip(self.buffers, values):
+            buffer[0] = value
+        result = self.reader.EvaluateMVA(self.name)
+        self._last = (values, result)
+        return result
+
+    def evaluate_many(self, *columns):
+        ''' Evaluate the MVA for arrays of values, one per variable
+
+        Returns a numpy array with the MVA output of each event.
+        '''
+        return evaluate_readers([(self.reader.EvaluateMVA, self.name, 1.)],
+                                self.buffers, columns)
+
+    def check_variables(self, kvars):
         #kvars enforces that we use the proper vars
-        if not ( 
-                 all(name in self.variables for name in kvars.keys()) and \
-                 all(name in kvars.keys() for name in self.variables)
-                ):
+        if len(kvars) != len(self.variables) or \
+           not self.variable_set.issuperset(kvars):
             raise Exception("Wrong variable names. Available variables: %s" % self.variables.__repr__())
-        for name, val in kvars.iteritems():
-            self.var_map[name][0] = val
-        retval = self.evaluate_() #reader.EvaluateMVA(self.name)
-        #if retval == 1:
-        #    print "returning 1 in %s, kvars: %s" % (self.xml_filename, kvars.items()) 
-        return retval
+
+    def __call__(self, **kvars):
+        self.check_variables(kvars)
+        return self.evaluate(*[kvars[name] for name in self.variables])
+
+
+def evaluate_readers(readers, buffers, columns):
+    ''' Sum of weight*EvaluateMVA(name) of readers sharing the [buffers]
+
+    [readers] is a list of (EvaluateMVA, name, weight), and [columns] one
+    array of values for each buffer.  Consecutive identical events (e.g.
+    the rows of an ntuple sharing the same object) are only evaluated
+    once.
+    '''
+    columns = [numpy.asarray(column, dtype=numpy.float32).tolist()
+               for column in columns]
+    if len(columns) != len(buffers):
+        raise ValueError("Need %i columns, got %i" %
+                         (len(buffers), len(columns)))
+    output = numpy.empty(len(columns[0]) if columns else 0)
+    last_row = None
+    result = None
+    for i, row in enumerate(zip(*columns)):
+        if row != last_row:
+            for buffer, value in zip(buffers, row):
+                buffer[0] = value
+            result = 0.
+            for evaluate, name, weight in readers:
+                result += weight * evaluate(name)
+            last_row = row
+        output[i] = result
+    return output
 
 
 class MultiFunctorFromMVA(object):
-    '''Phil's diboson subtraction implementation'''
+    '''Phil's diboson subtraction implementation
+
+    All the readers share the same input buffers, so the inputs of an
+    event are only set once.
+    '''
     def __init__(self, name, data_and_lumi, mcs_and_lumis, *variables, **kwargs):
         phase_space = kwargs.get('phase_space','')
         print 'phase_space: %s' % phase_space
+        self.variables = variables
+        self.buffers = [array.array('f',[0]) for var in variables]
+        kwargs['buffers'] = self.buffers
         self.functors_and_weights = []
         data_xml, data_lumi = data_and_lumi
         self.functors_and_weights.append(
@@ -128,12 +350,33 @@ class MultiFunctorFromMVA(object):
                 (FunctorFromMVA('_'.join([name, xml]), xml, *variables, **kwargs),
                  weight)
                 )
+        self.readers = [(functor.reader.EvaluateMVA, functor.name, weight)
+                        for functor, weight in self.functors_and_weights]
+        self._last = (None, None)
+
+    def evaluate(self, *values):
+        ''' Evaluate for values in the order of self.variables
+
+        No checks are done.  The last result is cached.
+        '''
+        last_values, last_result = self._last
+        if values == last_values:
+            return last_result
+        for buffer, value in zip(self.buffers, values):
+            buffer[0] = value
+        result = 0.
+        for evaluate, name, weight in self.readers:
+            result += weight * evaluate(name)
+        self._last = (values, result)
+        return result
+
+    def evaluate_many(self, *columns):
+        ''' Evaluate for arrays of values, one per variable '''
+        return evaluate_readers(self.readers, self.buffers, columns)
 
-    @memo_last
     def __call__(self, **kvars):
-        return sum(
-            weight*functor(**kvars) for functor, weight in self.functors_and_weights
-            )
+        self.functors_and_weights[0][0].check_variables(kvars)
+        return self.evaluate(*[kvars[name] for name in self.variables])
 
 
 def build_roofunctor(filename, wsname, functionname, var='x'):
@@ -145,26 +388,22 @@ def build_roofunctor(filename, wsname, functionname, var='x'):
     return RooFunctorFromWS(ws, functionname, var)
 
 def make_corrector_from_th2(filename, path):
+    ''' Build a (x, y) => bin content lookup from a TH2
+
+    Values outside of the histogram use the first/last bin, and empty bins
+    return 10**-8.
+    '''
     tfile = ROOT.TFile.Open(filename)
     if not tfile:
         raise IOError("Can't open file: %s" % filename)
-    hist  = tfile.Get(path).Clone()
-    #print hist
-    binsx = hist.GetNbinsX()
-    binsy = hist.GetNbinsY()
-    def refFun(xval,yval):
-        #print hist
-        xbin = hist.GetXaxis().FindFixBin(xval) #Faster than FindBin
-        xbin = (xbin if xbin <= binsx else binsx ) if xbin >= 1 else 1 #Compute underflow and overflow as first and last bin
-        ybin = hist.GetYaxis().FindFixBin(yval)
-        ybin = (ybin if ybin <= binsy else binsy ) if ybin >= 1 else 1 #Compute underflow and overflow as first and last bin
-        prob = hist.GetBinContent(xbin,ybin)
-        if prob:
-            return prob
-        else:
-            return 10**-8
-           # raise ZeroDivisionError(" catched trying to return weight for (%.3f,%.3f) ==> (%i,%i) bin out of (%i,%i). Prob: %.3f. Hist: %s : %s. " % (xval, yval, xbin, ybin, binsx, binsy , prob, filename, path))
-    return refFun
+    hist = tfile.Get(path)
+    if not hist:
+        raise IOError("Can't get histogram: %s from file: %s" %
+                      (path, filename))
+    corrector = BinnedCorrection.from_hist(hist, overflow='clamp',
+                                           zero_value=10**-8)
+    tfile.Close()
+    return corrector
 
 def build_uncorr_2Droofunctor(functor_x, functor_y, filename, num='numerator', den='denominator'):
     ''' Build a functor from a filename '''
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+'''
+
+Evaluate a set of correctors into a correction bundle file.
+
+The correctors are declared in a python file, which defines a dict
+[correctors] mapping name => corrector, or a function building it::
+
+    from FinalStateAnalysis.StatTools.CorrectionBundle import tabulated
+    from FinalStateAnalysis.StatTools.RooFunctorFromWS import \\
+        build_roofunctor, make_corrector_from_th2
+    import FinalStateAnalysis.TagAndProbe.MuonPOGCorrections as MuonPOG
+    from FinalStateAnalysis.TagAndProbe.PileupWeight import PileupWeight
+
+    correctors = {
+        'muon_id': MuonPOG.make_muon_pog_PFTight_2012,
+        'pu_2012': lambda: PileupWeight('S10', 'allData_2012.root'),
+        'mu_fakerate': lambda: tabulated(build_roofunctor(
+            'mu_fakerate.root', 'fit_efficiency', 'efficiency'), 0, 200),
+        'tau_fakerate_2d': lambda: make_corrector_from_th2(
+            'tau_fakerate.root', 'efficiency'),
+    }
+
+The workers then get them with CorrectionBundle.load_corrector(name,
+factory), with $megacorrections pointing to the bundle.
+
+usage::
+    build_correction_bundle.py my_correctors.py corrections.fsac
+
+'''
+
+from RecoLuminosity.LumiDB import argparse
+import logging
+import sys
+
+from FinalStateAnalysis.StatTools.CorrectionBundle import build_bundle, \
+    load_definitions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('definitions',
+                        help='Python file defining the [correctors] dict')
+    parser.add_argument('output', help='Output bundle file')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='Only bundle these correctors')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Print debug output')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO
+                        if args.verbose else logging.WARNING)
+
+    correctors = load_definitions(args.definitions)
+    if args.only:
+        missing = [x for x in args.only if x not in correctors]
+        if missing:
+            sys.stderr.write("Unknown correctors: %s\n" % ' '.join(missing))
+            sys.exit(1)
+        correctors = dict((x, correctors[x]) for x in args.only)
+
+    build_bundle(correctors, args.output)
@@ -224,7 +224,7 @@ if args.makePlots:
     for i, row in enumerate(training_NTuple):
         progress.update(i+1)
         var_d  = dict([(v, getattr(row, v)) for v in args.variables])
-        mva    = functor(**var_d)
+        mva    = functor.evaluate(*[var_d[v] for v in args.variables])
         weight = row.weight
         cut    = bool( getattr(row, args.cut) )
         if weight > 0:
@@ -0,0 +1,94 @@
+'''
+
+Round trip test of the correction bundles.
+
+Builds a bundle with a binned correction, a muon POG table and a tabulated
+functor, loads it back, and compares the values, including outside of the
+tabulated grid.
+
+'''
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+from FinalStateAnalysis.StatTools.BinnedCorrection import BinnedCorrection, \
+    is_memory_mapped
+from FinalStateAnalysis.StatTools.CorrectionBundle import build_bundle, \
+    CorrectionBundle, tabulated
+from FinalStateAnalysis.StatTools.RooFunctorFromWS import TabulatedFunctor
+from FinalStateAnalysis.TagAndProbe.MuonPOGTables import PiecewiseLinear, \
+    MuonPOGTable
+
+
+class FakeRate(TabulatedFunctor):
+    def exact(self, x):
+        return math.exp(-x / 50.)
+
+
+class TestCorrectionBundle(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'corrections.bundle')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        binned = BinnedCorrection([[0, 1, 2], [0, 10, 20, 30]],
+                                  numpy.arange(20.).reshape(4, 5))
+        muon = MuonPOGTable(
+            20, [(1.2, PiecewiseLinear([5, 10, 15], [1, 2, 3]))],
+            PiecewiseLinear([-2, 0, 2], [1, 1.1, 1.2]))
+        build_bundle({'binned': binned, 'muon': muon}, self.path)
+        bundle = CorrectionBundle(self.path)
+        self.assertEqual(bundle.names(), ['binned', 'muon'])
+        xs = [-1, 0.5, 1.5, 3]
+        ys = [-5, 5, 25, 35]
+        self.assertEqual(list(bundle['binned'].evaluate(xs, ys)),
+                         list(binned.evaluate(xs, ys)))
+        for pt, eta in [(7, 0.5), (30, -1), (30, 3)]:
+            self.assertEqual(bundle['muon'](pt, eta), muon(pt, eta))
+        for x, y in zip(xs, ys):
+            self.assertEqual(bundle['binned'](x, y), binned(x, y))
+
+    def test_scalar_lookups_share_the_bundle(self):
+        binned = BinnedCorrection([[0, 1, 2]], [0., 1., 2., 3.])
+        linear = PiecewiseLinear([5, 10, 15], [1, 2, 3])
+        build_bundle({'binned': binned, 'linear': linear}, self.path)
+        bundle = CorrectionBundle(self.path)
+        self.assertEqual(bundle['binned'](1.5), 2.)
+        self.assertEqual(bundle['linear'](7.5), 1.5)
+        edges, values = bundle['binned']._lookup
+        self.assertTrue(is_memory_mapped(values))
+        self.assertTrue(all(is_memory_mapped(x) for x in edges))
+        self.assertTrue(all(is_memory_mapped(x)
+                            for x in bundle['linear']._points))
+
+    def test_tabulated_outside_clamps(self):
+        fake_rate = tabulated(FakeRate(), 0, 200, 2001)
+        build_bundle({'fake_rate': fake_rate}, self.path)
+        bundled = CorrectionBundle(self.path)['fake_rate']
+        self.assertAlmostEqual(bundled(100), fake_rate(100), 6)
+        # Outside of the grid, the value at the closest edge
+        for x in (250, 400):
+            self.assertEqual(bundled(x), fake_rate.table(200))
+            self.assertTrue(bundled(x) > 0)
+        self.assertEqual(bundled(-10), fake_rate.table(0))
+        self.assertEqual(list(bundled.evaluate([-10, 250, 400])),
+                         [fake_rate.table(0), fake_rate.table(200),
+                          fake_rate.table(200)])
+
+    def test_tabulated_outside_raises(self):
+        fake_rate = tabulated(FakeRate(), 0, 200, 2001, outside='raise')
+        build_bundle({'fake_rate': fake_rate}, self.path)
+        bundled = CorrectionBundle(self.path)['fake_rate']
+        self.assertAlmostEqual(bundled(100), fake_rate(100), 6)
+        self.assertRaises(ValueError, bundled, 250)
+        self.assertRaises(ValueError, bundled.evaluate, [100, 250])
+
+
+if __name__ == '__main__':
+    unittest.main()
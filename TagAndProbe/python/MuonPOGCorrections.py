@@ -33,11 +33,20 @@ They are available as python functions (taking the eta of both muons) as::
 muon_pog_Mu17Mu8_eta_eta_2011(eta1, eta2)
 muon_pog_Mu13Mu8_eta_eta_2011(eta1, eta2)
 
+The TGraphAsymmErrors of the correctors are read once, into numpy
+piecewise-linear tables (see MuonPOGTables) which give the same results as
+TGraph::Eval.  The
+correctors also have an evaluate(pts, etas) method for arrays of muons, and
+the combiners fold the lumi weights of their correctors into a single set
+of tables when the correctors have the same layout.
+
 '''
 
 import os
 import re
 from FinalStateAnalysis.Utilities.rootbindings import ROOT
+from FinalStateAnalysis.TagAndProbe.MuonPOGTables import PiecewiseLinear, \
+    MuonPOGTable
 
 _DATA_DIR = os.path.join(os.environ['CMSSW_BASE'], 'src',
                          "FinalStateAnalysis", "TagAndProbe", "data")
@@ -203,7 +212,27 @@ def make_muon_pog_IsoMu24eta2p1_2012():
     )
 
 
-class MuonPOGCorrection(object):
+class CompiledMuonPOGCorrection(object):
+    ''' Reads the graphs of a corrector, and evaluates its MuonPOGTable '''
+    def load_graph_eval_func(self, name):
+        ''' Load a graph with a given name form the file, as a table '''
+        key = self.file.GetKey(name)
+        if not key:
+            raise IOError("Object with name %s d.n.e. in file %s" %
+                          (name, self.filename))
+        obj = key.ReadObj()
+        if not obj:
+            raise IOError("Object with key name %s d.n.e. can't be read" % name)
+        return PiecewiseLinear.from_graph(obj)
+
+    def __call__(self, pt, eta):
+        return self.table(pt, eta)
+
+    def evaluate(self, pts, etas):
+        return self.table.evaluate(pts, etas)
+
+
+class MuonPOGCorrection(CompiledMuonPOGCorrection):
     '''
 
 Muon POG corrections are generally by eta dependent for pt > 20,
@@ -217,35 +246,20 @@ and pt dependent for pt < 20, split by barrel and endcap.
         self.abs_eta = abs_eta
         self.pt_thr = pt_thr
 
-        # Map the functions to the appropriate TGraphAsymmErrors
+        # Tabulate the appropriate TGraphAsymmErrors
         self.correct_by_pt_barrel = self.load_graph_eval_func(pt_barrel)
         self.correct_by_pt_endcap = self.load_graph_eval_func(pt_endcap)
         self.correct_by_eta_pt20 = self.load_graph_eval_func(eta_pt20)
+        self.file.Close()
 
-    def load_graph_eval_func(self, name):
-        ''' Load a graph with a given name form the file '''
-        key = self.file.GetKey(name)
-        if not key:
-            raise IOError("Object with name %s d.n.e. in file %s" %
-                          (name, self.filename))
-        obj = key.ReadObj()
-        if not obj:
-            raise IOError("Object with key name %s d.n.e. can't be read" % name)
-        return obj.Eval
+        self.table = MuonPOGTable(
+            pt_thr,
+            [(1.2, self.correct_by_pt_barrel),
+             (float('inf'), self.correct_by_pt_endcap)],
+            self.correct_by_eta_pt20, abs_eta)
 
-    def __call__(self, pt, eta):
-        if pt < self.pt_thr:
-            if abs(eta) < 1.2:
-                return self.correct_by_pt_barrel(pt)
-            else:
-                return self.correct_by_pt_endcap(pt)
-        else:
-            if self.abs_eta:
-                eta = abs(eta)
-            return self.correct_by_eta_pt20(eta)
-
-
-class BetterMuonPOGCorrection(object):
+
+class BetterMuonPOGCorrection(CompiledMuonPOGCorrection):
     '''
 
 Muon POG corrections are generally by eta dependent for pt > 20,
@@ -259,36 +273,17 @@ and pt dependent for pt < 20, split by barrel and endcap. Accepts any number of
         self.abs_eta = abs_eta
         self.pt_thr = pt_thr
 
-        # Map the functions to the appropriate TGraphAsymmErrors
+        # Tabulate the appropriate TGraphAsymmErrors
         self.correct_by_pt = [(thr, self.load_graph_eval_func(graph_name)) 
                               for thr, graph_name in pt_corections]
         self.correct_by_eta= self.load_graph_eval_func(eta_correction)
+        self.file.Close()
 
-    def load_graph_eval_func(self, name):
-        ''' Load a graph with a given name form the file '''
-        key = self.file.GetKey(name)
-        if not key:
-            raise IOError("Object with name %s d.n.e. in file %s" %
-                          (name, self.filename))
-        obj = key.ReadObj()
-        if not obj:
-            raise IOError("Object with key name %s d.n.e. can't be read" % name)
-        return obj.Eval
-
-    def __call__(self, pt, eta):
-        if pt < self.pt_thr:
-            for thr, correction in self.correct_by_pt:
-                if abs(eta) < thr:
-                    return correction(pt)
-        else:
-            compute_eta = eta
-            if self.abs_eta:
-                compute_eta = abs(eta)
-            return self.correct_by_eta(compute_eta)
+        self.table = MuonPOGTable(pt_thr, self.correct_by_pt,
+                                  self.correct_by_eta, abs_eta)
 
 
-
-class MuonPOGCorrection3R(object):
+class MuonPOGCorrection3R(CompiledMuonPOGCorrection):
     '''
 
     Muon POG corrections are generally by eta dependent for pt > 20,
@@ -301,64 +296,74 @@ class MuonPOGCorrection3R(object):
         self.file = ROOT.TFile.Open(file)
         self.pt_thr  = pt_thr
 
-        # Map the functions to the appropriate TGraphAsymmErrors
+        # Tabulate the appropriate TGraphAsymmErrors
         self.correct_by_pt_barrel = self.load_graph_eval_func(pt_barrel)
         self.correct_by_pt_overlap = self.load_graph_eval_func(pt_overlap)
         self.correct_by_pt_endcap = self.load_graph_eval_func(pt_endcap)
         self.correct_by_eta_pt20 = self.load_graph_eval_func(eta_pt20)
+        self.file.Close()
 
-    def load_graph_eval_func(self, name):
-        ''' Load a graph with a given name form the file '''
-        key = self.file.GetKey(name)
-        if not key:
-            raise IOError("Object with name %s d.n.e. in file %s" %
-                          (name, self.filename))
-        obj = key.ReadObj()
-        if not obj:
-            raise IOError("Object with key name %s d.n.e. can't be read" % name)
-        return obj.Eval
+        self.table = MuonPOGTable(
+            pt_thr,
+            [(0.9, self.correct_by_pt_barrel),
+             (1.2, self.correct_by_pt_overlap),
+             (float('inf'), self.correct_by_pt_endcap)],
+            self.correct_by_eta_pt20)
 
-    def __call__(self, pt, eta):
 
-        if pt < self.pt_thr:
-            if abs(eta) < 0.9:
-                return self.correct_by_pt_barrel(pt)
-            elif abs(eta)<1.2:
-                return self.correct_by_pt_overlap(pt)
-            elif abs(eta) >= 1.2:
-                return self.correct_by_pt_endcap(pt)
-        else:
-            return self.correct_by_eta_pt20(eta)
+class MuonPOGCombiner(object):
+    '''
 
+    Lumi weighted average of correctors.  If all of them have the same
+    layout, the weights are folded into a single MuonPOGTable.
 
+    '''
+    def __init__(self, correctors_and_weights):
+        self.correctors_and_weights = correctors_and_weights
+        self.table = None
+        tables = [getattr(corrector, 'table', None)
+                  for corrector, weight in correctors_and_weights]
+        if all(table is not None for table in tables) and \
+           len(set(repr(table.layout()) for table in tables)) == 1:
+            self.table = MuonPOGTable.combine(
+                [(table, weight) for table, (corrector, weight)
+                 in zip(tables, correctors_and_weights)])
 
+    def __call__(self, pt, eta):
+        if self.table is not None:
+            return self.table(pt, eta)
+        return sum(corrector(pt, eta) * weight
+                   for corrector, weight in self.correctors_and_weights)
 
+    def evaluate(self, pts, etas):
+        if self.table is not None:
+            return self.table.evaluate(pts, etas)
+        return sum(corrector.evaluate(pts, etas) * weight
+                   for corrector, weight in self.correctors_and_weights)
 
-class MuonPOG2011Combiner(object):
+
+class MuonPOG2011Combiner(MuonPOGCombiner):
     ''' They provide 2011 A and B separate, we have to combine them '''
     def __init__(self, corrector2011A, corrector2011B):
         self.corrA = corrector2011A
         self.corrB = corrector2011B
-
-    def __call__(self, pt, eta):
         # Weighted average, by int. lumi
-        return self.corrA(pt, eta)*(2.1/4.6) + \
-                self.corrB(pt, eta)*(2.5/4.6)
+        super(MuonPOG2011Combiner, self).__init__(
+            [(self.corrA, 2.1/4.6), (self.corrB, 2.5/4.6)])
 
 
-
-class MuonPOG2012Combiner(object):
+class MuonPOG2012Combiner(MuonPOGCombiner):
     ''' They provide 2012 A, B, C, D separate, we have to combine them '''
     def __init__(self, corrector2012A, corrector2012B, corrector2012C, corrector2012D):
         self.corrA = corrector2012A
         self.corrB = corrector2012B
         self.corrC = corrector2012C
         self.corrD = corrector2012D
-
-    def __call__(self, pt, eta):
         # Weighted average, by int. lumi
-        return self.corrA(pt, eta)*(1./19.) + self.corrB(pt, eta)*(4./19.) + self.corrC(pt, eta)*(6./19.) + self.corrD(pt, eta)*(8./19.)
-                # CHECK THE NUMBERS!!! - Lumi split by ranges just a guess right now
+        # CHECK THE NUMBERS!!! - Lumi split by ranges just a guess right now
+        super(MuonPOG2012Combiner, self).__init__(
+            [(self.corrA, 1./19.), (self.corrB, 4./19.),
+             (self.corrC, 6./19.), (self.corrD, 8./19.)])
 
 
 
@@ -0,0 +1,231 @@
+'''
+
+Piecewise-linear lookup tables for the muon POG corrections.
+
+The correctors of MuonPOGCorrections are compiled into these at
+construction.  They only need numpy, so they can also be loaded from a
+correction bundle (see StatTools/python/CorrectionBundle.py) without ROOT.
+
+'''
+
+import bisect
+import numpy
+
+from FinalStateAnalysis.StatTools.BinnedCorrection import scalar_lookup
+
+OUTSIDE_POLICIES = ('extrapolate', 'clamp', 'raise')
+
+
+class PiecewiseLinear(object):
+    '''
+
+    Linear interpolation between points, identical to TGraph::Eval for
+    graphs with the points sorted in x (as the muon POG ones are): outside
+    of the points, the first/last two points are extrapolated.  If several
+    points have the same x, the first one is used.
+
+    [outside] sets what happens outside of the points:
+
+        * 'extrapolate': extrapolate the first/last two points (the default,
+          as TGraph::Eval)
+        * 'clamp': use the value of the first/last point
+        * 'raise': raise a ValueError
+
+    >>> table = PiecewiseLinear([3, 1, 2], [30, 10, 40])
+    >>> table(1.5), table(2), table(0), table(4)
+    (25.0, 40.0, -20.0, 20.0)
+    >>> table.evaluate([1.5, 2, 0, 4])
+    array([ 25.,  40., -20.,  20.])
+    >>> combined = PiecewiseLinear.combine([
+    ...     (table, 0.5), (PiecewiseLinear([0, 10], [0, 10]), 0.5)])
+    >>> combined(1.5) == 0.5 * table(1.5) + 0.5 * 1.5
+    True
+    >>> combined(20) == 0.5 * table(20) + 0.5 * 20
+    True
+    >>> clamped = PiecewiseLinear([3, 1, 2], [30, 10, 40], outside='clamp')
+    >>> clamped(1.5), clamped(0), clamped(4)
+    (25.0, 10.0, 30.0)
+    >>> clamped.evaluate([1.5, 0, 4])
+    array([25., 10., 30.])
+
+    '''
+    def __init__(self, xs, ys, outside='extrapolate'):
+        if outside not in OUTSIDE_POLICIES:
+            raise ValueError("Unknown outside policy %s, allowed: %s" %
+                             (outside, ' '.join(OUTSIDE_POLICIES)))
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        ys = numpy.asarray(ys, dtype=numpy.float64)
+        order = numpy.argsort(xs, kind='mergesort')
+        xs = xs[order]
+        ys = ys[order]
+        # Keep the first of the points with the same x
+        if len(xs) > 1:
+            keep = numpy.concatenate(([True], xs[1:] != xs[:-1]))
+            xs = xs[keep]
+            ys = ys[keep]
+        self.xs = xs
+        self.ys = ys
+        self.outside = outside
+        self._points = None
+
+    @classmethod
+    def from_sorted(cls, xs, ys, outside='extrapolate'):
+        ''' Use arrays of points already sorted in x (no copy) '''
+        if outside not in OUTSIDE_POLICIES:
+            raise ValueError("Unknown outside policy %s, allowed: %s" %
+                             (outside, ' '.join(OUTSIDE_POLICIES)))
+        output = cls.__new__(cls)
+        output.xs = xs
+        output.ys = ys
+        output.outside = outside
+        output._points = None
+        return output
+
+    @classmethod
+    def from_graph(cls, graph):
+        ''' Copy the points of a TGraph '''
+        npoints = graph.GetN()
+        columns = []
+        for buffer in (graph.GetX(), graph.GetY()):
+            if not npoints:
+                columns.append([])
+                continue
+            buffer.SetSize(npoints)
+            columns.append(numpy.frombuffer(
+                buffer, dtype=numpy.float64, count=npoints).copy())
+        return cls(*columns)
+
+    @classmethod
+    def combine(cls, tables_and_weights):
+        ''' The weighted sum of several tables
+
+        The sum of piecewise-linear functions is piecewise linear, with
+        points at the union of the points of the tables.  The tables are
+        extrapolated outside of their points.
+        '''
+        xs = numpy.unique(numpy.concatenate(
+            [table.xs for table, weight in tables_and_weights]))
+        ys = numpy.zeros(len(xs))
+        for table, weight in tables_and_weights:
+            ys += weight * table.evaluate(xs)
+        return cls(xs, ys)
+
+    def __call__(self, x):
+        if self._points is None:
+            self._points = (scalar_lookup(self.xs), scalar_lookup(self.ys))
+        xs, ys = self._points
+        npoints = len(xs)
+        if npoints < 2:
+            return float(ys[0]) if npoints else 0.
+        found = bisect.bisect_left(xs, x)
+        if found < npoints and xs[found] == x:
+            return float(ys[found])
+        if self.outside != 'extrapolate' and (found == 0 or found == npoints):
+            if self.outside == 'raise':
+                raise ValueError("%s is outside of [%s, %s]" %
+                                 (x, xs[0], xs[-1]))
+            return float(ys[0] if found == 0 else ys[-1])
+        # The neighbours of x, or the first/last two points if x is outside
+        up = min(max(found, 1), npoints - 1)
+        low = up - 1
+        # Same operations as TGraph::Eval, to get the same rounding
+        return float(
+            ys[up] + (x - xs[up]) * (ys[low] - ys[up]) / (xs[low] - xs[up]))
+
+    def evaluate(self, xs):
+        ''' Evaluate at an array of points '''
+        xs = numpy.asarray(xs, dtype=numpy.float64)
+        npoints = len(self.xs)
+        if npoints < 2:
+            return numpy.zeros(xs.shape) + (self.ys[0] if npoints else 0.)
+        found = numpy.searchsorted(self.xs, xs, side='left')
+        up = numpy.clip(found, 1, npoints - 1)
+        low = up - 1
+        up_x = self.xs[up]
+        up_y = self.ys[up]
+        output = up_y + (xs - up_x) * (self.ys[low] - up_y) / \
+            (self.xs[low] - up_x)
+        exact = (found < npoints) & \
+            (self.xs[numpy.minimum(found, npoints - 1)] == xs)
+        output[exact] = self.ys[found[exact]]
+        if self.outside != 'extrapolate':
+            below = xs < self.xs[0]
+            above = xs > self.xs[-1]
+            if self.outside == 'raise' and (below.any() or above.any()):
+                raise ValueError("%i values are outside of [%s, %s]" %
+                                 ((below | above).sum(), self.xs[0],
+                                  self.xs[-1]))
+            output[below] = self.ys[0]
+            output[above] = self.ys[-1]
+        return output
+
+
+class MuonPOGTable(object):
+    '''
+
+    Compiled muon POG correction: below [pt_thr], the pt table of the first
+    |eta| region with |eta| < upper edge is used (None if there is none),
+    above it the eta table (of |eta| if [abs_eta]).
+
+    [pt_tables] is a list of (upper |eta| edge, PiecewiseLinear).
+
+    '''
+    def __init__(self, pt_thr, pt_tables, eta_table, abs_eta=False):
+        self.pt_thr = pt_thr
+        self.pt_tables = pt_tables
+        self.eta_table = eta_table
+        self.abs_eta = abs_eta
+
+    def layout(self):
+        ''' What must match to combine tables '''
+        return (self.pt_thr, [upper for upper, table in self.pt_tables],
+                self.abs_eta)
+
+    @classmethod
+    def combine(cls, tables_and_weights):
+        ''' Fold the weighted sum of tables with the same layout '''
+        first = tables_and_weights[0][0]
+        pt_tables = []
+        for i, (upper, ignored) in enumerate(first.pt_tables):
+            pt_tables.append((upper, PiecewiseLinear.combine(
+                [(table.pt_tables[i][1], weight)
+                 for table, weight in tables_and_weights])))
+        eta_table = PiecewiseLinear.combine(
+            [(table.eta_table, weight)
+             for table, weight in tables_and_weights])
+        return cls(first.pt_thr, pt_tables, eta_table, first.abs_eta)
+
+    def __call__(self, pt, eta):
+        if pt < self.pt_thr:
+            abseta = abs(eta)
+            for upper, table in self.pt_tables:
+                if abseta < upper:
+                    return table(pt)
+            return None
+        if self.abs_eta:
+            eta = abs(eta)
+        return self.eta_table(eta)
+
+    def evaluate(self, pts, etas):
+        ''' Evaluate for arrays of muons.  NaN where __call__ gives None '''
+        pts = numpy.asarray(pts, dtype=numpy.float64)
+        etas = numpy.asarray(etas, dtype=numpy.float64)
+        output = numpy.empty(pts.shape)
+        output.fill(numpy.nan)
+        low_pt = pts < self.pt_thr
+        abseta = numpy.abs(etas)
+        todo = low_pt.copy()
+        for upper, table in self.pt_tables:
+            selected = todo & (abseta < upper)
+            if selected.any():
+                output[selected] = table.evaluate(pts[selected])
+            todo &= ~selected
+        high_pt = ~low_pt
+        if high_pt.any():
+            eta_values = abseta if self.abs_eta else etas
+            output[high_pt] = self.eta_table.evaluate(eta_values[high_pt])
+        return output
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
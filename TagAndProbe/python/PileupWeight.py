@@ -11,7 +11,10 @@ Author: Evan K. Friis, UW
 '''
 
 import array
+import numpy
 from FinalStateAnalysis.Utilities.FileInPath import FileInPath
+from FinalStateAnalysis.PlotTools.HistArrays import contents, axis_edges
+from FinalStateAnalysis.StatTools.BinnedCorrection import BinnedCorrection
 import ROOT
 
 # MC distributions (built at bottom of file)
@@ -73,17 +76,27 @@ class PileupWeight(object):
         # Normalize MC
         self.mc.Scale(1./self.mc.Integral())
 
+        # data/MC ratio in each bin (including under/overflow), 1 if the MC
+        # is empty.
+        data = contents(self.data).astype(numpy.float64)
+        mc = contents(self.mc).astype(numpy.float64)
+        ratio = numpy.ones(len(mc))
+        filled = mc != 0
+        ratio[filled] = data[filled] / mc[filled]
+        self.weights = BinnedCorrection(
+            [axis_edges(self.data.GetXaxis())], ratio, overflow='flow')
+
     def __call__(self, ntruepu):
         '''
         Get the PU weight given the true number of interactions
         '''
-        bin = self.data.FindBin(ntruepu)
-        data = self.data.GetBinContent(bin)
-        mc = self.mc.GetBinContent(bin)
-        if mc:
-            return data/mc
-        else:
-            return 1.0
+        return self.weights(ntruepu)
+
+    def evaluate(self, ntruepus):
+        '''
+        Get the PU weights of an array of true numbers of interactions
+        '''
+        return self.weights.evaluate(ntruepus)
 
 _MC_PU_DISTRIBUTIONS['S10'] = FileInPath("FinalStateAnalysis/TagAndProbe/data/MC_Summer12_PU_S10-600bins.root").full_path()
 _MC_PU_DISTRIBUTIONS['S7'] = 'fixme'
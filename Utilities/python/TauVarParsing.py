@@ -19,8 +19,8 @@ try:
 except ImportError:
     # Moved in 52X
     import Configuration.AlCa.autoCond as autoCond
-import FWCore.PythonUtilities.LumiList as LumiList
 import FWCore.ParameterSet.Types as CfgTypes
+from FinalStateAnalysis.Utilities.lumitools import LumiMask
 
 class TauVarParsing(VarParsing.VarParsing):
     '''
@@ -44,13 +44,13 @@ class TauVarParsing(VarParsing.VarParsing):
     >>> # Building the lumi mask
     >>> parse.lumiMask = "/afs/cern.ch/cms/CAF/CMSCOMM/COMM_DQM/certification/Collisions11/7TeV/Reprocessing/Cert_170249-172619_7TeV_ReReco5Aug_Collisions11_JSON_v2.txt"
     >>> parse.buildPoolSourceLumiMask()[0]
-    u'170722:110-170722:287'
+    '170722:110-170722:287'
     >>> parse.firstRun = 171282 # these values are inclusive
     >>> parse.lastRun = 171369
     >>> parse.buildPoolSourceLumiMask()[0]
-    u'171282:1-171282:12'
+    '171282:1-171282:12'
     >>> parse.buildPoolSourceLumiMask()[-1]
-    u'171369:144-171369:161'
+    '171369:144-171369:161'
 
     '''
     type_map = {
@@ -133,20 +133,13 @@ class TauVarParsing(VarParsing.VarParsing):
         jsonFile = self.lumiMask
         if not os.path.exists(jsonFile):
             raise IOError("Lumi mask file %s does not exist!" % jsonFile)
-        lumiList = LumiList.LumiList(filename = jsonFile)
-        runs = lumiList.getRuns()
-        bad_runs = []
-        for run in runs:
-            is_good = True
-            if int(run) < self.firstRun:
-                is_good = False
-            if self.lastRun > -1 and int(run) > self.lastRun:
-                is_good = False
-            if not is_good:
-                bad_runs.append(run)
-        lumiList.removeRuns(bad_runs)
+        lastRun = None
+        if self.lastRun > -1:
+            lastRun = self.lastRun
+        lumiMask = LumiMask.from_file(jsonFile).select_runs(
+            self.firstRun, lastRun)
         lumisToProcess = CfgTypes.untracked(CfgTypes.VLuminosityBlockRange())
-        lumisToProcess.extend(lumiList.getCMSSWString().split(','))
+        lumisToProcess.extend(lumiMask.cmssw_ranges())
         return lumisToProcess
 
     # Override the default argument parse command, with better error reporting
@@ -0,0 +1,289 @@
+'''
+
+Set operations on large lists of (run, lumi, evt)s.
+
+The events are packed into single 64-bit keys::
+
+    key = run << 46 | lumi << 32 | evt
+
+and an event list is a sorted numpy array of unique keys, so sorting the
+keys sorts the events by run, lumi and event number.  This takes 8 bytes
+per event, instead of the hundreds a python set of tuples needs.  The
+lists are parsed from text in chunks, and the set operations use binary
+searches in the sorted arrays.
+
+Lists of (run, evt)s without lumis are stored with lumi 0, which is never
+a real lumi.  Use without_lumis to compare them with full lists.
+
+Example:
+>>> a = from_events([(1, 1, 10), (1, 2, 20), (2, 1, 5), (1, 1, 10)])
+>>> b = from_events([(1, 2, 20), (2, 1, 6)])
+>>> len(a)
+3
+>>> to_events(intersection(a, b))
+[(1, 2, 20)]
+>>> to_events(difference(a, b))
+[(1, 1, 10), (2, 1, 5)]
+>>> len(union(a, b))
+4
+>>> regions = overlap([a, b])
+>>> sorted((names, len(keys)) for names, keys in regions.iteritems())
+[((0,), 2), ((0, 1), 1), ((1,), 1)]
+
+'''
+
+import json
+import logging
+import re
+import numpy
+
+log = logging.getLogger(__name__)
+
+_RUN_BITS = 18
+_LUMI_BITS = 14
+_EVT_BITS = 32
+
+# Numbers in a line of text
+_numbers = re.compile(r'\d+')
+
+# Number of events parsed before they are packed
+_CHUNK_SIZE = 1000000
+
+# Lumi of the events of (run, evt) lists
+NO_LUMI = 0
+
+
+def pack(runs, lumis, evts):
+    ''' Pack arrays of run, lumi and event numbers into 64-bit keys
+
+    >>> int(pack(1, 2, 3)[0]) == (1 << 46) + (2 << 32) + 3
+    True
+    '''
+    runs = numpy.atleast_1d(numpy.asarray(runs, dtype=numpy.uint64))
+    lumis = numpy.atleast_1d(numpy.asarray(lumis, dtype=numpy.uint64))
+    evts = numpy.atleast_1d(numpy.asarray(evts, dtype=numpy.uint64))
+    for values, bits, what in ((runs, _RUN_BITS, 'run'),
+                               (lumis, _LUMI_BITS, 'lumi'),
+                               (evts, _EVT_BITS, 'event')):
+        if len(values) and values.max() >= (1 << bits):
+            raise ValueError("A %s number (%i) is too large to be packed"
+                             % (what, values.max()))
+    return ((runs << numpy.uint64(_LUMI_BITS + _EVT_BITS)) |
+            (lumis << numpy.uint64(_EVT_BITS)) | evts)
+
+
+def unpack(keys):
+    ''' Unpack keys into (runs, lumis, evts) arrays '''
+    keys = numpy.asarray(keys, dtype=numpy.uint64)
+    runs = keys >> numpy.uint64(_LUMI_BITS + _EVT_BITS)
+    lumis = (keys >> numpy.uint64(_EVT_BITS)) & \
+        numpy.uint64((1 << _LUMI_BITS) - 1)
+    evts = keys & numpy.uint64((1 << _EVT_BITS) - 1)
+    return runs, lumis, evts
+
+
+def run_lumi_keys(keys):
+    ''' The sorted, unique (run, lumi)s of the events, packed '''
+    return numpy.unique(
+        numpy.asarray(keys, dtype=numpy.uint64) >> numpy.uint64(_EVT_BITS))
+
+
+def unpack_run_lumis(run_lumis):
+    ''' Unpack the output of run_lumi_keys into a list of (run, lumi)s '''
+    runs = run_lumis >> numpy.uint64(_LUMI_BITS)
+    lumis = run_lumis & numpy.uint64((1 << _LUMI_BITS) - 1)
+    return zip(runs.astype(numpy.int64).tolist(),
+               lumis.astype(numpy.int64).tolist())
+
+
+def sorted_unique(keys):
+    ''' Sort an array of keys, and remove the duplicates '''
+    keys = numpy.array(keys, dtype=numpy.uint64)
+    keys.sort(kind='mergesort')
+    if len(keys) < 2:
+        return keys
+    keep = numpy.empty(len(keys), dtype=bool)
+    keep[0] = True
+    numpy.not_equal(keys[1:], keys[:-1], out=keep[1:])
+    return keys[keep]
+
+
+def from_events(events):
+    ''' Build an event list from an iterable of (run, lumi, evt)s '''
+    output = []
+    chunk = []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) >= _CHUNK_SIZE:
+            output.append(sorted_unique(pack(*zip(*chunk))))
+            chunk = []
+    if chunk:
+        output.append(sorted_unique(pack(*zip(*chunk))))
+    return union(*output)
+
+
+def to_events(keys):
+    ''' Convert an event list to a list of (run, lumi, evt) tuples '''
+    return zip(*[x.astype(numpy.int64).tolist() for x in unpack(keys)])
+
+
+def parse_line(line):
+    ''' Get the (run, lumi, evt) in a line of text
+
+    Any non-numeric characters separate the fields, and the last three
+    numbers are used.  A line with only two numbers is a (run, evt), and
+    gets lumi NO_LUMI.  Returns None if there are less than two.
+
+    >>> parse_line('194050:1123:1234567')
+    (194050, 1123, 1234567)
+    >>> parse_line('*   12 * 194050 * 1123 * 1234567 *')
+    (194050, 1123, 1234567)
+    >>> parse_line('194050:1234567')
+    (194050, 0, 1234567)
+    >>> parse_line('*  Row  * run * lumi * evt *') is None
+    True
+    '''
+    fields = _numbers.findall(line)
+    if len(fields) < 2:
+        return None
+    if len(fields) == 2:
+        return int(fields[0]), NO_LUMI, int(fields[1])
+    return tuple(int(x) for x in fields[-3:])
+
+
+def read_text(stream, strict=False):
+    ''' Read an event list from a text stream, one event per line
+
+    Lines without numbers (e.g. headers) are skipped.  Other lines which
+    aren't a (run, lumi, evt) or (run, evt) are skipped with a warning.
+    If [strict], the lines must be (run, lumi, evt)s, otherwise a
+    ValueError is raised.
+    '''
+    def events():
+        skipped = 0
+        for i, line in enumerate(stream):
+            if not _numbers.search(line):
+                continue
+            event = parse_line(line)
+            if strict and (event is None or event[1] == NO_LUMI):
+                raise ValueError("Line %i is not a run:lumi:evt: %s"
+                                 % (i + 1, line.strip()))
+            if event is None:
+                skipped += 1
+                continue
+            yield event
+        if skipped:
+            log.warning("Skipped %i lines with a single number", skipped)
+    return from_events(events())
+
+
+def read_json(stream):
+    ''' Read an event list from a JSON list of events
+
+    The events are either [run, lumi, evt] lists or dicts with the
+    [run, lumi, evt] in 'evt', as written by the megaevents selectors.
+    '''
+    return from_events(tuple(event_info(x)) for x in json.load(stream))
+
+
+def event_info(event):
+    ''' Get the [run, lumi, evt] of a JSON event '''
+    if isinstance(event, dict):
+        return event['evt']
+    return event
+
+
+def read_file(filename):
+    ''' Read an event list from a .json or text file '''
+    with open(filename) as file:
+        if filename.endswith('.json'):
+            return read_json(file)
+        return read_text(file)
+
+
+def write_text(stream, keys, format='%i:%i:%i\n', lumis=True):
+    ''' Write an event list to a stream, one event per line
+
+    If not [lumis], (run, evt)s are written, with a two field [format].
+    '''
+    for start in xrange(0, len(keys), _CHUNK_SIZE):
+        events = to_events(keys[start:start + _CHUNK_SIZE])
+        if not lumis:
+            events = [(run, evt) for run, _, evt in events]
+        stream.writelines(format % event for event in events)
+
+
+def missing_lumis(keys):
+    ''' Check if some events of the list have no lumi (NO_LUMI) '''
+    lumis = unpack(keys)[1]
+    return bool((lumis == NO_LUMI).any())
+
+
+def without_lumis(keys):
+    ''' Set the lumi of all the events to NO_LUMI, to compare on run:evt
+
+    >>> to_events(without_lumis(from_events([(1, 2, 3), (1, 4, 3)])))
+    [(1, 0, 3)]
+    '''
+    keys = numpy.asarray(keys, dtype=numpy.uint64)
+    lumi_mask = numpy.uint64(((1 << _LUMI_BITS) - 1) << _EVT_BITS)
+    return sorted_unique(keys & ~lumi_mask)
+
+
+def contains(keys, candidates):
+    ''' Boolean mask of the [candidates] which are in the list [keys] '''
+    keys = numpy.asarray(keys, dtype=numpy.uint64)
+    candidates = numpy.asarray(candidates, dtype=numpy.uint64)
+    if not len(keys):
+        return numpy.zeros(len(candidates), dtype=bool)
+    found = numpy.searchsorted(keys, candidates)
+    found[found == len(keys)] = 0
+    return keys[found] == candidates
+
+
+def union(*lists):
+    ''' The events in any of the lists '''
+    if not lists:
+        return numpy.empty(0, dtype=numpy.uint64)
+    if len(lists) == 1:
+        return numpy.asarray(lists[0], dtype=numpy.uint64)
+    # mergesort is fast on concatenated sorted runs
+    return sorted_unique(numpy.concatenate(lists))
+
+
+def intersection(first, *others):
+    ''' The events in all of the lists '''
+    output = numpy.asarray(first, dtype=numpy.uint64)
+    # Start from the smallest
+    for other in sorted(others, key=len):
+        output = output[contains(other, output)]
+    return output
+
+
+def difference(first, *others):
+    ''' The events in the first list, but none of the others '''
+    output = numpy.asarray(first, dtype=numpy.uint64)
+    for other in others:
+        output = output[~contains(other, output)]
+    return output
+
+
+def overlap(lists):
+    ''' Split the events of the lists into exclusive regions
+
+    Returns a dict mapping a tuple of list indices => the events which
+    are in exactly those lists.
+    '''
+    everything = union(*lists)
+    membership = numpy.zeros(len(everything), dtype=numpy.uint64)
+    for i, keys in enumerate(lists):
+        membership[contains(keys, everything)] |= numpy.uint64(1 << i)
+    output = {}
+    for mask in numpy.unique(membership).tolist():
+        indices = tuple(i for i in range(len(lists)) if mask & (1 << i))
+        output[indices] = everything[membership == mask]
+    return output
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -2,10 +2,16 @@
 
 Tools for messing about with lumis and JSON files
 
+Lumi masks are best handled as LumiMasks, which keep the sorted lumi
+ranges of each run, and do the set operations directly on the ranges.  The
+lumi_list functions expand the masks into sets of (run, lumi)s, which is
+very slow for full-year masks.
+
 Author: Evan K. Friis, UW Madison
 
 '''
 
+import bisect
 import csv
 import json
 
@@ -112,5 +118,229 @@ def lumi_list_from_file(filepath):
         result = lumi_list(json.load(file), first, last)
     return result
 
+def merge_ranges(ranges):
+    '''
+    Sort a list of [first, last] lumi ranges, merging overlapping and
+    adjacent ranges.
+    Example:
+    >>> merge_ranges([[8, 10], [1, 3], [4, 4], [9, 12], [20, 20]])
+    [[1, 4], [8, 12], [20, 20]]
+    '''
+    output = []
+    for first, last in sorted(ranges):
+        if output and first <= output[-1][1] + 1:
+            output[-1][1] = max(output[-1][1], last)
+        else:
+            output.append([first, last])
+    return output
+
+def intersect_ranges(ranges1, ranges2):
+    '''
+    Intersection of two sorted, merged lists of lumi ranges.
+    Example:
+    >>> intersect_ranges([[1, 5], [8, 10]], [[3, 9], [10, 20]])
+    [[3, 5], [8, 9], [10, 10]]
+    '''
+    output = []
+    i = j = 0
+    while i < len(ranges1) and j < len(ranges2):
+        first = max(ranges1[i][0], ranges2[j][0])
+        last = min(ranges1[i][1], ranges2[j][1])
+        if first <= last:
+            output.append([first, last])
+        # Move past the range which ends first
+        if ranges1[i][1] < ranges2[j][1]:
+            i += 1
+        else:
+            j += 1
+    return output
+
+def subtract_ranges(ranges1, ranges2):
+    '''
+    The lumis in ranges1 which are not in ranges2 (both sorted and merged).
+    Example:
+    >>> subtract_ranges([[1, 10], [15, 20]], [[3, 4], [8, 16]])
+    [[1, 2], [5, 7], [17, 20]]
+    '''
+    output = []
+    j = 0
+    for first, last in ranges1:
+        # Skip the ranges which end before this one
+        while j < len(ranges2) and ranges2[j][1] < first:
+            j += 1
+        k = j
+        while first <= last and k < len(ranges2) and ranges2[k][0] <= last:
+            if ranges2[k][0] > first:
+                output.append([first, ranges2[k][0] - 1])
+            first = max(first, ranges2[k][1] + 1)
+            k += 1
+        if first <= last:
+            output.append([first, last])
+    return output
+
+class LumiMask(object):
+    '''
+    A set of lumis, stored as the sorted lumi ranges of each run.
+    Example:
+    >>> mask = LumiMask.from_json({'100': [[1, 10]], '150': [[1, 2], [3, 8]]})
+    >>> mask.to_json()
+    {'150': [[1, 8]], '100': [[1, 10]]}
+    >>> (100, 5) in mask, (100, 11) in mask, (120, 1) in mask
+    (True, False, False)
+    >>> len(mask)
+    18
+    >>> other = LumiMask.from_run_lumis([(100, 5), (100, 6), (150, 9)])
+    >>> (mask | other).to_json()
+    {'150': [[1, 9]], '100': [[1, 10]]}
+    >>> (mask - other).to_json()
+    {'150': [[1, 8]], '100': [[1, 4], [7, 10]]}
+    >>> (mask & other).to_json()
+    {'100': [[5, 6]]}
+    >>> mask.select_runs(first=120).to_json()
+    {'150': [[1, 8]]}
+    >>> mask.cmssw_ranges()
+    ['100:1-100:10', '150:1-150:8']
+    '''
+    def __init__(self, ranges=None):
+        # run => sorted, merged list of [first, last] lumi ranges
+        self.ranges = {}
+        if ranges:
+            for run, run_ranges in ranges.iteritems():
+                run_ranges = merge_ranges(run_ranges)
+                if run_ranges:
+                    self.ranges[int(run)] = run_ranges
+
+    @classmethod
+    def _from_merged(cls, ranges):
+        ''' Build from already merged ranges, dropping empty runs '''
+        output = cls()
+        output.ranges = dict((run, run_ranges)
+                             for run, run_ranges in ranges.iteritems()
+                             if run_ranges)
+        return output
+
+    @classmethod
+    def from_json(cls, lumimask):
+        ''' Build from a json-style {'run': [[first, last], ...]} dict '''
+        return cls(dict((int(run), [[int(first), int(last)]
+                                    for first, last in lumis])
+                        for run, lumis in lumimask.iteritems()))
+
+    @classmethod
+    def from_file(cls, filepath):
+        '''
+        Read a lumi mask from a json file.  If filepath is of the form
+        file:first:last then only take runs between first and last.
+        '''
+        path = filepath
+        first = None
+        last = None
+        if ':' in filepath:
+            path, first, last = tuple(filepath.split(':'))
+            first = int(first)
+            last = int(last)
+        with open(path, 'r') as file:
+            return cls.from_json(json.load(file)).select_runs(first, last)
+
+    @classmethod
+    def from_run_lumis(cls, run_lumis):
+        ''' Build from an iterable of (run, lumi)s
+
+        >>> mask = LumiMask.from_run_lumis([(1, 1), (1, 1), (1, 2), (2, 5)])
+        >>> mask.to_json() == {'1': [[1, 2]], '2': [[5, 5]]}
+        True
+        >>> len(mask)
+        3
+        '''
+        output = {}
+        for run, lumis_in_run in group_by_run(sorted(run_lumis)):
+            if run is not None:
+                # Duplicated lumis give overlapping ranges
+                output[run] = merge_ranges(
+                    collapse_ranges_in_list(lumis_in_run))
+        return cls._from_merged(output)
+
+    def to_json(self):
+        ''' Get the json-style dict, in the format of json_summary '''
+        return dict((str(run), [list(x) for x in run_ranges])
+                    for run, run_ranges in self.ranges.iteritems())
+
+    def cmssw_ranges(self):
+        ''' Get the run:first-run:last strings for PoolSource.lumisToProcess
+        '''
+        output = []
+        for run in self.runs():
+            for first, last in self.ranges[run]:
+                if first == last:
+                    output.append('%i:%i' % (run, first))
+                else:
+                    output.append('%i:%i-%i:%i' % (run, first, run, last))
+        return output
+
+    def runs(self):
+        return sorted(self.ranges.keys())
+
+    def select_runs(self, first=None, last=None):
+        ''' Get the mask of the runs between first and last (inclusive) '''
+        return self._from_merged(dict(
+            (run, run_ranges) for run, run_ranges in self.ranges.iteritems()
+            if (first is None or run >= first) and
+            (last is None or run <= last)))
+
+    def run_lumis(self):
+        ''' Generate the (run, lumi)s in the mask, in order '''
+        for run in self.runs():
+            for first, last in self.ranges[run]:
+                for lumi in xrange(first, last + 1):
+                    yield (run, lumi)
+
+    def __contains__(self, run_lumi):
+        run, lumi = run_lumi
+        run_ranges = self.ranges.get(run)
+        if not run_ranges:
+            return False
+        # The last range starting at or before the lumi
+        i = bisect.bisect_right(run_ranges, [lumi, float('inf')]) - 1
+        return i >= 0 and run_ranges[i][1] >= lumi
+
+    def __len__(self):
+        ''' The number of lumis '''
+        return sum(last - first + 1 for run_ranges in self.ranges.itervalues()
+                   for first, last in run_ranges)
+
+    def __nonzero__(self):
+        return bool(self.ranges)
+
+    def __eq__(self, other):
+        return self.ranges == other.ranges
+
+    def __ne__(self, other):
+        return not self == other
+
+    def union(self, other):
+        output = dict(self.ranges)
+        for run, run_ranges in other.ranges.iteritems():
+            if run in output:
+                output[run] = merge_ranges(output[run] + run_ranges)
+            else:
+                output[run] = run_ranges
+        return self._from_merged(output)
+
+    def intersection(self, other):
+        return self._from_merged(dict(
+            (run, intersect_ranges(run_ranges, other.ranges[run]))
+            for run, run_ranges in self.ranges.iteritems()
+            if run in other.ranges))
+
+    def difference(self, other):
+        return self._from_merged(dict(
+            (run, subtract_ranges(run_ranges, other.ranges[run])
+             if run in other.ranges else run_ranges)
+            for run, run_ranges in self.ranges.iteritems()))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
 if __name__ == "__main__":
     import doctest; doctest.testmod()
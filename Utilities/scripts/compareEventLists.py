@@ -9,61 +9,52 @@ Usage:
 
 Format:
 
-    All non-numeric characters are replaced with spaces.
+    All non-numeric characters are replaced with spaces, and the last
+    three numbers of each line are taken as the run, lumi and event.
+    Lines with two numbers are a run and event.  If one of the lists has
+    no lumis, the events are compared on run and event only.
 
 '''
 
+import logging
 import sys
-import re
-
-# Replace any nonnumeric w/ spaces
-replacer = re.compile(r'[^\d]+')
-
-def get_fields(stream):
-    for line in stream:
-        line = line.strip()
-        if not line:
-            continue
-        whitespace_only = replacer.sub(' ', line)
-        yield tuple( int(x) for x in whitespace_only.split() )
-
-def run_evt_only(fields):
-    for event_info in fields:
-        if len(event_info) == 2:
-            run, event = event_info
-            yield run, event
-        elif len(event_info) == 3:
-            run, lumi, event = event_info
-            yield run, event
+import FinalStateAnalysis.Utilities.eventsets as eventsets
 
 if __name__  == "__main__":
     file1name = sys.argv[1]
     file2name = sys.argv[2]
-    file1 = open(file1name)
-    file2 = open(file2name)
-
-    file1evts = set(get_fields(file1))
-    file2evts = set(get_fields(file2))
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+
+    file1evts = eventsets.read_file(file1name)
+    file2evts = eventsets.read_file(file2name)
+
+    # Output format
+    format = '%i %i %i\n'
+    lumis = True
+    if eventsets.missing_lumis(file1evts) or \
+            eventsets.missing_lumis(file2evts):
+        print "Some events have no lumi, comparing run:evt only"
+        format = '%i %i\n'
+        lumis = False
+        file1evts = eventsets.without_lumis(file1evts)
+        file2evts = eventsets.without_lumis(file2evts)
 
     print "%s has %i events" % (file1name, len(file1evts))
     print "%s has %i events" % (file2name, len(file2evts))
 
-    both = file1evts.intersection(file2evts)
+    both = eventsets.intersection(file1evts, file2evts)
 
     print "There are %i common events" % len(both)
 
-    file1only = file1evts - file2evts
-    file2only = file2evts - file1evts
+    file1only = eventsets.difference(file1evts, file2evts)
+    file2only = eventsets.difference(file2evts, file1evts)
 
-    if file1only:
+    if len(file1only):
         print "Events in %s only:" % file1name
-        for run, lumi, evt in sorted(file1only):
-            #print "run: %i lumi: %s evt: %i" % (run, lumi, evt)
-            print run, lumi, evt
+        sys.stdout.flush()
+        eventsets.write_text(sys.stdout, file1only, format, lumis)
 
-    if file2only:
+    if len(file2only):
         print "Events in %s only:" % file2name
-        for run, lumi, evt in sorted(file2only):
-            #print "run: %i lumi: %s evt: %i" % (run, lumi, evt)
-            print run, lumi, evt
-
+        sys.stdout.flush()
+        eventsets.write_text(sys.stdout, file2only, format, lumis)
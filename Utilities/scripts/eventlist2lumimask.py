@@ -13,23 +13,13 @@ Author: Evan K. Friis, UW Madison
 
 import sys
 import json
-import FinalStateAnalysis.Utilities.lumitools as lumitools
+import FinalStateAnalysis.Utilities.eventsets as eventsets
+from FinalStateAnalysis.Utilities.lumitools import LumiMask
 
 if __name__ == "__main__":
-    run_lumis = set([])
-    for line in sys.stdin.readlines():
-        # Convert to space separated
-        line = line.replace('*', ' ').strip()
-        if not line or 'Row' in line:
-            continue
-        fields = line.split()
+    # Takes the last 3 numbers of each line, skipping the header lines
+    events = eventsets.read_text(sys.stdin, strict=True)
+    run_lumis = eventsets.unpack_run_lumis(eventsets.run_lumi_keys(events))
 
-        # always take last 3 fields
-        assert(len(fields) >= 3)
-
-        run, lumi, event = int(fields[-3]), int(fields[-2]), int(fields[-1])
-
-        run_lumis.add( (run, lumi) )
-
-    json.dump(lumitools.json_summary(run_lumis), sys.stdout, indent=2,
-              sort_keys=True)
+    json.dump(LumiMask.from_run_lumis(run_lumis).to_json(), sys.stdout,
+              indent=2, sort_keys=True)
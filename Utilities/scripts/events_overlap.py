@@ -1,68 +1,42 @@
 #! /bin/env python
 
 from RecoLuminosity.LumiDB import argparse
-from pdb import set_trace
 import itertools
-
-def txt2tuple(line):
-    return tuple([ int(i.strip()) for i in line.split(':') ])
-
-def file2tlist(fname):
-    ret = []
-    with open(fname) as infile:
-        for line in infile.readlines():
-            if line.strip():
-                toadd = txt2tuple(line)
-                if len(toadd) == 3:
-                    ret.append(toadd)
-                else:
-                    pass
-                    #raise TypeError('cannot parse %s in file %s' % (line.strip(), fname))
-    return set(ret) #set(txt2tuple(line) for line in open(fname).readlines() if line.strip())
+import FinalStateAnalysis.Utilities.eventsets as eventsets
 
 def dump(fname, evts):
     with open(fname,'w') as out:
-        out.write('\n'.join('%i:%i:%i' % i for i in evts))
-        out.write('\n')
+        eventsets.write_text(out, evts)
 
 parser = argparse.ArgumentParser()
 parser.add_argument('evtlists', nargs='+')
 parser.add_argument('--dump-events', action='store_true', default=False, dest='dump')
 args = parser.parse_args()
 
-evt_lists = [ file2tlist(i) for i in args.evtlists ]
+evt_lists = [ eventsets.read_file(i) for i in args.evtlists ]
 names     = [ i.split('.')[0].split('_')[-1] for i in args.evtlists ]
 region    = '_'.join(args.evtlists[0].split('.')[0].split('_')[:-1])
-evt_dict  = dict(i for i in zip(names, evt_lists))
 
-intersect = lambda x,y: x.intersection(y)
-difference = lambda x,y: x.difference(y)
-full_intersection = reduce(intersect, evt_lists)
+# Events in exactly the lists with the given indices
+regions = eventsets.overlap(evt_lists)
+empty = eventsets.union()
+all_lists = tuple(range(len(names)))
+
+full_intersection = regions.get(all_lists, empty)
 print 'Full intersection: %i' % len(full_intersection)
 if args.dump:
     dump('full_intersection.txt', full_intersection)
 
-intersections = {}
 for ncomb in range(2, len(names) )[::-1]:
-    for items in itertools.combinations(evt_dict.items(), ncomb):
-        names = tuple([i[0] for i in items])
-        inter = reduce(intersect, [i[1] for i in items])
-        #remove double counting
-        inter = inter.difference(full_intersection)
-        inter_diff = reduce(lambda x,y: x.union(y), [value for key, value in intersections.iteritems() if all(name in key for name in names)], set()) 
-        inter = inter.difference(inter_diff)
-        #save region
-        intersections[names] = inter
+    for items in itertools.combinations(all_lists, ncomb):
+        inter = regions.get(items, empty)
+        comb_names = tuple([names[i] for i in items])
         if args.dump:
-            dump(region+'_AND_'.join(names)+'.txt', inter)
-        print ' & '.join(names)+': %i' % len(inter)
+            dump(region+'_AND_'.join(comb_names)+'.txt', inter)
+        print ' & '.join(comb_names)+': %i' % len(inter)
 
-for name, evtset in evt_dict.iteritems():
-    size = evtset.difference(full_intersection)
-    inter_union = reduce(lambda x,y: x.union(y), [value for key, value in intersections.iteritems() if name in key], set())     
-    size = size.difference( inter_union )
+for i, name in enumerate(names):
+    size = regions.get((i,), empty)
     print '%s only: %i' % (name, len(size))
     if args.dump:
         dump('%s_%s_only.txt' % (region, name), size)
-
-
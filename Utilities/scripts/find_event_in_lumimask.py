@@ -2,6 +2,7 @@
 
 from RecoLuminosity.LumiDB import argparse
 import FinalStateAnalysis.Utilities.prettyjson as prettyjson
+from FinalStateAnalysis.Utilities.lumitools import LumiMask
 import sys
 import os
 
@@ -9,13 +10,7 @@ def txt2tuple(line):
     return tuple([ int(i.strip()) for i in line.split(':') ])
 
 def is_in_json(evt, jsonmask):
-    run  = evt[0]
-    lumi = evt[1]
-    if str(run) in jsonmask:
-        for lumis in jsonmask[str(run)]:
-            if lumis[0] <= lumi <= lumis[1]:
-                return True
-    return False
+    return (evt[0], evt[1]) in jsonmask
 
 
 parser = argparse.ArgumentParser()
@@ -26,7 +21,8 @@ args = parser.parse_args()
 event = txt2tuple(args.event)
 
 #print args.masks
-jsons = [ (i, prettyjson.loads( open(i).read() )) for i in args.masks ]
+jsons = [ (i, LumiMask.from_json(prettyjson.loads( open(i).read() )))
+          for i in args.masks ]
 
 for name, mask in jsons:
     if is_in_json(event, mask):
@@ -10,7 +10,7 @@ Author: Evan K. Friis, UW Madison
 '''
 
 import json
-import FinalStateAnalysis.Utilities.lumitools as lumitools
+from FinalStateAnalysis.Utilities.lumitools import LumiMask
 from RecoLuminosity.LumiDB import argparse
 import sys
 
@@ -26,16 +26,16 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # Load lumis
-    lumis1 = lumitools.lumi_list_from_file(args.lumimask1)
-    lumis2 = lumitools.lumi_list_from_file(args.lumimask2)
+    lumis1 = LumiMask.from_file(args.lumimask1)
+    lumis2 = LumiMask.from_file(args.lumimask2)
 
     set_operations = {
-        '+' : set.union,
-        '-' : set.difference,
-        'and' : set.intersection,
+        '+' : LumiMask.union,
+        '-' : LumiMask.difference,
+        'and' : LumiMask.intersection,
     }
 
     result = set_operations[args.operation](lumis1, lumis2)
 
-    result_summary = lumitools.json_summary(result)
+    result_summary = result.to_json()
     json.dump(result_summary, sys.stdout, indent=2, sort_keys=True)
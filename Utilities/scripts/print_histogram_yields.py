@@ -33,17 +33,16 @@ if __name__ == "__main__":
 
     # Import after, so ROOT can't mess with sys.argv
     import rootpy.io as io
+    from FinalStateAnalysis.PlotTools.KeyIndex import build_key_index
 
     file = io.open(args.file)
 
     results = {}
 
-    for path, dirs, histonames in file.walk(class_pattern='TH1*'):
-        for histoname in histonames:
-            full_path = os.path.join(path, histoname)
-            histo = file.Get(full_path)
-            int, err = get_integral(histo)
-            results[full_path] = (int, err)
+    for full_path in build_key_index(args.file).paths(class_pattern='TH1*'):
+        histo = file.Get(full_path)
+        int, err = get_integral(histo)
+        results[full_path] = (int, err)
 
     if not args.json:
         for full_path, (int, err) in results.iteritems():
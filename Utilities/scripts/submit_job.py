@@ -14,12 +14,12 @@ Example to make submit script for VH analysis:
 
 from RecoLuminosity.LumiDB import argparse
 import datetime
-import fnmatch
 import json
 import logging
 import os
 import sys
 from FinalStateAnalysis.MetaData.datadefs import datadefs
+from FinalStateAnalysis.MetaData.dataquery import DatasetCatalog
 
 log = logging.getLogger("submit_job")
 logging.basicConfig(level=logging.INFO, stream=sys.stderr)
@@ -115,22 +115,11 @@ if __name__ == "__main__":
     sys.stdout.write('# The command was: %s\n' % ' '.join(sys.argv))
 
     sys.stdout.write('export TERMCAP=screen\n')
-    for sample, sample_info in reversed(
-        sorted(datadefs.iteritems(), key=lambda (x,y): x)):
-        passes_filter = True
-        # Filter by analysis
-        if args.analysis:
-            passes_ana = sample_info['analysis'] == args.analysis
-            passes_filter = passes_filter and passes_ana
-        # Filter by sample wildcards
-        if args.samples:
-            passes_wildcard = False
-            for pattern in args.samples:
-                if fnmatch.fnmatchcase(sample, pattern):
-                    passes_wildcard = True
-            passes_filter = passes_wildcard and passes_filter
-        if not passes_filter:
-            continue
+    # Filter by analysis and sample wildcards
+    samples = DatasetCatalog(datadefs).query(
+        analysis=args.analysis or None, name=args.samples, reverse=True)
+    for sample in samples:
+        sample_info = datadefs[sample]
 
         submit_dir = args.subdir.format(
             user = os.environ['LOGNAME'],